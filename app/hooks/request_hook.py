@@ -1,21 +1,12 @@
-import json
+import random
 import uuid
 
 from fastapi import Request, Response
 
+from config import RequestLogInfo
 
-async def set_body(request: Request, body: bytes):
-    async def receive():
-        return {"type": "http.request", "body": body}
-
-    request._receive = receive
-
-
-async def get_body(request: Request) -> str:
-    """ 获取请求body """
-    body = await request.body()
-    await set_body(request, body)
-    return body.decode()
+# 按前缀长度倒序，优先匹配最长的前缀
+sample_rate_list = sorted(RequestLogInfo.SAMPLE_RATE.items(), key=lambda item: len(item[0]), reverse=True)
 
 
 def check_is_log_response(path):
@@ -25,6 +16,38 @@ def check_is_log_response(path):
     ])
 
 
+def check_is_sampled(path):
+    """ 按接口地址前缀的采样率判断当前请求是否记录日志 """
+    rate = next((rate for prefix, rate in sample_rate_list if path.startswith(prefix)), RequestLogInfo.DEFAULT_SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
+
+def format_body_for_log(head: bytes, size: int):
+    """ 日志中只记录前 BODY_MAX_SIZE 个字节的原始内容，不做json解析 """
+    text = head.decode("utf-8", "replace")
+    return text if size <= len(head) else f'{text}...（共{size}字节）'
+
+
+def log_response_body(request: Request, response: Response, request_id: str):
+    """ 包装响应体迭代器，边返回边记录前 BODY_MAX_SIZE 个字节，返回完毕后打日志，不缓存整个响应体，不影响流式响应 """
+    body_iterator, max_size = response.body_iterator, RequestLogInfo.BODY_MAX_SIZE
+
+    async def logged_body_iterator():
+        head, size = bytearray(), 0
+        try:
+            async for chunk in body_iterator:
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                if len(head) < max_size:
+                    head.extend(data[:max_size - len(head)])
+                size += len(data)
+                yield chunk
+        finally:
+            request.app.logger.info(
+                f'【{request.method}】【{request_id}】【{request.url.path}】: {format_body_for_log(bytes(head), size)}')
+
+    response.body_iterator = logged_body_iterator()
+
+
 def register_request_hook(app):
     @app.middleware("http")
     async def before_request(request: Request, call_next):
@@ -46,30 +69,27 @@ def register_request_hook(app):
         elif "ui-test" in request.url.path:
             request.app.test_type = "ui"
 
-        # 非文件上传接口，获取请求体并记录日志
+        is_log = check_is_sampled(request.url.path)  # 请求和响应的日志一起采样
+
+        # 非文件上传接口，获取请求体并记录日志，读取后的body由starlette缓存，后续处理可以再次读取
         is_upload_file = request.headers.get("content-type", "").startswith("multipart/form-data")
         request.state.is_upload_file = is_upload_file
         if not is_upload_file:
             # 把解析后的body保存在state对象上，方便在出错的时候保存请求数据
-            await set_body(request, await request.body())
-            request.state.set_body = await get_body(request)
-            request.app.logger.info(
-                f'【{request.method}】【{request_id}】【{request.url.path}】: {request.query_params or request.state.set_body}')
+            body = await request.body()
+            request.state.set_body = body.decode("utf-8", "replace")
+            if is_log:
+                request.app.logger.info(
+                    f'【{request.method}】【{request_id}】【{request.url.path}】: '
+                    f'{request.query_params or format_body_for_log(body[:RequestLogInfo.BODY_MAX_SIZE], len(body))}')
 
         response: Response = await call_next(request)
 
         # 打印响应
-        if check_is_log_response(request.url.path):
-            response_body = b"".join([chunk async for chunk in response.body_iterator])
-            request.app.logger.info(
-                f'【{request.method}】【{request_id}】【{request.url.path}】: {json.loads(response_body.decode())}')
-
-            # 重建响应迭代器
-            async def new_body_iterator():
-                yield response_body
-
-            response.body_iterator = new_body_iterator()
-        return format_response(response, request)
+        formatted_response = format_response(response, request)
+        if is_log and formatted_response is response and check_is_log_response(request.url.path):
+            log_response_body(request, response, request_id)
+        return formatted_response
 
 
 def format_response(response, request: Request):
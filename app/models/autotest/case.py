@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from tortoise import timezone
+
 from ..base_model import BaseModel, fields, pydantic_model_creator
 from app.schemas.enums import CaseStatusEnum
 from utils.parse.parse import parse_list_to_dict, parse_dict_to_list
@@ -68,7 +70,8 @@ class BaseCase(BaseModel):
 
             for from_variable_key, from_variable_value in from_case_variables.items():
                 to_case_variables.setdefault(from_variable_key, from_variable_value)
-            await cls.filter(id=to_case_id).update(variables=[value for key, value in to_case_variables.items() if key])
+            await cls.filter(id=to_case_id).update(
+                variables=[value for key, value in to_case_variables.items() if key], update_time=timezone.now())
 
 
     @classmethod
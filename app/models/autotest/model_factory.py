@@ -10,6 +10,9 @@ from .task import *
 from .report import *
 from .report_case import *
 from .report_step import *
+from .report_body import *
+from .report_stat import *
+from .run_queue import *
 
 class ModelSelector:
     """模型选择器"""
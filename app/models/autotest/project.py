@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from tortoise import timezone
+
 from ..base_model import BaseModel, fields, pydantic_model_creator
 from config import ServerInfo
 from utils.parse.parse import parse_list_to_dict, update_dict_to_list, parse_dict_to_list
@@ -155,7 +157,7 @@ class BaseProjectEnv(BaseModel):
                 from_data, to_data = from_env_dict[filed], getattr(to_env, filed)
                 new_env_data[filed] = update_dict_to_list(from_data, to_data)
 
-            await cls.filter(id=to_env.id).update(**new_env_data)  # 同步环境
+            await cls.filter(id=to_env.id).update(**new_env_data, update_time=timezone.now())  # 同步环境
 
     @classmethod
     async def add_env(cls, env_id, project_model):
@@ -3,6 +3,7 @@ import datetime
 import time
 
 from ..base_model import BaseModel, fields, pydantic_model_creator
+from .report_stat import ReportDailyStat
 from app.schemas.enums import TriggerTypeEnum
 
 
@@ -82,7 +83,9 @@ class BaseReport(BaseModel):
         """ 生成一个测试报告 """
         if "summary" not in kwargs:
             kwargs["summary"] = cls.get_summary_template()
-        return await cls.create(**kwargs)
+        report = await cls.create(**kwargs)
+        await ReportDailyStat.add_report(report, total=1, pass_count=report.is_passed)
+        return report
 
     def merge_test_result(self, case_summary):
         """ 汇总测试数据和结果
@@ -164,8 +167,21 @@ class BaseReport(BaseModel):
         if summary:
             update_dict["summary"] = summary
             self.summary = summary
+        pass_count = update_dict["is_passed"] - self.is_passed
         self.is_passed = update_dict["is_passed"]
         await self.__class__.filter(id=self.id).update(**update_dict)
+        if pass_count:
+            await ReportDailyStat.add_report(self, pass_count=pass_count)
+
+    async def run_error(self, error):
+        """ 执行出错、执行节点失联、执行器停止时，把还没执行完的报告标记为执行完毕、不通过，不再一直显示执行中 """
+        if self.process == 3 and self.status == 2:
+            return
+        summary = self.summary or self.get_summary_template()
+        summary["result"] = "error"
+        summary["error"] = error
+        await self.update_report_result("error", summary=summary)
+        await self.update_report_process(process=3, status=2)
 
     @classmethod
     async def select_is_all_status_by_batch_id(cls, batch_id, process_and_status=[1, 1]):
@@ -193,18 +209,24 @@ class BaseReport(BaseModel):
 
 
 class ApiReport(BaseReport):
+    stat_test_type = "api"  # 按天汇总报告数量时的测试类型
+
     class Meta:
         table = "api_test_report"
         table_description = "接口测试报告表"
 
 
 class AppReport(BaseReport):
+    stat_test_type = "app"  # 按天汇总报告数量时的测试类型
+
     class Meta:
         table = "app_ui_test_report"
         table_description = "APP测试报告表"
 
 
 class UiReport(BaseReport):
+    stat_test_type = "ui"  # 按天汇总报告数量时的测试类型
+
     class Meta:
         table = "web_ui_test_report"
         table_description = "web-ui测试报告表"
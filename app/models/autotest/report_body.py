@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from tortoise.exceptions import IntegrityError
+
+from ..base_model import BaseModel, fields
+
+
+class ReportBody(BaseModel):
+    """ 测试报告中大的请求体、响应体，gzip压缩后按内容sha256去重存储，web服务、执行器在不同机器上也都能读取
+    update_time 为最后一次被引用的时间，超过保留天数没被引用的由定时任务清理
+    """
+
+    body_hash = fields.CharField(64, unique=True, description="内容的sha256")
+    body_type = fields.CharField(8, default="str", description="内容类型，json/str")
+    size = fields.IntField(default=0, description="压缩前的字节数")
+    content = fields.BinaryField(description="gzip压缩后的内容")
+
+    class Meta:
+        table = "auto_test_report_body"
+        table_description = "测试报告请求体、响应体存储表"
+
+    @classmethod
+    async def touch(cls, body_hash_list):
+        """ 刷新最后被引用时间，返回更新的条数 """
+        if not body_hash_list:
+            return 0
+        return await cls.filter(body_hash__in=list(body_hash_list)).update(update_time=datetime.datetime.now())
+
+    @classmethod
+    async def save_body(cls, body_hash, body_type, size, content: bytes):
+        """ 相同内容只存一份，已存在则只刷新被引用时间 """
+        if await cls.touch([body_hash]):
+            return
+        try:
+            await cls.create(body_hash=body_hash, body_type=body_type, size=size, content=content)
+        except IntegrityError:  # 其他进程同时写入了同样的内容
+            await cls.touch([body_hash])
+
+    @classmethod
+    async def clear_expired(cls, expire_time):
+        """ 删除 expire_time 之后没有被引用的数据，返回删除的条数 """
+        return await cls.filter(update_time__lt=expire_time).delete()
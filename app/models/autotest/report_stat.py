@@ -0,0 +1,100 @@
+import datetime
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.functions import Sum
+from tortoise.transactions import in_transaction
+
+from ..base_model import BaseModel, fields, pydantic_model_creator
+from utils.logs.log import logger
+
+
+class ReportDailyStat(BaseModel):
+    """ 测试报告按天汇总的数量，首页、统计页面直接查汇总数据，不用每次都统计报告表
+    报告生成时总数、通过数+1（与报告表一致，未执行完的报告视为通过），执行结果为不通过时通过数-1
+    每天由定时任务按报告表重新汇总一次之前的日期，修正重跑、删除报告等没有实时更新的数据
+    """
+
+    stat_date = fields.DateField(index=True, description="报告生成日期")
+    test_type = fields.CharField(8, default="api", description="测试类型，api/ui/app")
+    project_id = fields.IntField(description="服务id")
+    trigger_type = fields.CharField(16, default="page", description="触发类型，page/pipeline/cron")
+    run_type = fields.CharField(16, default="case", description="报告类型，api/case/set/task")
+    total = fields.IntField(default=0, description="报告数")
+    pass_count = fields.IntField(default=0, description="通过的报告数")
+
+    class Meta:
+        table = "auto_test_report_daily_stat"
+        table_description = "测试报告按天汇总表"
+        unique_together = ("stat_date", "test_type", "project_id", "trigger_type", "run_type")
+
+    @classmethod
+    async def add_count(cls, test_type, stat_date, project_id, trigger_type, run_type, total=0, pass_count=0):
+        """ 累加对应维度的数量，没有这条数据则新增 """
+        query = cls.filter(
+            stat_date=stat_date, test_type=test_type, project_id=project_id, trigger_type=trigger_type, run_type=run_type)
+        if await query.update(total=F("total") + total, pass_count=F("pass_count") + pass_count):
+            return
+        try:
+            await cls.create(
+                stat_date=stat_date, test_type=test_type, project_id=project_id, trigger_type=trigger_type,
+                run_type=run_type, total=total, pass_count=pass_count)
+        except IntegrityError:  # 其他进程同时新增了
+            await query.update(total=F("total") + total, pass_count=F("pass_count") + pass_count)
+
+    @classmethod
+    async def add_report(cls, report, total=0, pass_count=0):
+        """ 按报告累加数量，统计出错不影响报告生成，等定时任务重新汇总 """
+        try:
+            await cls.add_count(
+                report.stat_test_type, report.create_time.date(), report.project_id, report.trigger_type,
+                report.run_type, total, pass_count)
+        except Exception as error:
+            logger.error(f'更新测试报告按天汇总数据出错：{error}')
+
+    @classmethod
+    async def rebuild(cls, report_model):
+        """ 按报告表重新汇总此测试类型今天之前（已结束的日期）的数据，返回汇总的行数
+        今天的数据只由报告生成、执行完毕时累加，汇总和替换在同一个事务中，不会覆盖掉汇总期间的累加
+        """
+        test_type, today = report_model.stat_test_type, datetime.date.today()
+        async with in_transaction() as connection:
+            stat_list = await connection.execute_query_dict(f"""
+                SELECT DATE(create_time) AS stat_date, project_id, trigger_type, run_type,
+                       COUNT(id) AS total, SUM(CASE WHEN is_passed = 1 THEN 1 ELSE 0 END) AS pass_count
+                FROM {report_model._meta.db_table}
+                WHERE create_time < '{today.strftime("%Y-%m-%d")} 00:00:00'
+                GROUP BY DATE(create_time), project_id, trigger_type, run_type
+            """)
+            await cls.filter(test_type=test_type, stat_date__lt=today).using_db(connection).delete()
+            await cls.bulk_create([cls(
+                stat_date=stat["stat_date"] if isinstance(stat["stat_date"], datetime.date)
+                else datetime.date.fromisoformat(str(stat["stat_date"])),
+                test_type=test_type,
+                project_id=stat["project_id"],
+                trigger_type=stat["trigger_type"],
+                run_type=stat["run_type"],
+                total=int(stat["total"] or 0),
+                pass_count=int(stat["pass_count"] or 0)
+            ) for stat in stat_list], batch_size=500, using_db=connection)
+        return len(stat_list)
+
+    @classmethod
+    async def init_stat(cls, report_model_list):
+        """ 有历史报告但还没有汇总数据的测试类型（刚部署），按报告表汇总一次，部署当天的数据在第二天汇总时补上 """
+        today = datetime.date.today()
+        for report_model in report_model_list:
+            if await cls.filter(test_type=report_model.stat_test_type, stat_date__lt=today).exists():
+                continue
+            if await report_model.filter(create_time__lt=today).exists():
+                await cls.rebuild(report_model)
+
+    @classmethod
+    async def get_stat_list(cls, report_model, group_by: list, **kwargs):
+        """ 按 group_by 汇总报告数、通过数，[{**group_by, "report_count": 1, "pass_report_count": 1}] """
+        return await cls.filter(test_type=report_model.stat_test_type, **kwargs).annotate(
+            report_count=Sum("total"), pass_report_count=Sum("pass_count")
+        ).group_by(*group_by).values(*group_by, "report_count", "pass_report_count")
+
+
+ReportDailyStatPydantic = pydantic_model_creator(ReportDailyStat, name="ReportDailyStat")
@@ -1,8 +1,105 @@
 # -*- coding: utf-8 -*-
-import time
+import asyncio
 
 from ..base_model import BaseModel, fields, pydantic_model_creator
 from ...schemas.enums import ReportStepStatusEnum
+from utils.logs.log import logger
+from utils.util.json_util import JsonUtil
+from utils.util.report_body_store import ReportBodyStore
+
+
+class ReportStepWriteBuffer:
+    """
+    步骤执行进度的写缓冲，同一步骤的多次更新在内存中合并，每 FLUSH_INTERVAL 秒写一次数据库，步骤执行完毕时立即写入
+    多个步骤的更新，字段相同的合并为一条批量UPDATE，批量写入失败时逐条写入，逐条也失败的放回缓冲，最多重试 MAX_RETRY 次
+    """
+    FLUSH_INTERVAL = 0.5
+    MAX_RETRY = 3
+
+    def __init__(self, model):
+        self.model = model
+        self.pending = {}  # {report_step_id: {field: value}}
+        self.retry_count = {}  # {report_step_id: 已重试次数}
+        self.lock = asyncio.Lock()
+        self.flush_task = None
+
+    def add(self, report_step_id, **kwargs):
+        # step_data 只拷贝第一层，调用方之后增删字段不影响缓冲中的内容，请求、响应等大数据不深拷贝
+        # 执行过程中的进度由 get_test_step_data 每次生成新的字典，执行完毕时立即写入，写入的是最终数据
+        if isinstance(kwargs.get("step_data"), dict):
+            kwargs["step_data"] = dict(kwargs["step_data"])
+        self.pending.setdefault(report_step_id, {}).update(kwargs)
+        self.start_delay_flush()
+
+    def start_delay_flush(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.delay_flush())
+
+    async def delay_flush(self):
+        while True:  # 写入期间新增的、写入失败放回的数据，在下一轮写入
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as error:
+                logger.error(f'写入测试步骤执行进度出错：{error}')
+            if not self.pending:
+                break
+
+    def requeue(self, step_id, data, error):
+        """ 写入失败的数据放回缓冲，期间又有新的数据则以新的为准 """
+        retry_count = self.retry_count.get(step_id, 0) + 1
+        if retry_count > self.MAX_RETRY:
+            self.retry_count.pop(step_id, None)
+            logger.error(f'写入测试步骤【{step_id}】执行进度重试{self.MAX_RETRY}次后依然出错，已丢弃：{error}')
+            return
+        self.retry_count[step_id] = retry_count
+        self.pending[step_id] = {**data, **self.pending.get(step_id, {})}
+        logger.warning(f'写入测试步骤【{step_id}】执行进度出错，稍后重试：{error}')
+
+    async def update_one(self, step_id, data):
+        try:
+            await self.model.filter(id=step_id).update(**data)
+            self.retry_count.pop(step_id, None)
+        except Exception as error:
+            self.requeue(step_id, data, error)
+
+    async def flush(self, report_step_id=None):
+        """ 写入数据库，指定了 report_step_id 则只写入此步骤的数据 """
+        async with self.lock:  # 保证同一步骤先缓存的数据先写入
+            if report_step_id is None:
+                pending, self.pending = self.pending, {}
+            else:
+                pending = {report_step_id: self.pending.pop(report_step_id)} if report_step_id in self.pending else {}
+
+            # json字段直接传字典，由字段的encoder转json，可能有 datetime 格式的数据，合并掉的数据不用转
+            # 不能先转成字符串再传，字符串会被字段再解析一遍校验格式
+            group_dict = {}
+            for step_id, data in pending.items():
+                if data.get("step_data"):  # 大的请求体、响应体单独存储，只记录引用
+                    data["step_data"] = await ReportBodyStore.externalize(data["step_data"])
+                group_dict.setdefault(tuple(sorted(data.keys())), []).append((step_id, data))
+
+            for field_list, step_list in group_dict.items():
+                if len(step_list) == 1:
+                    await self.update_one(*step_list[0])
+                    continue
+                obj_list = []
+                for step_id, data in step_list:
+                    obj = self.model(id=step_id)
+                    for key, value in data.items():
+                        setattr(obj, key, value)
+                    obj_list.append(obj)
+                try:
+                    await self.model.bulk_update(obj_list, fields=list(field_list))
+                    for step_id, _ in step_list:
+                        self.retry_count.pop(step_id, None)
+                except Exception as error:
+                    logger.warning(f'批量写入测试步骤执行进度出错，改为逐条写入：{error}')
+                    for step_id, data in step_list:
+                        await self.update_one(step_id, data)
+
+        if self.pending:  # 有放回缓冲的数据，等下次写入
+            self.start_delay_flush()
 
 
 class BaseReportStep(BaseModel):
@@ -22,12 +119,20 @@ class BaseReportStep(BaseModel):
     result = fields.CharField(
         16, default='waite',
         description="步骤测试结果，waite：等待执行、running：执行中、fail：执行不通过、success：执行通过、skip：跳过、error：报错")
-    step_data = fields.JSONField(default={}, description="步骤的数据")
-    summary = fields.JSONField(default={}, description="步骤的统计")
+    step_data = fields.JSONField(default={}, encoder=JsonUtil.dumps, description="步骤的数据")
+    summary = fields.JSONField(default={}, encoder=JsonUtil.dumps, description="步骤的统计")
 
     class Meta:
         abstract = True  # 不生成表
 
+    write_buffer_dict = {}  # {模型: ReportStepWriteBuffer}
+
+    @classmethod
+    def get_write_buffer(cls):
+        if cls not in cls.write_buffer_dict:
+            cls.write_buffer_dict[cls] = ReportStepWriteBuffer(cls)
+        return cls.write_buffer_dict[cls]
+
     @staticmethod
     def get_summary_template():
         return {
@@ -51,10 +156,18 @@ class BaseReportStep(BaseModel):
         report_step = await cls.filter(report_case_id=report_case_id).values("id", "step_data")
         report_step_list = []
         for data in report_step:
+            if ReportBodyStore.get_ref_list(data["step_data"]):
+                await ReportBodyStore.inline(data["step_data"])
             data["step_data"]["report_step_id"] = data["id"]
             report_step_list.append(data["step_data"])
         return report_step_list
 
+    async def inline_step_data(self):
+        """ 把单独存储的请求体、响应体还原到步骤数据中 """
+        if ReportBodyStore.get_ref_list(self.step_data):
+            await ReportBodyStore.inline(self.step_data)
+        return self
+
     @classmethod
     async def get_resport_step_list(cls, report_case_id, get_detail):
         """ 获取步骤列表，性能考虑，只查关键字段 """
@@ -81,33 +194,15 @@ class BaseReportStep(BaseModel):
         elif report_id is None and report_case_id is None and report_step_id:  # 更新指定数据的状态
             await cls.filter(id=report_step_id).update(status=status)
 
-    @classmethod
-    async def get_resport_step_with_status(cls, resport_step_id, time_out=60):
-        """ 如果步骤的状态是暂停，则等暂停完毕或者暂停超时结束后再返回，模拟debug """
-        while time_out >= 0:
-            report_step = await cls.filter(id=resport_step_id).first()
-            if report_step.status == "pause":  # 如果设置了当前步骤为暂停执行，则每5秒查询一次状态有没有变更
-                time_out -= 5
-                time.sleep(5)
-                if time_out >= 5:  # 最后一次循环就不重置 report_step 变量了
-                    report_step = None
-                continue
-            return report_step
-
-        # 步骤暂停超时过后还没有放行，把后面的所有步骤都改为停止执行
-        await cls.update_status(None, report_step.report_case_id, report_step.id, "stop")
-        report_step.status = "stop"
-        return report_step
-
     async def save_step_result_and_summary(self, step_runner, step_error_traceback=None):
-        """ 保存测试步骤的结果和数据 """
-        data = step_runner.get_test_step_data()
-        step_data = self.loads(self.dumps(data))  # 可能有 datetime 格式的数据
+        """ 保存测试步骤的结果和数据，连同缓存中还没写入的进度一起写入 """
+        step_data = step_runner.get_test_step_data()  # 可能有 datetime 格式的数据，写入时再转json
         step_meta_data = step_runner.client_session.meta_data
         step_data["attachment"] = step_error_traceback
         # 保存测试步骤的结果和数据
-        await self.update_report_step_data(
-            step_data=step_data, result=step_meta_data["result"], summary=step_meta_data["stat"])
+        write_buffer = self.__class__.get_write_buffer()
+        write_buffer.add(self.id, step_data=step_data, result=step_meta_data["result"], summary=step_meta_data["stat"])
+        await write_buffer.flush(self.id)
 
     @classmethod
     def add_run_step_result_count(cls, case_summary, step_meta_data, response_time_level=None, report_step_id=None):
@@ -136,77 +231,50 @@ class BaseReportStep(BaseModel):
         await self.__class__.filter(id=self.id).update(**kwargs)
 
     async def update_test_result(self, result, step_data):
-        """ 更新测试状态 """
+        """ 更新测试状态，写入缓冲，由缓冲合并后写入数据库 """
         update_dict = {"result": result}
         if step_data:
-            if isinstance(step_data, dict):
-                step_data = self.dumps(step_data)
             update_dict["step_data"] = step_data
-        await self.__class__.filter(id=self.id).update(**update_dict)
+        self.__class__.get_write_buffer().add(self.id, **update_dict)
 
     async def test_is_running(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_test_result("running", step_data)
 
     async def test_is_fail(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_test_result("fail", step_data)
 
     async def test_is_success(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_test_result("success", step_data)
 
     async def test_is_skip(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_test_result("skip", step_data)
 
     async def test_is_error(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_test_result("error", step_data)
 
     async def update_step_process(self, process, step_data):
-        """ 更新数据和执行进度 """
+        """ 更新数据和执行进度，写入缓冲，由缓冲合并后写入数据库 """
         update_dict = {"process": process}
         if step_data:
-            if isinstance(step_data, dict):
-                step_data = self.dumps(step_data)
             update_dict["step_data"] = step_data
-
-        await self.__class__.filter(id=self.id).update(**update_dict)
+        self.__class__.get_write_buffer().add(self.id, **update_dict)
 
     async def test_is_start_parse(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("parse", step_data)
 
     async def test_is_start_before(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("before", step_data)
 
     async def test_is_start_running(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("run", step_data)
 
     async def test_is_start_extract(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("extract", step_data)
 
     async def test_is_start_after(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("after", step_data)
 
     async def test_is_start_validate(self, step_data=None):
-        if isinstance(step_data, dict):
-            step_data = self.dumps(step_data)
         await self.update_step_process("validate", step_data)
 
 
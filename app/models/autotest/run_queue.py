@@ -0,0 +1,192 @@
+import datetime
+
+from tortoise import timezone
+
+from ..base_model import BaseModel, fields, pydantic_model_creator
+from .report import ApiReport, UiReport, AppReport
+
+
+REPORT_MODEL = {"api": ApiReport, "ui": UiReport, "app": AppReport}
+
+# 触发类型对应的优先级，数值越小越先执行，页面上调试的先执行，定时任务批量触发的最后执行
+TRIGGER_PRIORITY = {"page": 0, "pipeline": 1, "cron": 2}
+
+
+class RunLimit:
+    """
+    所有执行节点共用的并发上限，0为不限制，达到上限的测试留在队列中，不影响其他测试的领取
+    max_global: 执行中的测试总数
+    max_per_project: 同一个服务执行中的测试数
+    max_per_env: 同一个运行环境执行中的测试数
+    max_per_trigger_type: 每种触发类型执行中的测试数，{"cron": 5, "pipeline": 10}
+    """
+
+    def __init__(self, max_global=0, max_per_project=0, max_per_env=0, max_per_trigger_type: dict = None):
+        self.max_global = max_global
+        self.max_per_project = max_per_project
+        self.max_per_env = max_per_env
+        self.max_per_trigger_type = max_per_trigger_type or {}
+
+    def is_limited(self):
+        return bool(self.max_global or self.max_per_project or self.max_per_env or any(self.max_per_trigger_type.values()))
+
+    def get_limit_list(self, queue: dict):
+        """ 这条数据要检查的上限 [(统计的key, 查询条件, 上限)] """
+        limit_list = []
+        if self.max_global:
+            limit_list.append((("global",), {}, self.max_global))
+        if self.max_per_project and queue["project_id"] is not None:
+            limit_list.append((
+                ("project", queue["test_type"], queue["project_id"]),
+                {"test_type": queue["test_type"], "project_id": queue["project_id"]},
+                self.max_per_project
+            ))
+        if self.max_per_env and queue["env_code"] is not None:
+            limit_list.append((("env", queue["env_code"]), {"env_code": queue["env_code"]}, self.max_per_env))
+        if self.max_per_trigger_type.get(queue["trigger_type"]):
+            limit_list.append((
+                ("trigger_type", queue["trigger_type"]),
+                {"trigger_type": queue["trigger_type"]},
+                self.max_per_trigger_type[queue["trigger_type"]]
+            ))
+        return limit_list
+
+
+class RunQueue(BaseModel):
+    """ 测试执行队列，web服务只把要执行的测试写入队列，由执行器服务按优先级、先进先出拉取执行 """
+
+    test_type = fields.CharField(8, default="api", description="测试类型，api/ui/app")
+    run_type = fields.CharField(16, default="case", description="执行类型，api：接口调试、case：用例/任务")
+    trigger_type = fields.CharField(16, default="page", description="触发类型，page/pipeline/cron")
+    priority = fields.IntField(default=0, index=True, description="优先级，数值越小越先执行，0页面、1流水线、2定时任务")
+    report_id = fields.IntField(index=True, description="测试报告id")
+    project_id = fields.IntField(null=True, description="所属的服务id")
+    env_code = fields.CharField(128, null=True, description="运行环境")
+    run_args = fields.JSONField(default={}, description="实例化执行器的参数")
+    status = fields.IntField(default=0, index=True, description="执行状态：0等待执行、1执行中、2执行完成、3执行出错")
+    worker = fields.CharField(128, null=True, description="执行节点")
+    start_time = fields.DatetimeField(null=True, description="开始执行时间")
+    end_time = fields.DatetimeField(null=True, description="执行结束时间")
+    error = fields.TextField(null=True, description="执行出错的信息")
+
+    class Meta:
+        table = "auto_test_run_queue"
+        table_description = "测试执行队列表"
+
+    @classmethod
+    async def enqueue(cls, test_type, run_type, report_id, run_args: dict, project_id=None, env_code=None, user_id=None,
+                      trigger_type="page"):
+        """ 把要执行的测试写入队列，run_args 转为可json序列化的数据 """
+        return await cls.create(
+            test_type=test_type, run_type=run_type, report_id=report_id, project_id=project_id, env_code=env_code,
+            trigger_type=trigger_type, priority=TRIGGER_PRIORITY.get(trigger_type, 0),
+            run_args=cls.loads(cls.dumps(run_args)), create_user=user_id, update_user=user_id
+        )
+
+    @classmethod
+    async def get_running_count(cls, run_limit: RunLimit):
+        """ 执行中的测试数，{统计的key: 数量} """
+        running_count = {}
+        for queue in await cls.filter(status=1).values("test_type", "project_id", "env_code", "trigger_type"):
+            for key, _, _ in run_limit.get_limit_list(queue):
+                running_count[key] = running_count.get(key, 0) + 1
+        return running_count
+
+    @classmethod
+    async def is_over_limit(cls, limit_list: list):
+        """ 领取后再查一次执行中的数量，多个节点同时领取时，超出上限的退回队列 """
+        for _, query_filter, max_count in limit_list:
+            if await cls.filter(status=1, **query_filter).count() > max_count:
+                return True
+        return False
+
+    @classmethod
+    async def claim(cls, worker: str, limit: int, run_limit: RunLimit = None):
+        """ 领取等待执行的测试，先更新状态成功的节点才算领取到，多进程、多机器同时领取也不会重复执行
+        按优先级、入队顺序领取，达到 run_limit 上限的先跳过，留在队列中等下次领取
+        """
+        claimed_list = []
+        if limit <= 0:
+            return claimed_list
+        run_limit = run_limit or RunLimit()
+        is_limited = run_limit.is_limited()
+        waiting_list = await cls.filter(status=0).order_by("priority", "id").limit(limit * (20 if is_limited else 2)).values(
+            "id", "test_type", "project_id", "env_code", "trigger_type")
+        running_count = await cls.get_running_count(run_limit) if is_limited else {}
+        for queue in waiting_list:
+            limit_list = run_limit.get_limit_list(queue)
+            if any(running_count.get(key, 0) >= max_count for key, _, max_count in limit_list):
+                continue
+
+            now = datetime.datetime.now()
+            if not await cls.filter(id=queue["id"], status=0).update(status=1, worker=worker, start_time=now, update_time=now):
+                continue
+            if limit_list and await cls.is_over_limit(limit_list):
+                await cls.filter(id=queue["id"], status=1, worker=worker).update(status=0, worker=None, start_time=None)
+                continue
+
+            for key, _, _ in limit_list:
+                running_count[key] = running_count.get(key, 0) + 1
+            claimed_list.append(await cls.filter(id=queue["id"]).first())
+            if len(claimed_list) >= limit:
+                break
+        return claimed_list
+
+    @classmethod
+    async def get_metrics(cls, minutes=10):
+        """ 队列深度，以及最近 minutes 分钟开始执行的测试的排队耗时（秒） """
+        now = timezone.now()
+        waiting_count, oldest_wait = {}, 0
+        for trigger_type, create_time in await cls.filter(status=0).values_list("trigger_type", "create_time"):
+            waiting_count[trigger_type] = waiting_count.get(trigger_type, 0) + 1
+            oldest_wait = max(oldest_wait, (now - create_time).total_seconds())
+
+        start_time = datetime.datetime.now() - datetime.timedelta(minutes=minutes)
+        wait_list = [
+            (start - create).total_seconds() for create, start in
+            await cls.filter(start_time__gte=start_time).values_list("create_time", "start_time")
+        ]
+        return {
+            "waiting": sum(waiting_count.values()),
+            "waiting_by_trigger_type": waiting_count,
+            "oldest_wait_seconds": round(oldest_wait, 3),
+            "running": await cls.filter(status=1).count(),
+            "wait_seconds": {
+                "minutes": minutes,
+                "count": len(wait_list),
+                "avg": round(sum(wait_list) / len(wait_list), 3) if wait_list else 0,
+                "max": round(max(wait_list), 3) if wait_list else 0
+            }
+        }
+
+    @classmethod
+    async def heartbeat(cls, worker: str):
+        """ 执行节点心跳，刷新执行中的数据的更新时间 """
+        await cls.filter(worker=worker, status=1).update(update_time=datetime.datetime.now())
+
+    @classmethod
+    async def clear_lost(cls, time_out: int):
+        """ 执行节点超过 time_out 秒没有心跳，视为节点已退出，把执行中的数据和对应的报告标记为出错 """
+        last_time = datetime.datetime.now() - datetime.timedelta(seconds=time_out)
+        lost_count = 0
+        for queue in await cls.filter(status=1, update_time__lt=last_time):
+            if await cls.filter(id=queue.id, status=1, update_time__lt=last_time).update(
+                    status=3, end_time=datetime.datetime.now(), error="执行节点已失联"):
+                await queue.finish_report("执行节点已失联")
+                lost_count += 1
+        return lost_count
+
+    async def finish_report(self, error):
+        """ 没有正常执行完的测试，把报告标记为执行出错 """
+        report = await REPORT_MODEL[self.test_type].filter(id=self.report_id).first()
+        if report:
+            await report.run_error(error)
+
+    async def run_success(self):
+        await self.__class__.filter(id=self.id).update(status=2, end_time=datetime.datetime.now())
+
+    async def run_fail(self, error=None):
+        await self.__class__.filter(id=self.id).update(status=3, end_time=datetime.datetime.now(), error=error)
+        await self.finish_report(error or "执行出错")
+
+RunQueuePydantic = pydantic_model_creator(RunQueue, name="RunQueue")
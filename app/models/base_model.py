@@ -1,4 +1,4 @@
-from tortoise import Tortoise, fields, models
+from tortoise import Tortoise, fields, models, timezone
 from tortoise.contrib.pydantic import pydantic_model_creator  # 统一归口，都从此处引用 pydantic_model_creator
 
 from app.schemas.enums import DataStatusEnum
@@ -32,6 +32,7 @@ class BaseModel(models.Model, JsonUtil):
         if "num" in data: data.pop("num")
         if user: data["update_user"] = user.id
         if "id" in data: data.pop("id")
+        data["update_time"] = timezone.now()  # queryset.update 不会自动更新修改时间，执行器根据修改时间判断解析缓存是否可用
         return await self.__class__.filter(id=self.id).update(**data)
 
     async def model_delete(self):
@@ -49,11 +50,11 @@ class BaseModel(models.Model, JsonUtil):
 
     async def enable(self):
         """ 启用数据 """
-        await self.__class__.filter(id=self.id).update(status=DataStatusEnum.ENABLE)
+        await self.__class__.filter(id=self.id).update(status=DataStatusEnum.ENABLE, update_time=timezone.now())
 
     async def disable(self):
         """ 禁用数据 """
-        await self.__class__.filter(id=self.id).update(status=DataStatusEnum.DISABLE)
+        await self.__class__.filter(id=self.id).update(status=DataStatusEnum.DISABLE, update_time=timezone.now())
 
     async def copy(self, **kwargs):
         """ 复制对象数据并插入到数据库 """
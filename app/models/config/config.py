@@ -1,7 +1,56 @@
-from selenium.webdriver.common.keys import Keys
+import time
 
 from ..base_model import fields, pydantic_model_creator, NumFiled
 import config
+from config import ConfigCacheInfo
+
+
+class ConfigCache:
+    """
+    配置、运行环境、webhook 的进程内缓存，{key: (过期时间, 数据)}，数据在 ConfigCacheInfo.TTL 秒内直接从内存取
+    通过 web 服务修改数据后调 invalidate：清空本进程的缓存，并更新配置表中的 config_cache_version
+    每个进程最多每 ConfigCacheInfo.VERSION_CHECK_INTERVAL 秒查一次版本号，版本号变了则清空本进程的缓存
+    缓存的数据为多次调用共用，使用方不要修改
+    """
+    VERSION_NAME = "config_cache_version"
+    _cache = {}
+    _version = None
+    _version_check_time = 0
+
+    @classmethod
+    async def check_version(cls):
+        now = time.monotonic()
+        if now - cls._version_check_time < ConfigCacheInfo.VERSION_CHECK_INTERVAL:
+            return
+        cls._version_check_time = now
+        data = await Config.filter(name=cls.VERSION_NAME).first().values("value")
+        version = data["value"] if data else None
+        if version != cls._version:
+            cls._cache.clear()
+            cls._version = version
+
+    @classmethod
+    async def get(cls, key: tuple, loader):
+        """ 取缓存的数据，没有或者已过期时调 loader() 查询并缓存，loader 为返回协程的函数 """
+        if ConfigCacheInfo.TTL <= 0:
+            return await loader()
+        await cls.check_version()
+        cached = cls._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        value = await loader()
+        cls._cache[key] = (time.monotonic() + ConfigCacheInfo.TTL, value)
+        return value
+
+    @classmethod
+    async def invalidate(cls):
+        """ 清空本进程的缓存，并更新版本号，让其他进程也清空 """
+        cls._cache.clear()
+        cls._version = str(time.time_ns())
+        cls._version_check_time = time.monotonic()
+        if not await Config.filter(name=cls.VERSION_NAME).update(value=cls._version):
+            await Config.create(
+                name=cls.VERSION_NAME, value=cls._version, desc="配置缓存版本号，修改配置、运行环境、webhook后自动更新，用于通知其他进程刷新缓存")
 
 
 class ConfigType(NumFiled):
@@ -29,9 +78,14 @@ class Config(NumFiled):
 
     @classmethod
     async def get_config(cls, name: str):
-        """ 获取配置 """
+        """ 获取配置，优先取进程内缓存 """
+        return await ConfigCache.get(("config", name), lambda: cls.query_config(name))
+
+    @classmethod
+    async def query_config(cls, name: str):
+        """ 从数据库查配置，配置不存在时返回None """
         data = await cls.filter(name=name).first().values("value")
-        return data["value"]
+        return data["value"] if data else None
 
     @classmethod
     async def get_pip_command(cls):
@@ -87,6 +141,12 @@ class Config(NumFiled):
     async def get_pause_step_time_out(cls):
         return int(await cls.get_config("pause_step_time_out"))
 
+    @classmethod
+    async def get_run_case_concurrency(cls):
+        """ 并行执行用例时，最多同时执行的用例数，没有配置则默认为10 """
+        value = await cls.get_config("run_case_concurrency")
+        return int(value) if value else 10
+
     @classmethod
     async def get_response_time_level(cls):
         return cls.loads(await cls.get_config("response_time_level"))
@@ -103,6 +163,14 @@ class Config(NumFiled):
     async def get_holiday_list(cls):
         return cls.loads(await cls.get_config("holiday_list"))
 
+    @classmethod
+    async def get_holiday_set(cls):
+        """ 解析后的节假日集合 {"01-01", ...}，和配置一起缓存，修改配置后失效 """
+        async def loader():
+            value = await cls.query_config("holiday_list")
+            return frozenset(cls.loads(value) if value else [])
+        return await ConfigCache.get(("holiday_set",), loader)
+
     @classmethod
     async def get_shell_command_info(cls):
         """ 获取sell造数据的配置项 """
@@ -144,6 +212,7 @@ class Config(NumFiled):
         if conf_code.startswith("_") is False and conf_code and hasattr(config, conf_code):
             return getattr(config, conf_code)
         elif conf_code == "ui_key_board_code":
+            from selenium.webdriver.common.keys import Keys  # 导入selenium很慢，用到时才导入
             return {key: f'按键【{key}】' for key in dir(Keys) if key.startswith('_') is False}
         else:
             if conf_id:
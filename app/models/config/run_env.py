@@ -1,5 +1,6 @@
 from ..base_model import fields, pydantic_model_creator, BaseModel
 from app.models.config.business import BusinessLine
+from app.models.config.config import ConfigCache
 
 
 class RunEnv(BaseModel):
@@ -26,6 +27,11 @@ class RunEnv(BaseModel):
                 env_list = list(set(business.env_list).difference(set(env_id_list)))
             await business.model_update({"env_list": env_list})
 
+    @classmethod
+    async def get_by_code(cls, env_code):
+        """ 根据code获取数据，优先取进程内缓存，执行测试时用 """
+        return await ConfigCache.get(("run_env", env_code), lambda: cls.filter(code=env_code).first())
+
     @classmethod
     async def get_data_byid_or_code(cls, env_id=None, env_code=None):
         """ 根据id或者code获取数据 """
@@ -8,6 +8,7 @@ import urllib.parse
 import httpx
 
 from ..base_model import fields, BaseModel
+from .config import ConfigCache
 from app.schemas.enums import WebHookTypeEnum
 
 
@@ -29,7 +30,11 @@ class WebHook(BaseModel):
 
     @classmethod
     async def get_webhook_list(cls, webhook_type: WebHookTypeEnum, webhook_list: list):
-        query_list = await cls.filter(webhook_type=webhook_type, id__in=webhook_list).all().values("addr", "secret")
+        """ 获取加签后的webhook地址，地址和秘钥优先取进程内缓存，加签每次重新计算 """
+        query_list = await ConfigCache.get(
+            ("webhook", webhook_type, tuple(webhook_list)),
+            lambda: cls.filter(webhook_type=webhook_type, id__in=webhook_list).all().values("addr", "secret")
+        )
         return [cls.build_webhook_addr(webhook_type, data["addr"], data["secret"]) for data in query_list]
 
     @classmethod
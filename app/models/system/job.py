@@ -1,3 +1,8 @@
+import datetime
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+
 from ..base_model import BaseModel, fields, pydantic_model_creator
 
 
@@ -7,12 +12,48 @@ class ApschedulerJobs(BaseModel):
     task_code = fields.CharField(64, null=False)
     next_run_time = fields.CharField(128, description="任务下一次运行时间")
     job_id = fields.CharField(64, null=False, description="内存中的任务id")
+    skip_holiday = fields.IntField(default=1, description="是否跳过节假日、调休日，所有job节点按此创建任务")
 
     class Meta:
         table = "apscheduler_jobs"
         table_description = "定时任务执行计划表"
 
 
+class JobLease(BaseModel):
+    """ job服务的主节点租约，多个job进程中只有持有租约的节点触发定时任务 """
+    name = fields.CharField(64, unique=True, description="租约名")
+    holder = fields.CharField(128, null=True, description="持有租约的节点")
+    expire_time = fields.DatetimeField(null=True, description="租约过期时间")
+
+    class Meta:
+        table = "system_job_lease"
+        table_description = "job服务主节点租约表"
+
+    @classmethod
+    async def acquire(cls, name, holder, time_out):
+        """ 获取或续期租约，当前节点持有或租约已过期才能获取成功
+        返回 (是否获取成功, 之前的过期时间, 新的过期时间)，之前的过期时间用于新的主节点判断从哪个时间点开始接管定时任务
+        各节点用本机时间判断租约是否过期，部署时需保证机器时间同步
+        """
+        lease = await cls.filter(name=name).first()
+        if lease is None:
+            try:
+                lease = await cls.create(name=name)
+            except IntegrityError:  # 其他节点同时创建了
+                lease = await cls.filter(name=name).first()
+        now = datetime.datetime.now()
+        expire_time = now + datetime.timedelta(seconds=time_out)
+        is_success = await cls.filter(name=name).filter(
+            Q(holder=holder) | Q(holder=None) | Q(expire_time=None) | Q(expire_time__lt=now)
+        ).update(holder=holder, expire_time=expire_time)
+        return bool(is_success), lease.expire_time, expire_time
+
+    @classmethod
+    async def release(cls, name, holder):
+        """ 主动释放租约，其他节点从当前时间开始接管 """
+        await cls.filter(name=name, holder=holder).update(expire_time=datetime.datetime.now())
+
+
 class JobRunLog(BaseModel):
     """ 系统job执行记录 """
 
@@ -35,4 +76,5 @@ class JobRunLog(BaseModel):
 
 
 ApschedulerJobsPydantic = pydantic_model_creator(ApschedulerJobs, name="ApschedulerJobs")
+JobLeasePydantic = pydantic_model_creator(JobLease, name="JobLease")
 JobRunLogPydantic = pydantic_model_creator(JobRunLog, name="JobRunLog")
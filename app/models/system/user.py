@@ -2,13 +2,17 @@
 import datetime
 import random
 import string
+import time
+from collections import OrderedDict
 
 import jwt
 import hashlib
 from fastapi import Request
+from pydantic import ValidationError
 
 from ..base_model import BaseModel, fields, pydantic_model_creator, NumFiled
 from app.schemas.enums import DataStatusEnum
+from config import AuthInfo
 
 
 class Permission(BaseModel):
@@ -78,6 +82,45 @@ class RolePermissions(BaseModel):
         table_description = "角色权限映射表"
 
 
+class AccessTokenCache:
+    """
+    已解析的access_token缓存，{(token的sha256, 过期时间): 用户信息}，过期前同一个token只解析一次
+    最多缓存 AuthInfo.TOKEN_CACHE_SIZE 个，超过时淘汰最久没用到的，解析失败、缺少用户信息的token不缓存
+    """
+    _cache = OrderedDict()
+    _key_dict = {}  # {token的sha256: 缓存key}
+
+    @classmethod
+    def get(cls, token: str, secret_key: str):
+        token_hash = hashlib.sha256(f'{secret_key}.{token}'.encode("utf-8")).hexdigest()
+        if key := cls._key_dict.get(token_hash):
+            if key[1] > time.time():
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+            cls.pop(key)
+            return False
+
+        user = User.check_token(token, secret_key)
+        if not user:
+            return False
+        from app.schemas.base_form import CurrentUserModel
+        try:  # 只在解析时校验一次，缺少用户信息的token（比如refresh_token）视为无效
+            user_info = CurrentUserModel.model_validate(user).model_dump()
+        except ValidationError:
+            return False
+        user_info["api_permission_set"] = frozenset(user_info.get("api_permissions") or [])
+        key, user = (token_hash, user.get("exp") or 0), user_info
+        cls._key_dict[token_hash], cls._cache[key] = key, user
+        if len(cls._cache) > AuthInfo.TOKEN_CACHE_SIZE:
+            cls.pop(next(iter(cls._cache)))
+        return user
+
+    @classmethod
+    def pop(cls, key):
+        cls._cache.pop(key, None)
+        cls._key_dict.pop(key[0], None)
+
+
 class User(NumFiled):
     """ 用户表 """
     sso_user_id = fields.CharField(50, index=True, default='', description="该用户在oss数据库的账号")
@@ -125,6 +168,11 @@ class User(NumFiled):
         except jwt.exceptions.InvalidTokenError:
             return False
 
+    @classmethod
+    def check_access_token(cls, token: str, secret_key: str):
+        """ 解析access_token，优先取缓存，并把接口权限转为frozenset，返回的数据为多个请求共用，不要修改 """
+        return AccessTokenCache.get(token, secret_key)
+
     @classmethod
     def password_to_hash(cls, password, secret_key):
         """ h密码转hash值 """
@@ -219,6 +267,11 @@ class User(NumFiled):
     async def get_run_user_id(cls, request: Request):
         if hasattr(request.state, "user"):
             return request.state.user.id
+        return await cls.get_common_user_id()
+
+    @classmethod
+    async def get_common_user_id(cls):
+        """ 没有登录用户时（流水线、定时任务触发），用公共用户执行 """
         data = await User.filter(account='common').first().values("id")
         return data["id"]
 
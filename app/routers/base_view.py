@@ -96,8 +96,10 @@ class APIRouter(fastAPIRouter):
         """ 判断是否登录 """
         if cls.request_path_is_in_whitelist(request) is False:
             from app.models.system.model_factory import User
-            if user := User.check_token(request.headers.get("access-token", ""), request.app.conf.AuthInfo.SECRET_KEY):
-                request.state.user = CurrentUserModel(**user)
+            if user := User.check_access_token(request.headers.get("access-token", ""), request.app.conf.AuthInfo.SECRET_KEY):
+                # 缓存的用户信息已经校验过，直接构造不再逐个字段校验，业务线列表可能被修改，复制一份
+                request.state.user = CurrentUserModel.model_construct(
+                    **{**user, "business_list": list(user.get("business_list") or [])})
             else:
                 raise HTTPException(401, "请重新登录")
 
@@ -105,7 +107,8 @@ class APIRouter(fastAPIRouter):
     async def check_api_permission(cls, request: Request):
         """ 判断是否有api权限 """
         await cls.check_login(request)
-        if "admin" not in request.state.user.api_permissions and request.url.path not in request.state.user.api_permissions:
+        api_permission_set = request.state.user.api_permission_set
+        if "admin" not in api_permission_set and request.url.path not in api_permission_set:
             raise HTTPException(403, "权限不足")
 
     def add_route(self, path, func, methods: list, auth: Union[str, bool], *args, **kwargs):
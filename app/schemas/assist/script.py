@@ -1,5 +1,4 @@
 import re
-import importlib
 import traceback
 
 from typing import Optional
@@ -7,7 +6,7 @@ from pydantic import Field
 
 from ..base_form import BaseForm, PaginationForm, ChangeSortForm
 from ...models.assist.model_factory import Script
-from utils.util.file_util import FileUtil
+from utils.util.script_module_cache import ScriptModuleCache
 
 
 class FindScriptForm(PaginationForm):
@@ -79,13 +78,14 @@ class CreatScriptForm(BaseForm):
                     if func_name.startswith(self.name) is False:
                         raise ValueError(f'函数【{func_name}】命名格式错误，请以【脚本名_函数名】命名')
 
-            # 把自定义函数脚本内容写入到python脚本中,
-            await Script.create_script_file(default_env)  # 重新发版时会把文件全部删除，所以全部创建
-            FileUtil.save_script_data(f'{default_env}_{self.name}', self.script_data, env=default_env)
-
-            # 动态导入脚本，语法有错误则不保存
+            # 先同步其他脚本，校验时能导入被引用的脚本，再单独编译当前脚本，语法有错误则不保存
+            await Script.sync_script_module(default_env)
             try:
-                script_obj = importlib.reload(importlib.import_module(f'script_list.{default_env}_{self.name}'))
+                ScriptModuleCache.compile_module(
+                    ScriptModuleCache.get_module_name(default_env, self.name),
+                    ScriptModuleCache.build_source(default_env, self.script_data),
+                    register=False
+                )
             except Exception as e:
                 raise ValueError({
                     "msg": "语法错误，请检查",
@@ -4,6 +4,7 @@ import re
 import httpx
 from typing import Optional, Union
 from pydantic import BaseModel as pydanticBaseModel, Field
+from tortoise import timezone
 
 from utils.client.test_runner.parser import extract_variables, parse_function, extract_functions
 from utils.util.json_util import JsonUtil
@@ -16,6 +17,7 @@ class CurrentUserModel(pydanticBaseModel):
     name: Optional[str]
     business_list: Optional[list]
     api_permissions: Optional[list]
+    api_permission_set: Optional[frozenset] = None  # 由 api_permissions 转换，用于O(1)判断接口权限
 
 
 class ParamModel(pydanticBaseModel):
@@ -95,7 +97,9 @@ class BaseForm(pydanticBaseModel, JsonUtil):
         """ 获取更新的数据 """
         data = self.model_dump()
         if "num" in data: data.pop("num")
-        if user_id: data["update_user"] = user_id
+        if user_id:
+            data["update_user"] = user_id
+            data["update_time"] = timezone.now()  # queryset.update 不会自动更新修改时间
         if "id" in data: data.pop("id")
         return data
 
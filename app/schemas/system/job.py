@@ -25,6 +25,11 @@ class GetJobForm(BaseForm):
     task_code: str = Field(..., title="job code")
 
 
+class GetJobScheduleForm(BaseForm):
+    """ 获取定时任务触发计划 """
+    days: int = Field(7, ge=1, le=31, title="未来多少天")
+
+
 class EnableJobForm(BaseForm):
     """ 新增job信息 """
     func_name: str = Field(..., title="job方法")
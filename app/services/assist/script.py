@@ -1,6 +1,3 @@
-import importlib
-import sys
-import types
 import traceback
 
 from fastapi import Request, Depends
@@ -8,7 +5,7 @@ from fastapi import Request, Depends
 from ...models.config.config import Config
 from ...models.assist.model_factory import Script
 from ...models.autotest.model_factory import ApiProject, AppProject, UiProject
-from utils.util.file_util import FileUtil
+from utils.util.script_module_cache import ScriptModuleCache
 from utils.logs.redirect_print_log import RedirectPrintLogToMemory
 from utils.client.test_runner.parser import parse_function, extract_functions
 from ...schemas.assist import script as schema
@@ -35,22 +32,18 @@ async def copy_script(request: Request, form: schema.GetScriptForm):
 
 async def debug_script(request: Request, form: schema.DebugScriptForm):
     script = await Script.validate_is_exist("数据不存在", id=form.id)
-    name, expression = f'{form.env}_{script.name}', form.expression
-    await Script.create_script_file(form.env)  # 把自定义函数脚本内容写入到python脚本中
+    await Script.sync_script_module(form.env)  # 把自定义函数脚本内容同步到模块缓存
+
+    # 重定向当前请求中print的内容到内存
+    redirect = RedirectPrintLogToMemory()
 
     # 动态导入脚本
     try:
-        import_path = f'script_list.{name}'
-        func_list = importlib.reload(importlib.import_module(import_path))
-        module_functions_dict = {
-            name: item for name, item in vars(func_list).items() if isinstance(item, types.FunctionType)
-        }
-        ext_func = extract_functions(expression)
+        module_functions_dict = ScriptModuleCache.get_functions(form.env, script.name)
+        ext_func = extract_functions(form.expression)
         func_info = parse_function(ext_func[0])
         func_name, args, kwargs = func_info["func_name"], func_info["args"], func_info["kwargs"]
 
-        # 重定向print内容到内存
-        redirect = RedirectPrintLogToMemory()
         result = await Script.run_func(module_functions_dict[func_name], args, kwargs)
         script_print = redirect.get_text_and_redirect_to_default()
 
@@ -59,17 +52,17 @@ async def debug_script(request: Request, form: schema.DebugScriptForm):
             "expression": form.expression,
             "result": result,
             "script_print": script_print,
-            "script": FileUtil.get_func_data_by_script_name(f'{form.env}_{script.name}')
+            "script": ScriptModuleCache.get_source(form.env, script.name)
         })
     except Exception as e:
-        sys.stdout = sys.__stdout__  # 恢复输出到console
+        redirect.redirect_to_default()  # 恢复输出到console
         error_data = "\n".join("{}".format(traceback.format_exc()).split("↵"))
         request.app.logger.error(error_data)
         return request.app.fail(msg="语法错误，请检查", result={
             "env": form.env,
             "expression": form.expression,
             "result": error_data,
-            "script": FileUtil.get_func_data_by_script_name(f'{form.env}_{script.name}')
+            "script": ScriptModuleCache.get_source(form.env, script.name)
         })
 
 
@@ -88,7 +81,9 @@ async def add_script(request: Request, form: schema.CreatScriptForm):
 async def change_script(request: Request, form: schema.EditScriptForm):
     save_func_permissions = await Config.get_save_func_permissions()
     await form.validate_request(request.state.user, save_func_permissions)
+    old_script = await Script.filter(id=form.id).first().values("name")
     await Script.filter(id=form.id).update(**form.get_update_data(request.state.user.id))
+    ScriptModuleCache.invalidate(old_script["name"])
     return request.app.put_success()
 
 
@@ -114,4 +109,5 @@ async def delete_script(request: Request, form: schema.DeleteScriptForm):
             raise ValueError(f'{name}【{project["name"]}】已引用此脚本文件，请先解除依赖再删除')
 
     await script.model_delete()
+    ScriptModuleCache.invalidate(script.name)
     return request.app.delete_success()
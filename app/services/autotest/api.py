@@ -1,16 +1,14 @@
 # -*- coding: utf-8 -*-
-import asyncio
 import copy
 import os.path
 
 from fastapi import Request, UploadFile, File, Form, Depends
 from fastapi.responses import FileResponse
 
-from ...models.autotest.model_factory import ApiMsg as Api, ModelSelector
+from ...models.autotest.model_factory import ApiMsg as Api, ModelSelector, RunQueue
 from ...schemas.autotest import api as schema
 from utils.util.file_util import STATIC_ADDRESS
 from utils.parse.parse_excel import parse_file_content
-from utils.client.run_api_test import RunApi
 
 
 async def get_api_list(request: Request, form: schema.ApiListForm = Depends()):
@@ -166,8 +164,10 @@ async def run_api(request: Request, form: schema.RunApiMsgForm):
             summary=summary
         )
 
-        asyncio.create_task(RunApi(
-            api_id_list=run_api_list, report_id=report.id, env_code=env_code, env_name=env_code
-        ).parse_and_run())
+        # 写入执行队列，由执行器服务执行测试
+        await RunQueue.enqueue(
+            "api", "api", report.id, project_id=first_api["project_id"], env_code=env_code, user_id=request.state.user.id,
+            run_args=dict(api_id_list=run_api_list, report_id=report.id, env_code=env_code, env_name=env_code)
+        )
 
     return request.app.trigger_success({"batch_id": batch_id})
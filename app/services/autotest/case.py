@@ -1,9 +1,8 @@
-from fastapi import Request, Depends, BackgroundTasks
+from fastapi import Request, Depends
+from tortoise import timezone
 
-from utils.client.run_api_test import RunCase as RunApiCase
-from utils.client.run_ui_test import RunCase as RunUiCase
 from app.schemas.enums import CaseStatusEnum
-from ...models.autotest.model_factory import ModelSelector
+from ...models.autotest.model_factory import ModelSelector, RunQueue
 from ...models.config.config import Config
 from ...models.config.run_env import RunEnv
 from ...models.system.user import User
@@ -61,7 +60,7 @@ async def change_case_status(request: Request, form: schema.ChangeCaseStatusForm
 
 async def change_case_parent(request: Request, form: schema.ChangeCaseParentForm):
     models = ModelSelector(request.app.test_type)
-    await models.case.filter(id__in=form.id_list).update(suite_id=form.suite_id)
+    await models.case.filter(id__in=form.id_list).update(suite_id=form.suite_id, update_time=timezone.now())
     return request.app.put_success()
 
 
@@ -166,8 +165,7 @@ async def delete_case(request: Request, form: schema.DeleteCaseForm):
     return request.app.delete_success()
 
 
-async def run_case(request: Request, form: schema.RunCaseForm, background_tasks: BackgroundTasks):
-    case_runner = RunApiCase if request.app.test_type == "api" else RunUiCase
+async def run_case(request: Request, form: schema.RunCaseForm):
     models = ModelSelector(request.app.test_type)
 
     case_id_list = [data["id"] for data in await models.case.filter(id__in=form.id_list).all().values("id")]
@@ -201,12 +199,14 @@ async def run_case(request: Request, form: schema.RunCaseForm, background_tasks:
             run_type="case", env=env_code, trigger_type="page", temp_variables=form.temp_variables,
             summary=summary, create_user=user_id, update_user=user_id
         )
-        # 后台任务运行测试
-        background_tasks.add_task(case_runner(
-            report_id=report.id, case_id_list=case_id_list, is_async=form.is_async, env_code=env_code, env_name=env["name"],
-            browser=form.browser, temp_variables=form.temp_variables, run_type=request.app.test_type,
-            appium_config=appium_config, insert_to=form.insert_to, skip_on_fail=form.skip_on_fail
-        ).parse_and_run)
+        # 写入执行队列，由执行器服务执行测试
+        await RunQueue.enqueue(
+            request.app.test_type, "case", report.id, project_id=suite["project_id"], env_code=env_code, user_id=user_id,
+            run_args=dict(
+                report_id=report.id, case_id_list=case_id_list, is_async=form.is_async, env_code=env_code, env_name=env["name"],
+                browser=form.browser, temp_variables=form.temp_variables, run_type=request.app.test_type,
+                appium_config=appium_config, insert_to=form.insert_to, skip_on_fail=form.skip_on_fail
+            ))
 
     return request.app.trigger_success({
         "batch_id": batch_id,
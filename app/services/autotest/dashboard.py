@@ -1,9 +1,11 @@
+import datetime
+
 from fastapi import Request
 from tortoise import functions, expressions
 
 
 from app.models.autotest.model_factory import ApiProject as Project, ApiModule as Module, ApiMsg as Api, \
-    ApiCase as Case, ApiStep as Step, ApiTask as Task, ApiReport as Report
+    ApiCase as Case, ApiStep as Step, ApiTask as Task, ApiReport as Report, ReportDailyStat
 from utils.util.time_util import get_now, time_calculate, get_week_start_and_end
 from app.schemas.enums import DataStatusEnum, CaseStatusEnum
 
@@ -21,9 +23,28 @@ async def get_data_by_time(model):
     ).first().values('last_day_add', 'to_day_add', 'last_week_add', 'current_week_add', 'last_month_add')
 
 
+def get_report_data_by_date(stat_list):
+    """ 按报告汇总数据获取时间维度的统计，与 get_data_by_time 的时间段一致 """
+    today = datetime.date.today()
+    last_start_time, last_end_time = get_week_start_and_end(1)
+    current_start_time, current_end_time = get_week_start_and_end(0)
+    date_range_dict = {
+        "last_day_add": [today - datetime.timedelta(days=1), today - datetime.timedelta(days=1)],
+        "to_day_add": [today, today],
+        "last_week_add": [last_start_time.date(), last_end_time.date()],
+        "current_week_add": [current_start_time.date(), current_end_time.date()],
+        "last_month_add": [today - datetime.timedelta(days=30), today]
+    }
+    return {
+        key: sum(stat["report_count"] for stat in stat_list if start_date <= stat["stat_date"] <= end_date)
+        for key, (start_date, end_date) in date_range_dict.items()
+    }
+
+
 async def get_api_test_title(request: Request):
     return request.app.get_success([
-        {"name": "report", "title": "测试报告数", "total": await Report.filter().all().count()},
+        {"name": "report", "title": "测试报告数", "total": sum(
+            stat["report_count"] for stat in await ReportDailyStat.get_stat_list(Report, ["test_type"]))},
         {"name": "api", "title": "接口数", "total": await Api.filter().all().count()},
         {"name": "case", "title": "用例数", "total": await Case.filter().all().count()},
         {"name": "step", "title": "测试步骤数", "total": await Step.filter().all().count()}
@@ -174,24 +195,22 @@ async def get_api_test_task(request: Request):
 
 
 async def get_api_test_report(request: Request):
-    res = await Report.annotate(
-        all=functions.Count('id'),
-        is_passed_count=functions.Count('id', _filter=expressions.Q(is_passed=1)),
-        not_passed_count=functions.Count('id', _filter=expressions.Q(is_passed__not=1)),
-        api_report_count=functions.Count('id', _filter=expressions.Q(run_type="api")),
-        case_report_count=functions.Count('id', _filter=expressions.Q(run_type="case")),
-        suite_report_count=functions.Count('id', _filter=expressions.Q(run_type="set")),
-        task_report_count=functions.Count('id', _filter=expressions.Q(run_type="task"))
-    ).first().values(
-        'all',
-        'is_passed_count',
-        'not_passed_count',
-        'api_report_count',
-        'case_report_count',
-        'suite_report_count',
-        'task_report_count'
-    )
-    time_data = await get_data_by_time(Report)
+    stat_list = await ReportDailyStat.get_stat_list(Report, ["stat_date", "run_type"])
+    all_count = sum(stat["report_count"] for stat in stat_list)
+    is_passed_count = sum(stat["pass_report_count"] for stat in stat_list)
+    run_type_count = {}
+    for stat in stat_list:
+        run_type_count[stat["run_type"]] = run_type_count.get(stat["run_type"], 0) + stat["report_count"]
+    res = {
+        "all": all_count,
+        "is_passed_count": is_passed_count,
+        "not_passed_count": all_count - is_passed_count,
+        "api_report_count": run_type_count.get("api", 0),
+        "case_report_count": run_type_count.get("case", 0),
+        "suite_report_count": run_type_count.get("set", 0),
+        "task_report_count": run_type_count.get("task", 0)
+    }
+    time_data = get_report_data_by_date(stat_list)
     return request.app.success("获取成功", data={
         "title": "测试报告",
         "options": [
@@ -122,6 +122,7 @@ async def get_report_step_list(request: Request, form: schema.GetReportStepListF
 async def get_report_step(request: Request, form: schema.GetReportStepForm = Depends()):
     models = ModelSelector(request.app.test_type)
     data = await models.report_step.validate_is_exist("数据不存在", id=form.id)
+    await data.inline_step_data()
     return request.app.get_success(data)
 
 
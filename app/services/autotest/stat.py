@@ -1,44 +1,39 @@
+import datetime
+
 from fastapi import Request, Depends
 
-from ...models.autotest.model_factory import ApiReport as Report, ApiProject as Project
+from ...models.autotest.model_factory import ApiReport as Report, ApiProject as Project, ReportDailyStat
 from app.models.config.model_factory import BusinessLine
-from utils.util.time_util import time_calculate, get_now
 from ...schemas.autotest import stat as schema
 
 
-async def get_use_stat(time_slot, project_list: list = [], get_card=False):
+async def get_use_stat_list(time_slot):
+    """ 从报告按天汇总数据中获取时间段内各服务、各触发类型的报告数 """
+    start_date = datetime.date.today() + datetime.timedelta(days=int(time_slot))
+    return await ReportDailyStat.get_stat_list(
+        Report, ["project_id", "trigger_type"], stat_date__gte=start_date, trigger_type__in=["page", "cron"])
+
+
+def get_use_stat(stat_list: list, project_list: list = [], get_card=False):
     """ 获取时间段的统计 """
     page_trigger_count, page_trigger_pass_count, page_trigger_pass_rate = 0, 0, 0  # 页面触发使用次数维度
     patrol_count, patrol_pass_count, patrol_pass_rate = 0, 0, 0  # 巡检维度
 
-    start_time, end_time = time_calculate(time_slot), get_now()
-    time_filter = {"create_time__range": [start_time, end_time]}
-
-    if get_card:
-        # 人工使用（页面触发）统计
-        page_trigger_count = await Report.filter(**time_filter, trigger_type='page').count()
+    if get_card or project_list:
+        project_set = set(project_list)
+        for stat in stat_list:
+            if not get_card and stat["project_id"] not in project_set:
+                continue
+            if stat["trigger_type"] == "page":  # 人工使用（页面触发）统计
+                page_trigger_count += stat["report_count"]
+                page_trigger_pass_count += stat["pass_report_count"]
+            else:  # cron巡检统计
+                patrol_count += stat["report_count"]
+                patrol_pass_count += stat["pass_report_count"]
         if page_trigger_count > 0:
-            page_trigger_pass_count = await Report.filter(**time_filter, trigger_type='page', is_passed=1).count()
             page_trigger_pass_rate = round(page_trigger_pass_count / page_trigger_count, 4)
-
-        # cron巡检统计
-        patrol_count = await Report.filter(**time_filter, trigger_type='cron').count()
         if patrol_count > 0:
-            patrol_pass_count = await Report.filter(**time_filter, trigger_type='cron', is_passed=1).count()
             patrol_pass_rate = round(patrol_pass_count / patrol_count, 4)
-    else:
-        if project_list:
-            # 人工使用（页面触发）统计
-            page_trigger_count = await Report.filter(**time_filter, project_id__in=project_list, trigger_type='page').count()
-            if page_trigger_count > 0:
-                page_trigger_pass_count = await Report.filter(**time_filter, project_id__in=project_list, trigger_type='page', is_passed=1).count()
-                page_trigger_pass_rate = round(page_trigger_pass_count / page_trigger_count, 4)
-
-            # cron巡检统计
-            patrol_count = await Report.filter(**time_filter, project_id__in=project_list, trigger_type='page').count()
-            if patrol_count > 0:
-                patrol_pass_count = await Report.filter(**time_filter, project_id__in=project_list, trigger_type='cron', is_passed=1).count()
-                patrol_pass_rate = round(patrol_pass_count / patrol_count, 4)
     return {
         "page_trigger_count": page_trigger_count,
         "page_trigger_pass_count": page_trigger_pass_count,
@@ -49,9 +44,8 @@ async def get_use_stat(time_slot, project_list: list = [], get_card=False):
     }
 
 
-
 async def get_use_card(request: Request, form: schema.UseCountForm = Depends()):
-    use_stat = await get_use_stat(form.time_slot, get_card=True)
+    use_stat = get_use_stat(await get_use_stat_list(form.time_slot), get_card=True)
     return request.app.get_success(data=use_stat)
 
 
@@ -60,11 +54,15 @@ async def get_use_chart(request: Request, form: schema.UseCountForm = Depends())
     page_trigger_count_list, page_trigger_pass_count_list, page_trigger_pass_rate_list = [], [], []  # 页面使用维度
     patrol_count_list, patrol_pass_count_list, patrol_pass_rate_list = [], [], []  # 巡检维度
 
+    stat_list = await get_use_stat_list(form.time_slot)
+    business_project_dict = {}  # {业务线id: [服务id]}
+    for project in await Project.filter().values("id", "business_id"):
+        business_project_dict.setdefault(project["business_id"], []).append(project["id"])
+
     business_list = await BusinessLine.filter().values("id", "name")  # [{"id", 1, "name": "公共业务线"}]
     for business_line in business_list:
         options_list.append(business_line["name"])
-        project_id_list = await Project.filter(business_id=business_line["id"]).values("id")  # [{"id", 1}]
-        business_stat = await get_use_stat(form.time_slot, [data["id"] for data in project_id_list])
+        business_stat = get_use_stat(stat_list, business_project_dict.get(business_line["id"], []))
 
         page_trigger_count_list.append(business_stat.get("page_trigger_count", 0))
         page_trigger_pass_count_list.append(business_stat.get("page_trigger_pass_count", 0))
@@ -1,10 +1,9 @@
 from fastapi import Request, Depends
-from selenium.webdriver.common.keys import Keys
+from tortoise import timezone
 
 from ...models.autotest.model_factory import ModelSelector
 from ...schemas.autotest import step as schema
-from config import ui_action_mapping_list, ui_assert_mapping_list, ui_extract_mapping_list, app_action_mapping_list, \
-    app_extract_mapping_list, app_assert_mapping_list
+from config import ClientMapping
 
 
 async def get_step_list(request: Request, form: schema.GetStepListForm = Depends()):
@@ -15,24 +14,19 @@ async def get_step_list(request: Request, form: schema.GetStepListForm = Depends
 
 
 def get_step_execute_mapping(request: Request):
-    if request.app.test_type == "ui":
-        return request.app.get_success(ui_action_mapping_list)
-    return request.app.get_success(app_action_mapping_list)
+    return request.app.get_success(ClientMapping.get(request.app.test_type)["action_mapping_list"])
 
 
 def get_step_extract_mapping(request: Request):
-    if request.app.test_type == "ui":
-        return request.app.get_success(ui_extract_mapping_list)
-    return request.app.get_success(app_extract_mapping_list)
+    return request.app.get_success(ClientMapping.get(request.app.test_type)["extract_mapping_list"])
 
 
 def get_step_assert_mapping(request: Request):
-    if request.app.test_type == "ui":
-        return request.app.get_success(ui_assert_mapping_list)
-    return request.app.get_success(app_assert_mapping_list)
+    return request.app.get_success(ClientMapping.get(request.app.test_type)["assert_mapping_list"])
 
 
 def get_step_key_board_code(request: Request):
+    from selenium.webdriver.common.keys import Keys  # 导入selenium很慢，用到时才导入
     return request.app.get_success({key: f'按键【{key}】' for key in dir(Keys) if key.startswith('_') is False})
 
 
@@ -44,14 +38,14 @@ async def change_step_sort(request: Request, form: schema.ChangeSortForm):
 
 async def change_step_status(request: Request, form: schema.ChangeStepStatusForm):
     models = ModelSelector(request.app.test_type)
-    await models.step.filter(id__in=form.id_list).update(status=form.status)
+    await models.step.filter(id__in=form.id_list).update(status=form.status, update_time=timezone.now())
     return request.app.put_success()
 
 
 async def change_step_element(request: Request, form: schema.ChangeStepElement):
     models = ModelSelector(request.app.test_type)
     data = {"api_id": form.element_id} if request.app.test_type == "api" else {"element_id": form.element_id}
-    await models.step.filter(id=form.id).update(**data)
+    await models.step.filter(id=form.id).update(**data, update_time=timezone.now())
     return request.app.put_success()
 
 
@@ -1,12 +1,10 @@
-from fastapi import Request, Depends, BackgroundTasks
+from fastapi import Request, Depends
 
-from ...models.autotest.model_factory import ModelSelector
+from ...models.autotest.model_factory import ModelSelector, RunQueue
 from ...models.config.config import Config
 from ...models.config.run_env import RunEnv
 from ...models.system.user import User
 from ...schemas.autotest import task as schema
-from utils.client.run_api_test import RunCase as RunApiCase
-from utils.client.run_ui_test import RunCase as RunUiCase
 from ...schemas.enums import DataStatusEnum
 
 
@@ -83,18 +81,22 @@ async def disable_task(request: Request, form: schema.GetTaskForm):
     return request.app.success("任务禁用成功")
 
 
-async def run_task(request: Request, form: schema.RunTaskForm, background_tasks: BackgroundTasks):
-    case_runner = RunApiCase if request.app.test_type == "api" else RunUiCase
-    models = ModelSelector(request.app.test_type)
+async def run_task(request: Request, form: schema.RunTaskForm):
+    user_id = await User.get_run_user_id(request)
+    return request.app.trigger_success(await enqueue_task(request.app.test_type, form, user_id))
+
+
+async def enqueue_task(test_type, form: schema.RunTaskForm, user_id):
+    """ 生成测试报告并写入执行队列，页面、流水线触发和job服务的定时触发共用 """
+    models = ModelSelector(test_type)
     task = await models.task.validate_is_exist("任务不存在", id=form.id_list[0])
     case_id_list = await models.suite.get_case_id(models.case, task.project_id, task.suite_ids, task.case_ids)
-    user_id = await User.get_run_user_id(request)
     batch_id = models.report.get_batch_id(user_id)
     env_list = form.env_list or task.env_list
 
     # 如果是app自动化测试，需要获取设备数据
     appium_config = {}
-    if request.app.test_type == "app":
+    if test_type == "app":
         server_id = form.server_id or task.conf["server_id"]
         phone_id = form.phone_id or task.conf["phone_id"]
         no_reset = form.no_reset or task.conf["no_reset"]
@@ -118,14 +120,14 @@ async def run_task(request: Request, form: schema.RunTaskForm, background_tasks:
             summary=summary, create_user=user_id, update_user=user_id
         )
 
-        # 后台任务运行测试
-        background_tasks.add_task(case_runner(
-            report_id=report.id, case_id_list=case_id_list, is_async=form.is_async, env_code=env_code, env_name=env["name"],
-            browser=form.browser or task.conf["browser"], task_dict=dict(task), temp_variables=form.temp_variables, run_type=request.app.test_type,
-            extend={}, appium_config=appium_config, skip_on_fail=form.skip_on_fail if form.skip_on_fail is not None else task.skip_on_fail
-        ).parse_and_run)
-
-    return request.app.trigger_success({
-        "batch_id": batch_id,
-        "report_id": report.id if len(env_list) == 1 else None
-    })
+        # 写入执行队列，由执行器服务执行测试
+        await RunQueue.enqueue(
+            test_type, "case", report.id, project_id=task.project_id, env_code=env_code, user_id=user_id,
+            trigger_type=form.trigger_type.value,
+            run_args=dict(
+                report_id=report.id, case_id_list=case_id_list, is_async=form.is_async, env_code=env_code, env_name=env["name"],
+                browser=form.browser or task.conf["browser"], task_dict=dict(task), temp_variables=form.temp_variables, run_type=test_type,
+                extend={}, appium_config=appium_config, skip_on_fail=form.skip_on_fail if form.skip_on_fail is not None else task.skip_on_fail
+            ))
+
+    return {"batch_id": batch_id, "report_id": report.id if len(env_list) == 1 else None}
@@ -1,7 +1,7 @@
 from fastapi import Request, Depends
 
 from ...schemas.config import config as schema
-from ...models.config.model_factory import Config, ConfigType
+from ...models.config.model_factory import Config, ConfigType, ConfigCache
 
 
 async def get_config_type_list(request: Request, form: schema.GetConfigTypeListForm = Depends()):
@@ -61,6 +61,7 @@ async def change_config_api_validator(request: Request, form: schema.AddApiDefau
     conf_value = conf.loads(conf["value"])
     conf_value.append(form.model_dump())
     await Config.filter(name='api_default_validator').update(value=conf.dumps(conf_value))
+    await ConfigCache.invalidate()
     return request.app.put_success()
 
 
@@ -92,14 +93,17 @@ async def get_config_detail(request: Request, form: schema.GetConfigForm = Depen
 
 async def add_config(request: Request, form: schema.PostConfigForm):
     await Config.model_create(form.model_dump(), request.state.user)
+    await ConfigCache.invalidate()
     return request.app.post_success()
 
 
 async def change_config(request: Request, form: schema.PutConfigForm):
     await Config.filter(id=form.id).update(**form.get_update_data(request.state.user.id))
+    await ConfigCache.invalidate()
     return request.app.put_success()
 
 
 async def delete_config(request: Request, form: schema.GetConfigByIdForm):
     await Config.filter(id=form.id).delete()
+    await ConfigCache.invalidate()
     return request.app.delete_success()
@@ -1,6 +1,6 @@
 from fastapi import Request, Depends
 
-from ...models.config.model_factory import RunEnv, RunEnvPydantic, BusinessLine
+from ...models.config.model_factory import RunEnv, RunEnvPydantic, BusinessLine, ConfigCache
 from ...models.autotest.model_factory import ApiProject, ApiProjectEnv, AppProject, AppProjectEnv, UiProject, \
     UiProjectEnv
 
@@ -56,14 +56,17 @@ async def add_run_env(request: Request, form: schema.PostRunEnvForm):
         business_list = await BusinessLine.get_auto_bind_env_id_list()
         await RunEnv.env_to_business([run_env.id], business_list, "add")
 
+    await ConfigCache.invalidate()
     return request.app.post_success()
 
 
 async def change_run_env(request: Request, form: schema.PutRunEnvForm):
     await RunEnv.filter(id=form.id).update(**form.get_update_data(request.state.user.id))
+    await ConfigCache.invalidate()
     return request.app.put_success()
 
 
 async def delete_run_env(request: Request, form: schema.GetRunEnvForm):
     await RunEnv.filter(id=form.id).delete()
+    await ConfigCache.invalidate()
     return request.app.delete_success()
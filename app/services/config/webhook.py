@@ -2,7 +2,7 @@ import traceback
 
 from fastapi import Request, Depends
 
-from ...models.config.model_factory import WebHook
+from ...models.config.model_factory import WebHook, ConfigCache
 from app.schemas.enums import WebHookTypeEnum
 from utils.message.template import debug_msg_ding_ding, debug_msg_we_chat
 from ...schemas.config import webhook as schema
@@ -54,9 +54,11 @@ async def add_webhook(request: Request, form: schema.PostWebHookForm):
 
 async def change_webhook(request: Request, form: schema.PutWebHookForm):
     await WebHook.filter(id=form.id).update(**form.get_update_data(request.state.user.id))
+    await ConfigCache.invalidate()
     return request.app.put_success()
 
 
 async def delete_webhook(request: Request, form: schema.GetWebHookForm):
     await WebHook.filter(id=form.id).delete()
+    await ConfigCache.invalidate()
     return request.app.delete_success()
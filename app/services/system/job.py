@@ -15,11 +15,12 @@ from ...models.autotest.project import ApiProject, ApiProjectEnv, UiProject, App
 from ...models.autotest.step import ApiStep, UiStep, AppStep
 from ...models.autotest.suite import ApiCaseSuite, UiCaseSuite, AppCaseSuite
 from ...models.autotest.task import ApiTask, UiTask, AppTask
-from ...models.system.model_factory import ApschedulerJobs, JobRunLog
+from ...models.system.model_factory import ApschedulerJobs, JobRunLog, JobLease
 from ...models.config.model_factory import BusinessLine
 from ...models.autotest.model_factory import ApiProject as Project, ApiReport, ApiReportCase, ApiReportStep, \
-    UiReport, UiReportCase, UiReportStep, AppReport, AppReportCase, AppReportStep
+    UiReport, UiReportCase, UiReportStep, AppReport, AppReportCase, AppReportStep, ReportDailyStat
 from utils.util.file_util import FileUtil
+from utils.util.report_body_store import ReportBodyStore
 from utils.message.send_report import send_business_stage_count
 from config import ServerInfo
 
@@ -97,6 +98,23 @@ class JobFuncs:
         await AppReportCase.filter(report_id__in=delete_report_id).delete()
         await AppReportStep.filter(report_id__in=delete_report_id).delete()
 
+    @classmethod
+    async def cron_clear_report_body(cls):
+        """
+        {
+            "name": "清理没有被测试报告引用的请求体、响应体",
+            "id": "cron_clear_report_body",
+            "cron": "0 50 2 * * ?"
+        }
+        """
+        # 被 '自动化问题记录' 的报告不会被清理，刷新其引用的内容的被引用时间
+        for test_type, report_step_model in [("api", ApiReportStep), ("ui", UiReportStep), ("app", AppReportStep)]:
+            hits_report_id = await Hits.filter(test_type=test_type).all().values_list("report_id", flat=True)
+            step_data_list = await report_step_model.filter(
+                report_id__in=hits_report_id).values_list("step_data", flat=True)
+            await ReportBodyStore.touch(step_data_list)
+        await ReportBodyStore.clear_expired()
+
     @classmethod
     async def cron_clear_step(cls):
         """
@@ -132,6 +150,34 @@ class JobFuncs:
                 await ApiMsg.filter(id=api_id).update(use_count=use_count)
         await run_log.run_success(change_dict)
 
+    @classmethod
+    async def cron_report_daily_stat(cls):
+        """
+        {
+            "name": "按报告表重新汇总之前日期的测试报告按天统计数据",
+            "id": "cron_report_daily_stat",
+            "cron": "0 40 0 * * ?",
+            "skip_holiday": false
+        }
+        """
+        run_log = await JobRunLog.model_create({"business_id": -99, "func_name": "cron_report_daily_stat"})
+        await run_log.run_success({
+            report_model.stat_test_type: await ReportDailyStat.rebuild(report_model)
+            for report_model in [ApiReport, UiReport, AppReport]
+        })
+
+    @classmethod
+    async def init_report_daily_stat(cls, holder):
+        """ job服务启动时，刚部署还没有报告按天统计数据的先汇总一次，多个job进程只有获取到锁的执行
+        返回是否为第一次启动（还没有这个锁），第一次启动时由job服务启用每天重新汇总的定时任务，之后是否启用由管理员决定
+        """
+        is_first = not await JobLease.filter(name="report_daily_stat_init").exists()
+        is_success, _, _ = await JobLease.acquire("report_daily_stat_init", holder, 600)
+        if not is_success:
+            return False
+        await ReportDailyStat.init_stat([ApiReport, UiReport, AppReport])
+        return is_first
+
     @classmethod
     async def cron_clear_project_env(cls):
         """
@@ -287,6 +333,16 @@ async def get_job_detail(request: Request, form: schema.GetJobForm = Depends()):
     return request.app.get_success(data=job)
 
 
+async def get_job_schedule(request: Request, form: schema.GetJobScheduleForm = Depends()):
+    """ 未来N天的定时任务触发计划和触发高峰，由job服务按跳过节假日后的触发时间计算 """
+    try:
+        async with httpx.AsyncClient(verify=False) as client:
+            res = await client.get(f'{ServerInfo.JOB_ADDR}/schedule', params={"days": form.days}, timeout=30)
+        return request.app.get_success(res.json()["data"])
+    except:
+        return request.app.error('获取失败')
+
+
 async def enable_job(request: Request, form: schema.RunJobForm):
     task_conf = getattr(JobFuncs, form.func_name).__doc__
     try:
@@ -14,6 +14,7 @@ async def run_script(script_name, request):
         return request.app.fail('mock脚本文件不存在')
 
     try:
+        await Script.sync_script_module()  # mock脚本中可能引用自定义函数脚本，先同步到模块缓存
         script_file_name = f"mock_{script.name}"
         import_path = f'script_list.{script_file_name}'
         FileUtil.save_mock_script_data(
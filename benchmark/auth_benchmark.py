@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+""" 对比每次请求都解析token、遍历权限列表，与缓存解析结果、用frozenset判断权限的耗时
+执行方式（需要配置好环境变量或.env）：python -m benchmark.auth_benchmark [请求次数]
+"""
+import datetime
+import os
+import sys
+import time
+
+import jwt
+
+from app.models.system.user import User, AccessTokenCache
+from app.schemas.base_form import CurrentUserModel
+
+SECRET_KEY = "benchmark-secret-key"
+
+
+def get_token(permission_count=300):
+    """ 接近实际的普通用户token，几百个接口权限 """
+    api_permissions = [f'/api/api-test/module/{index}/detail' for index in range(permission_count)]
+    return jwt.encode({
+        "id": 1,
+        "account": "tester",
+        "name": "测试",
+        "business_list": [1, 2, 3],
+        "api_permissions": api_permissions,
+        "exp": datetime.datetime.now().timestamp() + 3600
+    }, SECRET_KEY), api_permissions[-1]
+
+
+def run_decode(token, path, times):
+    start = time.perf_counter()
+    for _ in range(times):
+        user = CurrentUserModel(**User.check_token(token, SECRET_KEY))
+        assert "admin" not in user.api_permissions and path in user.api_permissions
+    return time.perf_counter() - start
+
+
+def run_cache(token, path, times):
+    start = time.perf_counter()
+    for _ in range(times):
+        user = User.check_access_token(token, SECRET_KEY)
+        user = CurrentUserModel.model_construct(**{**user, "business_list": list(user.get("business_list") or [])})
+        assert "admin" not in user.api_permission_set and path in user.api_permission_set
+    return time.perf_counter() - start
+
+
+def main(times):
+    token, path = get_token()
+    AccessTokenCache.get(token, SECRET_KEY)  # 预热
+    decode_time = run_decode(token, path, times)
+    cache_time = run_cache(token, path, times)
+    print(f'请求数：{times}')
+    print(f'每次解析：{decode_time:.3f}s，平均每个请求 {decode_time / times * 1000000:.1f}μs')
+    print(f'缓存解析结果：{cache_time:.3f}s，平均每个请求 {cache_time / times * 1000000:.1f}μs')
+    print(f'提升：{decode_time / cache_time:.2f}倍')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+    os._exit(0)
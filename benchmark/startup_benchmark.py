@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+""" 统计各服务进程启动时的导入耗时，对比启动时就导入playwright、appium、selenium，与执行ui、app测试时才导入的差距
+每次都在新的子进程中导入，不受当前进程已导入模块的影响
+执行方式（需要配置好环境变量或.env）：python -m benchmark.startup_benchmark [每个服务的执行次数]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_LIST = ["main", "job", "executor"]  # web服务、定时任务服务、执行器
+DRIVER_MODULE_LIST = ["playwright", "appium", "selenium.webdriver"]
+
+# 原来 config.py 在导入时就导入了 UIClient、AppClient，先导入它们模拟原来的启动方式
+EAGER_IMPORT = (
+    "from utils.client.test_runner.client.ui_client import UIClient;"
+    "from utils.client.test_runner.client.app_client import AppClient;"
+)
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+{eager}import {service}
+print(time.perf_counter() - start, ",".join(name for name in {driver_list} if name in sys.modules))
+"""
+
+
+def run_once(service, eager: bool):
+    script = SCRIPT.format(eager=EAGER_IMPORT if eager else "", service=service, driver_list=DRIVER_MODULE_LIST)
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT_PATH, capture_output=True, text=True, check=True)
+    use_time, _, driver_list = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(use_time), driver_list
+
+
+def run_service(service, eager: bool, times):
+    time_list, driver_list = [], ""
+    for _ in range(times):
+        use_time, driver_list = run_once(service, eager)
+        time_list.append(use_time)
+    return statistics.median(time_list), driver_list
+
+
+def main(times):
+    print(f'每个服务启动 {times} 次，取中位数')
+    for service in SERVICE_LIST:
+        eager_time, eager_driver = run_service(service, True, times)
+        lazy_time, lazy_driver = run_service(service, False, times)
+        print(f'【{service}】')
+        print(f'  启动时导入驱动：{eager_time:.3f}s，已导入：{eager_driver or "无"}')
+        print(f'  用到时才导入：{lazy_time:.3f}s，已导入：{lazy_driver or "无"}')
+        print(f'  每个进程启动节省：{eager_time - lazy_time:.3f}s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""" 对比 parser.parse_data、编译后的模板、执行时按步骤缓存的模板解析一个测试步骤的耗时
+执行方式（需要配置好环境变量或.env）：python -m benchmark.template_benchmark [执行次数]
+"""
+import asyncio
+import copy
+import os
+import sys
+import time
+
+from utils.client.test_runner import parser, template
+
+
+def get_functions():
+    return {
+        "gen_timestamp": lambda: 1700000000,
+        "gen_md5": lambda *args: "e10adc3949ba59abbe56e057f20f883e",
+        "get_token": lambda user_name, env="test": f"token-{user_name}-{env}",
+        "add": lambda a, b: a + b
+    }
+
+
+def get_variables():
+    return {
+        "base_host": "http://127.0.0.1:8018",
+        "user_name": "admin",
+        "user_id": 1000,
+        "project_id": 12,
+        "token": "${get_token($user_name, env=test)}",
+        "page_size": 20,
+        "order_no": "ORDER-$user_id-${gen_timestamp()}",
+        "remark": "自动化测试数据",
+        "case_run_result": "success"
+    }
+
+
+def get_step_payload():
+    """ 接近实际的接口步骤：请求头、地址、请求体、前置/后置函数、断言 """
+    return {
+        "request": {
+            "method": "POST",
+            "url": "$base_host/api/project/$project_id/order?_t=${gen_timestamp()}",
+            "timeout": 60,
+            "headers": {
+                "Content-Type": "application/json",
+                "token": "$token",
+                "X-User-Id": "$user_id",
+                "X-Sign": "${gen_md5($user_name, $user_id)}",
+                "User-Agent": "test-platform"
+            },
+            "params": {"page_num": 1, "page_size": "$page_size", "detail": "true"},
+            "json": {
+                "order_no": "$order_no",
+                "user": {"id": "$user_id", "name": "$user_name", "tags": ["vip", "$remark"]},
+                "items": [
+                    {"sku": f"SKU-{index}", "count": index, "price": "${add($user_id, 1)}", "remark": "$remark"}
+                    for index in range(10)
+                ],
+                "remark": "下单人：$user_name，备注：$remark",
+                "callback": "$base_host/api/callback"
+            }
+        },
+        "setup_hooks": ["${gen_timestamp()}"],
+        "teardown_hooks": [],
+        "validate": [{"_01equals": ["status_code", "200", "状态码"]}, {"_01equals": ["$user_id", 1000, ""]}]
+    }
+
+
+async def run_parse_data(payload, times):
+    functions = get_functions()
+    start = time.perf_counter()
+    for _ in range(times):
+        await parser.parse_data(copy.deepcopy(payload), get_variables(), functions)
+    return time.perf_counter() - start
+
+
+async def run_template(payload, times):
+    functions = get_functions()
+    start = time.perf_counter()
+    for _ in range(times):
+        await template.compile_template(copy.deepcopy(payload)).render(get_variables(), functions)
+    return time.perf_counter() - start
+
+
+async def run_step_template(payload, times):
+    """ 与执行步骤时一致：请求中除头部信息、地址外按步骤版本复用编译好的模板树，头部信息、地址每次单独解析 """
+    functions, separate_key_list = get_functions(), ("headers", "url")
+    start = time.perf_counter()
+    for index in range(times):
+        step = copy.deepcopy(payload)
+        request_data = step["request"]
+        request_data["headers"]["X-Request-Index"] = str(index)  # 模拟之前步骤提取的数据更新到头部信息
+        variables = get_variables()
+        step_template = template.compile_step_template(
+            ("api", "benchmark-step-version"),
+            {key: value for key, value in request_data.items() if key not in separate_key_list})
+        parsed_request = await step_template.render(variables, functions)
+        for key in separate_key_list:
+            parsed_request[key] = await template.compile_template(request_data[key]).render(variables, functions)
+        for key in ("setup_hooks", "teardown_hooks", "validate"):
+            await template.compile_template(step[key]).render(variables, functions)
+    return time.perf_counter() - start
+
+
+async def main(times):
+    payload = get_step_payload()
+    assert await parser.parse_data(copy.deepcopy(payload), get_variables(), get_functions()) == \
+           await template.render_data(copy.deepcopy(payload), get_variables(), get_functions()), "解析结果不一致"
+
+    await run_template(payload, 10)  # 预热
+    parse_data_time = await run_parse_data(payload, times)
+    template_time = await run_template(payload, times)
+    step_template_time = await run_step_template(payload, times)
+    print(f'步骤数：{times}')
+    print(f'parse_data：{parse_data_time:.3f}s，平均每个步骤 {parse_data_time / times * 1000:.3f}ms')
+    print(f'编译模板：{template_time:.3f}s，平均每个步骤 {template_time / times * 1000:.3f}ms，'
+          f'提升：{parse_data_time / template_time:.2f}倍')
+    print(f'按步骤缓存模板：{step_template_time:.3f}s，平均每个步骤 {step_template_time / times * 1000:.3f}ms，'
+          f'提升：{parse_data_time / step_template_time:.2f}倍')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
+    os._exit(0)  # 自定义函数的线程池不等待退出
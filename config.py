@@ -4,8 +4,6 @@ import platform
 from dotenv import load_dotenv
 
 from utils.client.test_runner import validate_func as assert_func_file
-from utils.client.test_runner.client.app_client import AppClient
-from utils.client.test_runner.client.ui_client import UIClient
 
 load_dotenv()  # 加载 .env 文件
 is_linux = platform.platform().startswith("Linux")
@@ -43,18 +41,98 @@ class ServerInfo:
     JOB_ADDR: str = BaseConfig.get_env('JOB_HOST', "http://localhost") + f':{JOB_PORT}/api/job'
 
 
+class JobInfo:
+    """
+    job服务配置
+    NEXT_RUN_TIME_FLUSH_DELAY: 定时任务触发后，延迟多少秒批量更新任务的下一次运行时间，同一时间触发的任务只更新一次数据库
+    LEASE_TIME_OUT: 主节点租约有效秒数，主节点退出后，其他节点最多等这么久接管
+    LEASE_RENEW_INTERVAL: 续期租约、同步任务的间隔秒数，需小于 LEASE_TIME_OUT
+    """
+    NEXT_RUN_TIME_FLUSH_DELAY: float = float(BaseConfig.get_env('JOB_NEXT_RUN_TIME_FLUSH_DELAY', 2))
+    LEASE_NAME: str = "scheduler"
+    LEASE_TIME_OUT: int = int(BaseConfig.get_env('JOB_LEASE_TIME_OUT', 30))
+    LEASE_RENEW_INTERVAL: float = float(BaseConfig.get_env('JOB_LEASE_RENEW_INTERVAL', 10))
+
+
+class ExecutorInfo:
+    """
+    执行器服务配置，执行器从执行队列表拉取测试并执行，可多进程、多机器部署
+    MAX_RUNNING: 每个进程同时执行的测试数
+    POLL_INTERVAL: 拉取执行队列的间隔秒数
+    LOST_TIME_OUT: 执行节点超过多少秒没有心跳，视为已失联
+    MAX_RUNNING_GLOBAL: 所有执行节点最多同时执行的测试数，0为不限制
+    MAX_RUNNING_PER_PROJECT: 所有执行节点中，同一个服务最多同时执行的测试数，0为不限制
+    MAX_RUNNING_PER_ENV: 所有执行节点中，同一个运行环境最多同时执行的测试数，0为不限制
+    MAX_RUNNING_PER_TRIGGER_TYPE: 所有执行节点中，每种触发类型最多同时执行的测试数，格式为 "触发类型:上限,触发类型:上限"
+        如 "cron:5,pipeline:10"，没有配置的触发类型不限制
+    """
+    PORT: int = int(BaseConfig.get_env('EXECUTOR_PORT', 8020))
+    WORKERS: int = int(BaseConfig.get_env('EXECUTOR_WORKERS', 2))
+    MAX_RUNNING: int = int(BaseConfig.get_env('EXECUTOR_MAX_RUNNING', 5))
+    POLL_INTERVAL: float = float(BaseConfig.get_env('EXECUTOR_POLL_INTERVAL', 1))
+    LOST_TIME_OUT: int = int(BaseConfig.get_env('EXECUTOR_LOST_TIME_OUT', 5 * 60))
+    MAX_RUNNING_GLOBAL: int = int(BaseConfig.get_env('EXECUTOR_MAX_RUNNING_GLOBAL', 0))
+    MAX_RUNNING_PER_PROJECT: int = int(BaseConfig.get_env('EXECUTOR_MAX_RUNNING_PER_PROJECT', 0))
+    MAX_RUNNING_PER_ENV: int = int(BaseConfig.get_env('EXECUTOR_MAX_RUNNING_PER_ENV', 0))
+    MAX_RUNNING_PER_TRIGGER_TYPE: dict = {
+        trigger_type.strip(): int(max_count) for trigger_type, max_count in (
+            item.split(':', 1) for item in BaseConfig.get_env('EXECUTOR_MAX_RUNNING_PER_TRIGGER_TYPE', '').split(',') if ':' in item
+        )
+    }
+
+
+class ScriptExecutorInfo:
+    """
+    执行自定义脚本函数的线程池配置
+    MAX_WORKERS: 线程池大小，进程内共用
+    MAX_RUNNING_PER_RUN: 每次测试执行最多同时占用的线程数
+    TIME_OUT: 函数执行超时时间，秒
+    PRINT_MAX_SIZE: 每个步骤记录的自定义函数print内容最大字符数，超过的部分丢弃
+    """
+    MAX_WORKERS: int = int(BaseConfig.get_env('SCRIPT_EXECUTOR_MAX_WORKERS', min(50, (os.cpu_count() or 1) * 5)))
+    MAX_RUNNING_PER_RUN: int = int(BaseConfig.get_env('SCRIPT_EXECUTOR_MAX_RUNNING_PER_RUN', 10))
+    TIME_OUT: int = int(BaseConfig.get_env('SCRIPT_EXECUTOR_TIME_OUT', 600))
+    PRINT_MAX_SIZE: int = int(BaseConfig.get_env('SCRIPT_EXECUTOR_PRINT_MAX_SIZE', 65536))
+
+
+class ReportBodyInfo:
+    """
+    测试报告中请求体、响应体的存储配置，超过 MAX_INLINE_SIZE 的内容压缩后单独存到 ReportBody 表，步骤数据只记录引用和预览
+    MAX_INLINE_SIZE: 直接存在步骤数据中的最大字节数
+    PREVIEW_SIZE: 单独存储时步骤数据中保留的预览字符数
+    COMPRESS_LEVEL: gzip压缩级别，1-9
+    KEEP_DAYS: 超过多少天没有被引用的内容会被定时任务清理，要大于报告详细数据的保留天数
+    """
+    MAX_INLINE_SIZE: int = int(BaseConfig.get_env('REPORT_BODY_MAX_INLINE_SIZE', 64 * 1024))
+    PREVIEW_SIZE: int = int(BaseConfig.get_env('REPORT_BODY_PREVIEW_SIZE', 512))
+    COMPRESS_LEVEL: int = int(BaseConfig.get_env('REPORT_BODY_COMPRESS_LEVEL', 6))
+    KEEP_DAYS: int = int(BaseConfig.get_env('REPORT_BODY_KEEP_DAYS', 16))
+
+
+class ConfigCacheInfo:
+    """
+    配置、运行环境、webhook 的进程内缓存
+    TTL: 缓存有效期，秒，为0时不缓存
+    VERSION_CHECK_INTERVAL: 多久查一次数据库中的缓存版本号，秒，其他进程修改了配置后，最多这么久后本进程的缓存失效
+    """
+    TTL: int = int(BaseConfig.get_env('CONFIG_CACHE_TTL', 300))
+    VERSION_CHECK_INTERVAL: float = float(BaseConfig.get_env('CONFIG_CACHE_VERSION_CHECK_INTERVAL', 3))
+
+
 class AuthInfo:
     """
     身份校验相关的配置
     SECRET_KEY: 生成token的加密字符串
     PASSWORD_SECRET_KEY: 密码加密的字符串，一旦生成用户，不可更改，否则两次加密密文会不一致
     AUTH_TYPE: 身份验证机制 SSO, test_platform
+    TOKEN_CACHE_SIZE: 进程内缓存的已解析token数，同一个token在过期前只解析一次
     """
     AUTH_TYPE: str = BaseConfig.get_env('AUTH_TYPE', "test_platform")
     SECRET_KEY: str = BaseConfig.get_env('AUTH_SECRET_KEY')
     ACCESS_TOKEN_TIME_OUT: int = int(BaseConfig.get_env('AUTH_ACCESS_TOKEN_TIME_OUT', 60 * 60))
     REFRESH_TOKEN_TIME_OUT: int = int(BaseConfig.get_env('AUTH_REFRESH_TOKEN_TIME_OUT', 7 * 24 * 60 * 60))
     PASSWORD_SECRET_KEY: str = BaseConfig.get_env('AUTH_PASSWORD_SECRET_KEY')
+    TOKEN_CACHE_SIZE: int = int(BaseConfig.get_env('AUTH_TOKEN_CACHE_SIZE', 10000))
 
 
 class DefaultWebhook:
@@ -68,6 +146,39 @@ class DefaultWebhook:
     WEBHOOK_SECRET: str = BaseConfig.get_env('WEBHOOK_SECRET')
 
 
+class HttpClientInfo:
+    """
+    接口自动化发请求用的httpx连接池配置，同一个进程内的测试执行共用一个连接池
+    KEEPALIVE_EXPIRY: 空闲连接保持的秒数
+    MAX_CONNECTIONS: 连接池最大连接数
+    MAX_KEEPALIVE_CONNECTIONS: 连接池最大保持的空闲连接数
+    MAX_CONNECTIONS_PER_HOST: 单个host最大并发请求数，0为不限制
+    HTTP2: 是否启用HTTP/2，需要安装 h2 依赖包
+    """
+    KEEPALIVE_EXPIRY: float = float(BaseConfig.get_env('HTTP_CLIENT_KEEPALIVE_EXPIRY', 30))
+    MAX_CONNECTIONS: int = int(BaseConfig.get_env('HTTP_CLIENT_MAX_CONNECTIONS', 200))
+    MAX_KEEPALIVE_CONNECTIONS: int = int(BaseConfig.get_env('HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS', 50))
+    MAX_CONNECTIONS_PER_HOST: int = int(BaseConfig.get_env('HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST', 0))
+    HTTP2: bool = BaseConfig.get_env('HTTP_CLIENT_HTTP2', 'false').lower() in ('1', 'true')
+
+
+class RequestLogInfo:
+    """
+    web服务请求日志配置
+    BODY_MAX_SIZE: 请求体、响应体最多记录的字节数，超过的部分只记录总大小
+    SAMPLE_RATE: 按接口地址前缀设置的采样率，0-1，匹配最长的前缀，格式为 "前缀:采样率,前缀:采样率"
+        如 "/api/api-test/report:0.1,/api/system/job:0"
+    DEFAULT_SAMPLE_RATE: 没有匹配到前缀的接口的采样率
+    """
+    BODY_MAX_SIZE: int = int(BaseConfig.get_env('REQUEST_LOG_BODY_MAX_SIZE', 4096))
+    SAMPLE_RATE: dict = {
+        prefix.strip(): float(rate) for prefix, rate in (
+            item.rsplit(':', 1) for item in BaseConfig.get_env('REQUEST_LOG_SAMPLE_RATE', '').split(',') if ':' in item
+        )
+    }
+    DEFAULT_SAMPLE_RATE: float = float(BaseConfig.get_env('REQUEST_LOG_DEFAULT_SAMPLE_RATE', 1))
+
+
 class SSO:
     """ 身份验证如果是走SSO，则以下配置项必须正确 """
     # 开放平台SSO地址
@@ -96,43 +207,60 @@ for func in dir(assert_func_file):
         assert_mapping.setdefault(doc, func)
         assert_mapping_list.append({"value": doc})
 
-# UI自动化的行为事件
-action_mapping = UIClient.get_action_mapping()
-ui_action_mapping_dict, ui_action_mapping_list = action_mapping["mapping_dict"], action_mapping["mapping_list"]
-ui_action_mapping_reverse = dict(zip(ui_action_mapping_dict.values(), ui_action_mapping_dict.keys()))
 
-# UI自动化的断言事件
-ui_assert_mapping = UIClient.get_assert_mapping()
-ui_assert_mapping_dict, ui_assert_mapping_list = ui_assert_mapping["mapping_dict"], ui_assert_mapping["mapping_list"]
+class ClientMapping:
+    """ UI、APP自动化的行为事件、断言事件、数据提取事件映射
+    playwright、appium、selenium导入很慢，只执行接口测试的进程用不到，第一次取映射时才导入对应的client
+    """
+    _mapping = {}
+    mapping_keys = (
+        "action_mapping_dict", "action_mapping_list", "action_mapping_reverse", "assert_mapping_dict",
+        "assert_mapping_list", "extract_mapping", "extract_mapping_list"
+    )
+
+    @classmethod
+    def get_client(cls, test_type):
+        if test_type == "ui":
+            from utils.client.test_runner.client.ui_client import UIClient
+            return UIClient
+        from utils.client.test_runner.client.app_client import AppClient
+        return AppClient
+
+    @classmethod
+    def get(cls, test_type) -> dict:
+        """ test_type: ui、app """
+        test_type = "ui" if test_type == "ui" else "app"
+        if test_type not in cls._mapping:
+            client = cls.get_client(test_type)
+            action_mapping = client.get_action_mapping()  # 行为事件
+            assert_mapping = client.get_assert_mapping()  # 断言事件
+            extract_mapping = client.get_extract_mapping()  # 数据提取事件
+            extract_mapping["mapping_dict"].setdefault("自定义函数", "func")
+            extract_mapping["mapping_list"].extend([
+                {"label": "常量", "value": "const"},
+                {"label": "自定义变量", "value": "variable"},
+                {"label": "自定义函数", "value": "func"}
+            ])
+            cls._mapping[test_type] = {
+                "action_mapping_dict": action_mapping["mapping_dict"],
+                "action_mapping_list": action_mapping["mapping_list"],
+                "action_mapping_reverse": dict(zip(
+                    action_mapping["mapping_dict"].values(), action_mapping["mapping_dict"].keys())),
+                "assert_mapping_dict": assert_mapping["mapping_dict"],
+                "assert_mapping_list": assert_mapping["mapping_list"],
+                "extract_mapping": extract_mapping["mapping_dict"],
+                "extract_mapping_list": extract_mapping["mapping_list"]
+            }
+        return cls._mapping[test_type]
+
+
+def __getattr__(name):
+    """ 兼容原来的 from config import ui_action_mapping_list 这类用法，用到时才生成映射 """
+    test_type, _, key = name.partition("_")
+    if test_type in ("ui", "app") and key in ClientMapping.mapping_keys:
+        return ClientMapping.get(test_type)[key]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# UI自动化的数据提取事件
-ui_extract_mapping = UIClient.get_extract_mapping()
-ui_extract_mapping, ui_extract_mapping_list = ui_extract_mapping["mapping_dict"], ui_extract_mapping["mapping_list"]
-ui_extract_mapping.setdefault("自定义函数", "func")
-ui_extract_mapping_list.extend([
-    {"label": "常量", "value": "const"},
-    {"label": "自定义变量", "value": "variable"},
-    {"label": "自定义函数", "value": "func"}
-])
-
-# APP自动化的行为事件
-action_mapping = AppClient.get_action_mapping()
-app_action_mapping_dict, app_action_mapping_list = action_mapping["mapping_dict"], action_mapping["mapping_list"]
-app_action_mapping_reverse = dict(zip(app_action_mapping_dict.values(), app_action_mapping_dict.keys()))
-
-# UI自动化的断言事件
-app_assert_mapping = AppClient.get_assert_mapping()
-app_assert_mapping_dict, app_assert_mapping_list = app_assert_mapping["mapping_dict"], app_assert_mapping["mapping_list"]
-
-# UI自动化的数据提取事件
-app_extract_mapping = AppClient.get_extract_mapping()
-app_extract_mapping, app_extract_mapping_list = app_extract_mapping["mapping_dict"], app_extract_mapping["mapping_list"]
-app_extract_mapping.setdefault("自定义函数", "func")
-app_extract_mapping_list.extend([
-    {"label": "常量", "value": "const"},
-    {"label": "自定义变量", "value": "variable"},
-    {"label": "自定义函数", "value": "func"}
-])
 
 # 跳过条件判断类型映射
 skip_if_type_mapping = [{"label": "且", "value": "and"}, {"label": "或", "value": "or"}]
@@ -0,0 +1,53 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from tortoise.contrib.fastapi import register_tortoise
+
+from config import ExecutorInfo, _tortoise_orm_conf
+from app.models.autotest.model_factory import RunQueue
+from utils.client.run_queue_executor import run_queue_executor, logger
+from utils.util.script_executor import ScriptExecutor
+
+executor = FastAPI(
+    docs_url=None,
+    redoc_url=None,
+    title="测试平台执行器",
+    version="1.0.0",
+    description='从执行队列中领取测试并执行'
+)
+executor.title = '执行器服务'
+
+register_tortoise(
+    executor,
+    config=_tortoise_orm_conf,
+    add_exception_handlers=True
+)
+
+
+@executor.on_event('startup')
+async def start_executor():
+    """ 启动执行器 """
+    run_queue_executor.start()
+    logger.info(f'\n\n\n{"*" * 20} 服务【{executor.title}】启动完成 {"*" * 20}\n\n\n')
+
+
+@executor.on_event('shutdown')
+async def stop_executor():
+    await run_queue_executor.stop()
+
+
+@executor.get("/api/executor", summary="执行器状态")
+async def get_executor_status():
+    return JSONResponse(status_code=200, content=jsonable_encoder({"status": 200, "message": "获取成功", "data": {
+        "worker": run_queue_executor.worker,
+        "running": len(run_queue_executor.running_task),
+        "max_running": ExecutorInfo.MAX_RUNNING,
+        "script_executor": ScriptExecutor.get_metrics(),
+        "queue": await RunQueue.get_metrics()
+    }}))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('executor:executor', host="0.0.0.0", port=ExecutorInfo.PORT, workers=1)
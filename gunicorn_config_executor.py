@@ -0,0 +1,11 @@
+import os
+
+from dotenv import load_dotenv
+load_dotenv()  # 加载 .env 文件
+
+bind = f'0.0.0.0:{os.getenv("EXECUTOR_PORT", 8020)}'  # 访问地址
+workers = int(os.getenv("EXECUTOR_WORKERS", 2))  # 执行器进程数，每个进程独立从执行队列领取测试
+worker_class = 'uvicorn.workers.UvicornWorker'  # 工作模式协程
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 load_dotenv()  # 加载 .env 文件
 
 bind = f'0.0.0.0:{os.getenv("JOB_PORT")}'  # 访问地址
-workers = 1  # 任务调度服务，只起一个worker
+workers = int(os.getenv("JOB_WORKERS", 1))  # 任务调度服务进程数，多个进程时只有获取到主节点租约的进程触发定时任务
 threads = 4  # 每个worker的线程数
 worker_class = 'uvicorn.workers.UvicornWorker'  # 工作模式协程
 timeout = 120
@@ -155,6 +155,9 @@ call_back_msg_addr = ""
 # 暂停测试步骤执行的超时时间
 pause_step_time_out = 10 * 60 # 10分钟
 
+# 并行执行用例时，最多同时执行的用例数
+run_case_concurrency = 10
+
 # shell 造数据的，服务器信息
 shell_command_info = {
     "ip": "",
@@ -329,6 +332,8 @@ async def init_config():
              "desc": "默认登录账号"},
             {"name": "save_func_permissions", "value": "0", "desc": "保存脚本权限，0所有人都可以，1管理员才可以"},
             {"name": "pause_step_time_out", "value": pause_step_time_out, "desc": "暂停测试步骤执行的超时时间"},
+            {"name": "run_case_concurrency", "value": run_case_concurrency, "desc": "并行执行用例时，最多同时执行的用例数"},
+            {"name": "config_cache_version", "value": "0", "desc": "配置缓存版本号，修改配置、运行环境、webhook后自动更新，用于通知其他进程刷新缓存"},
             {"name": "shell_command_info", "value": json.dumps(shell_command_info), "desc": "shell 造数据的，服务器信息"},
             {"name": "pip_command", "value": "pip", "desc": "执行 'pip install' 时指定的pip，或者pip的绝对路径，用于在线管理第三方库"},
             {
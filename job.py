@@ -1,3 +1,7 @@
+import asyncio
+import json
+import traceback
+
 from fastapi import FastAPI, Request, Body
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
@@ -6,6 +10,7 @@ from tortoise.contrib.fastapi import register_tortoise
 from pydantic import BaseModel, Field
 
 from config import ServerInfo, _tortoise_orm_conf
+from app.services.system.job import JobFuncs
 from utils.util.apscheduler import scheduler, request_run_task_api, logger
 
 job = FastAPI(
@@ -29,18 +34,32 @@ async def init_scheduler_job():
     # await Tortoise.init(_tortoise_orm_conf, timezone="Asia/Shanghai")  # 数据库链接
     # await Tortoise.generate_schemas(safe=True)
 
-    task_list = await Tortoise.get_connection("default").execute_query_dict("SELECT `task_code`, cron  FROM apscheduler_jobs")  # 数据库中的所有任务
+    task_list = await Tortoise.get_connection("default").execute_query_dict("SELECT `task_code`, cron, skip_holiday FROM apscheduler_jobs")  # 数据库中的所有任务
     await scheduler.init_scheduler(task_list)
+    asyncio.create_task(init_report_daily_stat())
     logger.info(f'\n\n\n{"*" * 20} 服务【{job.title}】启动完成 {"*" * 20}\n\n\n')
 
 
-class GetJobForm(BaseModel):
-    """ 获取job信息 """
-    task_code: str = Field(..., title="job code")
+async def init_report_daily_stat():
+    """ 刚部署时汇总报告按天统计数据，数据量大时耗时较长，不阻塞服务启动
+    第一次汇总时启用每天重新汇总的定时任务，修正重跑、删除报告等没有实时更新的数据
+    """
+    try:
+        if await JobFuncs.init_report_daily_stat(scheduler.worker):
+            task = json.loads(JobFuncs.cron_report_daily_stat.__doc__)
+            await add_cron_job(task, "cron")
+    except Exception:
+        logger.error(f'汇总报告按天统计数据出错：\n{traceback.format_exc()}')
 
 
-@job.post("/api/job", summary="添加定时任务")
-async def add_job(request: Request, task: dict = Body(), task_type: str = Body()):
+@job.on_event('shutdown')
+async def stop_scheduler_job():
+    """ 停止调度，释放主节点租约 """
+    await scheduler.stop_scheduler()
+
+
+async def add_cron_job(task: dict, task_type: str):
+    """ 添加定时任务 """
     task_code = f'{task_type}_{str(task["id"])}'
     await scheduler.add_new_job(
         task_code=task_code,
@@ -49,6 +68,16 @@ async def add_job(request: Request, task: dict = Body(), task_type: str = Body()
         cron=task["cron"]
     )
     logger.info(f"定时任务【{task_code}】启动成功")
+
+
+class GetJobForm(BaseModel):
+    """ 获取job信息 """
+    task_code: str = Field(..., title="job code")
+
+
+@job.post("/api/job", summary="添加定时任务")
+async def add_job(request: Request, task: dict = Body(), task_type: str = Body()):
+    await add_cron_job(task, task_type)
     return JSONResponse(status_code=200, content=jsonable_encoder({"status": 200, "message": "定时任务启动成功"}))
 
 
@@ -59,6 +88,12 @@ async def remove_job(request: Request, form: GetJobForm):
     return JSONResponse(status_code=200, content=jsonable_encoder({"status": 200, "message": "任务禁用成功"}))
 
 
+@job.get("/api/job/schedule", summary="未来N天的定时任务触发计划")
+async def get_job_schedule(days: int = 7):
+    data = await scheduler.get_schedule(max(1, min(days, 31)))
+    return JSONResponse(status_code=200, content=jsonable_encoder({"status": 200, "message": "获取成功", "data": data}))
+
+
 if __name__ == '__main__':
     import uvicorn
 
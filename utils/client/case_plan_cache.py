@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+""" 解析后的用例步骤缓存，用例、步骤、接口、服务都没改过时，直接复用上次解析好的步骤，不用再逐个步骤解析 """
+import threading
+from collections import OrderedDict
+
+CASE_PLAN_CACHE_SIZE = 1024
+
+
+class CasePlanCache:
+    """
+    key: (测试类型, 运行环境, 用例id, 请求超时时间)
+    version: 用例及其引用的用例、步骤、接口、服务、服务环境、运行环境的 (id, 最后修改时间)，有一项变了就重新解析
+    plan: {
+        "step_list": [(element_id, step_id, case_id, 步骤名, 步骤数据)],
+        "variables": 步骤所在用例、接口所在服务的自定义变量,
+        "element_id_list": 步骤用到的接口/元素id
+    }
+    缓存在执行器进程内，执行器与web服务分开部署，修改数据时由 update_time 变化让缓存失效
+    缓存的步骤数据只读，写入报告步骤时不会被修改
+    """
+    _lock = threading.Lock()
+    _cache = OrderedDict()  # {key: (version, plan)}
+    _metrics = {"hit": 0, "miss": 0}
+
+    @classmethod
+    def get(cls, key, version):
+        if version is None:
+            return None
+        with cls._lock:
+            cached = cls._cache.get(key)
+            if cached and cached[0] == version:
+                cls._cache.move_to_end(key)
+                cls._metrics["hit"] += 1
+                return cached[1]
+            cls._metrics["miss"] += 1
+            return None
+
+    @classmethod
+    def set(cls, key, version, plan):
+        if version is None:
+            return
+        with cls._lock:
+            cls._cache[key] = (version, plan)
+            cls._cache.move_to_end(key)
+            if len(cls._cache) > CASE_PLAN_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, case_id=None):
+        """ 清除指定用例的缓存，不指定则全部清除 """
+        with cls._lock:
+            for key in [key for key in cls._cache if case_id in (None, key[2])]:
+                cls._cache.pop(key, None)
+
+    @classmethod
+    def get_metrics(cls):
+        return {**cls._metrics, "size": len(cls._cache)}
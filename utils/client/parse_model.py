@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from utils.util.file_util import FileUtil
 from utils.util.json_util import JsonUtil
-from config import assert_mapping, ui_assert_mapping_dict
+from config import assert_mapping, ClientMapping
 from utils.client.test_runner.parser import extract_functions, parse_function, extract_variables
 
 
@@ -141,7 +141,7 @@ class FormatModel(JsonUtil):
                 else:  # 页面校验
                     if data_source and validate_method and data_type and value:
                         # 根据执行方法文字描述替换成具体的执行方法
-                        validate["validate_method"] = ui_assert_mapping_dict[validate_method]
+                        validate["validate_method"] = ClientMapping.get("ui")["assert_mapping_dict"][validate_method]
                         parsed_validate.append(validate)
 
         return parsed_validate
@@ -2,9 +2,10 @@
 from app.models.autotest.model_factory import ApiCaseSuite as CaseSuite, ApiMsg as Api, ApiStep as Step,\
     ApiReportCase as ReportCase, ApiReportStep as reportStep
 from app.models.assist.model_factory import Script
-from app.models.config.model_factory import Config
+from app.models.config.model_factory import Config, RunEnv
 from app.schemas.enums import DataStatusEnum
-from utils.client.parse_model import StepModel, FormatModel
+from utils.client.case_plan_cache import CasePlanCache
+from utils.client.parse_model import StepModel, FormatModel, CaseModel, ProjectModel
 from utils.client.run_test_runner import RunTestRunner
 from utils.logs.log import logger
 
@@ -24,7 +25,7 @@ class RunApi(RunTestRunner):
         self.test_plan["response_time_level"] = await Config.get_response_time_level()
         self.front_report_addr = f'{await Config.get_report_host()}{await Config.get_api_report_addr()}'
         self.test_plan["pause_step_time_out"] = await Config.get_pause_step_time_out()
-        await Script.create_script_file(self.env_code)  # 创建所有函数文件
+        await Script.sync_script_module(self.env_code)  # 同步所有脚本内容到模块缓存
         self.report = await self.report_model.filter(id=self.report_id).first()
         self.project = await self.get_format_project(self.report.project_id)  # 解析当前服务信息
         await self.format_data_for_template()  # 解析api
@@ -90,13 +91,13 @@ class RunCase(RunTestRunner):
         self.test_plan["response_time_level"] = await Config.get_response_time_level()
         self.front_report_addr = f'{await Config.get_report_host()}{await Config.get_api_report_addr()}'
         self.test_plan["pause_step_time_out"] = await Config.get_pause_step_time_out()
-        await Script.create_script_file(self.env_code)  # 创建所有函数文件
+        await Script.sync_script_module(self.env_code)  # 同步所有脚本内容到模块缓存
         self.report = await self.report_model.filter(id=self.report_id).first()
         await self.parse_all_case()
         await self.report.parse_data_finish()
         await self.run_case()
 
-    async def parse_step(self, current_project, project, current_case, case, api, step, report_case_id):
+    async def parse_step(self, current_project, project, current_case, case, api, step, report_case_id, step_version=None):
         """ 解析测试步骤
         current_project: 当前用例所在的服务(解析后的)
         project: 当前步骤对应接口所在的服务(解析后的)
@@ -104,7 +105,8 @@ class RunCase(RunTestRunner):
         case: 被引用的case
         api: 解析后的api
         step: 原始step
-        返回解析后的步骤 {}
+        step_version: 请求中除头部信息、地址外的内容的版本，执行时按此版本复用编译好的模板
+        返回解析后的报告步骤，未入库，由 save_report_case_plan 批量写入
         """
         # 解析头部信息，继承头部信息，接口所在服务、当前所在服务、用例、步骤
         step_headers = {}
@@ -131,6 +133,7 @@ class RunCase(RunTestRunner):
             "extract": step.extracts,  # 接口要提取的信息
             "validate": step.validates,  # 接口断言信息
             "base_url": current_project.host if step.replace_host == 1 else project.host,
+            "step_version": step_version,
             "request": {
                 "method": api["request"]["method"],
                 "url": api["request"]["url"],
@@ -143,7 +146,7 @@ class RunCase(RunTestRunner):
                 "follow_redirects": step.allow_redirect # httpx的重定向字段
             }
         }
-        await reportStep.create(
+        return reportStep(
             element_id=api["id"],
             step_id=step.id,
             case_id=step.case_id,
@@ -153,22 +156,152 @@ class RunCase(RunTestRunner):
             step_data=step_data
         )
 
+    async def prefetch_case_data(self):
+        """ 批量查出要执行的用例（包含引用的用例）、步骤、接口、用例集、服务，解析时直接从内存取，不再逐条查询 """
+        self.case_step_dict, self.api_dict, self.suite_project_dict = {}, {}, {}
+        self.case_version_dict, self.project_version_dict = {}, {}  # 用于判断解析后的用例步骤缓存是否可用
+        queried_case_id_set, case_id_list = set(), list(dict.fromkeys(self.case_id_list))
+        while case_id_list:  # 按引用层级逐层查询
+            queried_case_id_set.update(case_id_list)
+            for case in await self.case_model.filter(id__in=case_id_list).all():
+                self.parsed_case_dict[case.id] = CaseModel(**dict(case))
+                self.case_version_dict[case.id] = case.update_time
+            step_list = await Step.filter(case_id__in=case_id_list, status=DataStatusEnum.ENABLE).order_by("num").all()
+            for step in step_list:
+                self.case_step_dict.setdefault(step.case_id, []).append(step)
+            case_id_list = list(dict.fromkeys(
+                step.quote_case for step in step_list if step.quote_case and step.quote_case not in queried_case_id_set))
+
+        api_id_list = list({step.api_id for step_list in self.case_step_dict.values() for step in step_list if not step.quote_case})
+        for api in await Api.filter(id__in=api_id_list).all():
+            self.api_dict[api.id] = api
+
+        suite_id_list = list({case.suite_id for case in self.parsed_case_dict.values()})
+        self.suite_project_dict = dict(await CaseSuite.filter(id__in=suite_id_list).values_list("id", "project_id"))
+
+        # 服务按用例所在服务、接口所在服务的顺序解析，自定义函数按此顺序加载
+        project_id_list = [self.suite_project_dict.get(self.parsed_case_dict[case_id].suite_id)
+                           for case_id in self.case_id_list if case_id in self.parsed_case_dict]
+        project_id_list.extend(api.project_id for api in self.api_dict.values())
+        project_id_list = [project_id for project_id in dict.fromkeys(project_id_list) if project_id]
+        if not self.run_env:
+            self.run_env = await RunEnv.get_by_code(self.env_code)
+        project_dict = {project.id: project for project in await self.project_model.filter(id__in=project_id_list).all()}
+        project_env_dict = {project_env.project_id: project_env for project_env in await self.project_env_model.filter(
+            env_id=self.run_env.id, project_id__in=project_id_list).all()}
+        for project_id in project_id_list:
+            project, project_env = project_dict.get(project_id), project_env_dict.get(project_id)
+            if project and project_env:
+                await self.parse_functions(project.script_list)
+                data = dict(project_env) | dict(project) | dict(self.run_env)
+                self.parsed_project_dict[project_id] = ProjectModel(**data)
+                self.project_version_dict[project_id] = (project.update_time, project_env.update_time)
+
+    def get_case_plan_version(self, case_id):
+        """ 用例及其引用的用例、步骤、接口、服务、服务环境、运行环境的最后修改时间，有数据没有预先查出来时返回None，不使用缓存 """
+        version, case_id_list, queried_case_id_set = [("run_env", self.run_env.id, self.run_env.update_time)], [case_id], set()
+        while case_id_list:
+            case_id = case_id_list.pop(0)
+            if case_id in queried_case_id_set:
+                continue
+            queried_case_id_set.add(case_id)
+            case = self.parsed_case_dict.get(case_id)
+            suite_project_id = self.suite_project_dict.get(case.suite_id) if case else None
+            if suite_project_id not in self.project_version_dict:
+                return None
+            version.append(("case", case_id, self.case_version_dict[case_id], suite_project_id,
+                            self.project_version_dict[suite_project_id]))
+            for step in self.case_step_dict.get(case_id, []):  # 步骤的顺序、启用状态变化也会反映到版本中
+                if step.quote_case:
+                    version.append(("quote", step.id, step.update_time, step.quote_case))
+                    case_id_list.append(step.quote_case)
+                    continue
+                api = self.api_dict.get(step.api_id)
+                if api is None or api.project_id not in self.project_version_dict:
+                    return None
+                version.append(("step", step.id, step.update_time, api.id, api.update_time,
+                                self.project_version_dict[api.project_id]))
+        return tuple(version)
+
+    async def get_case_plan(self, current_project, current_case):
+        """ 获取用例解析后的所有步骤，用例及其引用的数据都没改过时直接取缓存，传了临时参数的不使用缓存 """
+        cache_key = (self.run_type, self.env_code, current_case.id, self.time_out)
+        version = None if self.temp_variables else self.get_case_plan_version(current_case.id)
+        plan = CasePlanCache.get(cache_key, version)
+        if plan is None:
+            plan = await self.parse_case_plan(current_project, current_case)
+            CasePlanCache.set(cache_key, version, plan)
+        self.count_step += plan["step_count"]
+        self.api_set.update(plan["element_id_list"])
+        return plan
+
     async def get_all_steps(self, case_id: int):
         """ 解析引用的用例 """
         case = await self.get_format_case(case_id)
 
         if self.parse_case_is_skip(case.skip_if) is not True:  # 不满足跳过条件才解析
-            step_list = await Step.filter(case_id=case.id, status=DataStatusEnum.ENABLE).order_by("num").all()
+            if case.id in self.case_step_dict:
+                step_list = self.case_step_dict[case.id]
+            else:
+                step_list = await Step.filter(case_id=case.id, status=DataStatusEnum.ENABLE).order_by("num").all()
             for step in step_list:
                 if step.quote_case:
                     await self.get_all_steps(step.quote_case)
                 else:
                     self.all_case_steps.append(step)
-                    self.count_step += 1
-                    self.api_set.add(step.api_id)
+
+    async def parse_case_plan(self, current_project, current_case):
+        """ 解析用例的所有步骤（包含引用的用例），步骤数据不包含报告信息，可以缓存下来重复使用 """
+        await self.get_all_steps(current_case.id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
+
+        # 循环解析测试步骤
+        all_variables = {}  # 步骤所在用例、接口所在服务的公共变量
+        report_step_list = []
+        for step in self.all_case_steps:
+            api_temp = self.api_dict.get(step.api_id) or await Api.filter(id=step.api_id).first()
+            # 请求中除头部信息、地址外的内容只由步骤、接口、请求超时时间决定
+            step_version = f'{step.id}.{step.update_time}.{api_temp.id}.{api_temp.update_time}.{self.time_out}'
+            step = StepModel(**dict(step))
+            step_case = await self.get_format_case(step.case_id)
+            api_project = await self.get_format_project(api_temp.project_id)
+            api_data = await self.get_format_api(api_project, api_obj=api_temp)
+
+            if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动， 此功能废弃
+                """
+                数据驱动格式
+                [
+                    {"comment": "用例1描述", "data": "请求数据，支持参数化"},
+                    {"comment": "用例2描述", "data": "请求数据，支持参数化"}
+                ]
+                """
+                for driver_data in step.data_driver:
+                    # 数据驱动的 comment 字段，用于做标识
+                    step.name += driver_data.get("comment", "")
+                    step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
+                    report_step_list.append(await self.parse_step(
+                        current_project, api_project, current_case, step_case, api_data, step, 0))
+            else:
+                report_step_list.append(await self.parse_step(
+                    current_project, api_project, current_case, step_case, api_data, step, 0, step_version))
+
+            # 把服务和用例的的自定义变量留下来
+            all_variables.update(api_project.variables)
+            all_variables.update(step_case.variables)
+
+        plan = {
+            "step_list": [(report_step.element_id, report_step.step_id, report_step.case_id, report_step.name,
+                           report_step.step_data) for report_step in report_step_list],
+            "variables": all_variables,
+            "step_count": len(self.all_case_steps),
+            "element_id_list": list(dict.fromkeys(step.api_id for step in self.all_case_steps))
+        }
+        self.all_case_steps = []  # 完整的解析完一条用例后，去除对应的解析信息
+        return plan
 
     async def parse_all_case(self):
-        """ 解析所有用例 """
+        """ 解析所有用例，解析完后批量写入报告用例和步骤 """
+        await self.prefetch_case_data()
+        report_case_plan = []  # [(报告用例, [报告步骤], 是否要执行)]
 
         # 遍历要运行的用例
         for case_id in self.case_id_list:
@@ -198,62 +331,47 @@ class RunCase(RunTestRunner):
                     report_case_data = current_case.get_attr()
                     report_case_data["run_env"] = self.env_code
 
-                    report_case = await ReportCase.create(
+                    report_case = ReportCase(
                         name=case_name,
                         case_id=current_case.id,
                         suite_id=current_case.suite_id,
                         report_id=self.report.id,
-                        case_data=current_case.get_attr(),
                         summary=ReportCase.get_summary_template()
                     )
 
-                    # 满足跳过条件则跳过
+                    # 满足跳过条件则跳过，用例数据先转json留存，后续解析会修改用例数据
                     if self.parse_case_is_skip(current_case.skip_if) is True:
-                        await report_case.test_is_skip()
+                        report_case.result = "skip"
+                        report_case.case_data = ReportCase.loads(ReportCase.dumps(current_case.get_attr()))
+                        report_case_plan.append((report_case, [], False))
                         continue
 
-                    case_suite = await CaseSuite.filter(id=current_case.suite_id).first()
-                    current_project = await self.get_format_project(case_suite.project_id)
-                    await self.get_all_steps(case_id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
-
-                    # 循环解析测试步骤
-                    all_variables = {}  # 当前用例的所有公共变量
-                    for step in self.all_case_steps:
-                        step = StepModel(**dict(step))
-                        step_case = await self.get_format_case(step.case_id)
-                        api_temp = await Api.filter(id=step.api_id).first()
-                        api_project = await self.get_format_project(api_temp.project_id)
-                        api_data = await self.get_format_api(api_project, api_obj=api_temp)
-
-                        if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动， 此功能废弃
-                            """
-                            数据驱动格式
-                            [
-                                {"comment": "用例1描述", "data": "请求数据，支持参数化"},
-                                {"comment": "用例2描述", "data": "请求数据，支持参数化"}
-                            ]
-                            """
-                            for driver_data in step.data_driver:
-                                # 数据驱动的 comment 字段，用于做标识
-                                step.name += driver_data.get("comment", "")
-                                step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
-                                await self.parse_step(current_project, api_project, current_case, step_case, api_data, step, report_case.id)
-                        else:
-                            await self.parse_step(current_project, api_project, current_case, step_case, api_data, step, report_case.id)
-
-                        # 把服务和用例的的自定义变量留下来
-                        all_variables.update(api_project.variables)
-                        all_variables.update(step_case.variables)
+                    if current_case.suite_id in self.suite_project_dict:
+                        suite_project_id = self.suite_project_dict[current_case.suite_id]
+                    else:
+                        suite_project_id = (await CaseSuite.filter(id=current_case.suite_id).first()).project_id
+                    current_project = await self.get_format_project(suite_project_id)
+                    plan = await self.get_case_plan(current_project, current_case)
+                    report_step_list = [  # 报告用例id在批量写入时回填
+                        reportStep(element_id=element_id, step_id=step_id, case_id=step_case_id, report_id=self.report.id,
+                                   report_case_id=0, name=step_name, step_data=step_data)
+                        for element_id, step_id, step_case_id, step_name, step_data in plan["step_list"]
+                    ]
+                    all_variables = dict(plan["variables"])  # 当前用例的所有公共变量
 
                     # 更新当前服务+当前用例的自定义变量，最后以当前用例设置的自定义变量为准
                     all_variables.update(current_project.variables)
                     all_variables.update(current_case.variables)
                     report_case_data["variables"].update(all_variables)  # = all_variables
                     report_case_data["run_type"] = self.run_type
-                    await report_case.update_report_case_data(report_case_data)
+                    report_case.case_data = ReportCase.loads(ReportCase.dumps(report_case_data))
+
+                    report_case_plan.append((report_case, report_step_list, True))
 
-                    self.test_plan["report_case_list"].append(report_case.id)
-                    self.all_case_steps = []  # 完整的解析完一条用例后，去除对应的解析信息
+        report_case_id_list = await self.save_report_case_plan(
+            [(report_case, report_step_list) for report_case, report_step_list, is_run in report_case_plan])
+        self.test_plan["report_case_list"].extend(
+            report_case_id for report_case_id, (_, _, is_run) in zip(report_case_id_list, report_case_plan) if is_run)
 
         # 去除服务级的公共变量，保证用步骤上解析后的公共变量
         self.test_plan["project_mapping"]["variables"] = {}
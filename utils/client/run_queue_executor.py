@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+""" 执行器：从执行队列表中领取测试并执行，与web服务分开部署，执行测试不占用web服务的事件循环 """
+import asyncio
+import os
+import socket
+import time
+import traceback
+from pathlib import Path
+
+from loguru import logger as loguru_logger
+
+from app.models.autotest.model_factory import RunQueue, RunLimit
+from config import ExecutorInfo
+from utils.client.run_api_test import RunApi, RunCase as RunApiCase
+from utils.client.run_ui_test import RunCase as RunUiCase
+from utils.util.file_util import LOG_ADDRESS
+
+# 执行器的日志
+logger = loguru_logger.bind(name="executor")
+logger.add(
+    Path(LOG_ADDRESS).joinpath("executor.log"),
+    colorize=True,
+    enqueue=True,
+    filter=lambda record: record["extra"].get("name") == "executor"
+)
+
+
+class RunQueueExecutor:
+    """ 每个进程一个执行器，最多同时执行 ExecutorInfo.MAX_RUNNING 个测试 """
+
+    def __init__(self):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.running_task = set()
+        self.loop_task = None
+        self.last_heartbeat = 0
+        self.run_limit = RunLimit(
+            ExecutorInfo.MAX_RUNNING_GLOBAL, ExecutorInfo.MAX_RUNNING_PER_PROJECT, ExecutorInfo.MAX_RUNNING_PER_ENV,
+            ExecutorInfo.MAX_RUNNING_PER_TRIGGER_TYPE
+        )
+
+    @staticmethod
+    def get_runner(queue: RunQueue):
+        """ 根据队列数据实例化对应的执行器 """
+        if queue.run_type == "api":
+            return RunApi(**queue.run_args)
+        case_runner = RunApiCase if queue.test_type == "api" else RunUiCase
+        return case_runner(**queue.run_args)
+
+    async def run(self, queue: RunQueue):
+        logger.info(f'开始执行队列【{queue.id}】，报告id: {queue.report_id}')
+        try:
+            await self.get_runner(queue).parse_and_run()
+            await queue.run_success()
+            logger.info(f'队列【{queue.id}】执行完成')
+        except asyncio.CancelledError:
+            await queue.run_fail("执行器已停止")
+            raise
+        except Exception:
+            error = traceback.format_exc()
+            logger.error(f'队列【{queue.id}】执行出错：\n{error}')
+            await queue.run_fail(error)
+
+    async def heartbeat(self):
+        """ 刷新本节点执行中数据的心跳，并把失联节点的数据标记为出错 """
+        if time.time() - self.last_heartbeat < ExecutorInfo.LOST_TIME_OUT / 5:
+            return
+        self.last_heartbeat = time.time()
+        await RunQueue.heartbeat(self.worker)
+        lost_count = await RunQueue.clear_lost(ExecutorInfo.LOST_TIME_OUT)
+        if lost_count:
+            logger.warning(f'有{lost_count}条执行中的数据所在节点已失联，已标记为执行出错')
+
+    async def poll(self):
+        """ 领取队列中等待执行的数据，以任务的形式在当前事件循环中执行 """
+        for queue in await RunQueue.claim(self.worker, ExecutorInfo.MAX_RUNNING - len(self.running_task), self.run_limit):
+            task = asyncio.create_task(self.run(queue))
+            self.running_task.add(task)
+            task.add_done_callback(self.running_task.discard)
+
+    async def loop(self):
+        while True:
+            try:
+                await self.heartbeat()
+                await self.poll()
+            except Exception:
+                logger.error(f'拉取执行队列出错：\n{traceback.format_exc()}')
+            await asyncio.sleep(ExecutorInfo.POLL_INTERVAL)
+
+    def start(self):
+        logger.info(f'执行器【{self.worker}】启动，最多同时执行{ExecutorInfo.MAX_RUNNING}个测试')
+        self.loop_task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+        """ 停止领取，并取消正在执行的测试，被取消的测试报告标记为执行出错 """
+        logger.info(f'执行器【{self.worker}】停止，正在执行的测试数：{len(self.running_task)}')
+        for task in [self.loop_task, *self.running_task]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*self.running_task, return_exceptions=True)
+
+
+run_queue_executor = RunQueueExecutor()
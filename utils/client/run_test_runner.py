@@ -1,13 +1,10 @@
-import copy
-import types
-import importlib
-
 from tortoise.expressions import F
 
 from app.models.autotest.model_factory import ApiProject, ApiProjectEnv, ApiCaseSuite, ApiCase, ApiStep, ApiMsg, \
     ApiReport, ApiReportCase, ApiReportStep, UiProject, UiProjectEnv, UiElement, UiCaseSuite, UiCase, UiStep, UiReport, \
     UiReportCase, UiReportStep, AppProject, AppProjectEnv, AppElement, AppCaseSuite, AppCase, AppStep, AppReport, \
     AppReportCase, AppReportStep
+from app.models.autotest.report_stat import ReportDailyStat
 from app.models.assist.hits import Hits
 from app.models.config.webhook import WebHook
 from app.schemas.enums import TriggerTypeEnum, ReceiveTypeEnum, ReportStepStatusEnum
@@ -16,6 +13,9 @@ from app.models.config.model_factory import RunEnv
 from app.models.assist.model_factory import Script
 from app.models.config.model_factory import Config
 from utils.client.test_runner.api import TestRunner
+from utils.client.test_runner.client.http_client import HttpClientPool
+from utils.util.script_executor import ScriptExecutor
+from utils.util.script_module_cache import ScriptModuleCache
 from utils.client.test_runner.utils import build_url
 from utils.client.parse_model import ProjectModel, ApiModel, CaseModel, ElementModel
 from utils.message.send_report import send_report, call_back_for_pipeline
@@ -111,7 +111,7 @@ class RunTestRunner:
     async def get_format_project(self, project_id):
         """ 从已解析的服务字典中取指定id的服务，如果没有，则取出来解析后放进去 """
         if not self.run_env:
-            self.run_env = await RunEnv.filter(code=self.env_code).first()
+            self.run_env = await RunEnv.get_by_code(self.env_code)
 
         if project_id not in self.parsed_project_dict:
             project = await self.project_model.filter(id=project_id).first()
@@ -153,13 +153,12 @@ class RunTestRunner:
 
     async def parse_functions(self, func_file_id_list):
         """ 获取自定义函数 """
+        if not func_file_id_list:
+            return
+        script_name_dict = dict(await Script.filter(id__in=func_file_id_list).values_list("id", "name"))
         for func_file_id in func_file_id_list:
-            query_set = await Script.filter(id=func_file_id).values("name")
-            func_file_data = importlib.reload(
-                importlib.import_module(f'script_list.{self.env_code}_{query_set[0]["name"]}'))
-            self.test_plan["project_mapping"]["functions"].update({
-                name: item for name, item in vars(func_file_data).items() if isinstance(item, types.FunctionType)
-            })
+            self.test_plan["project_mapping"]["functions"].update(
+                ScriptModuleCache.get_functions(self.env_code, script_name_dict[func_file_id]))
 
     def parse_case_is_skip(self, skip_if_list, server_id=None, phone_id=None):
         """ 判断是否跳过用例，暂时只支持对运行环境的判断 """
@@ -207,6 +206,27 @@ class RunTestRunner:
             }
         }
 
+    async def save_report_case_plan(self, report_case_plan):
+        """ 批量写入解析后的用例和步骤
+        report_case_plan: [(未入库的报告用例, [未入库的报告步骤])]，按执行顺序排列
+        返回按顺序排列的报告用例id
+        """
+        if not report_case_plan:
+            return []
+        await self.report_case_model.bulk_create([report_case for report_case, step_list in report_case_plan], batch_size=500)
+
+        # 同一个报告的用例只在这里写入，按id排序即为写入顺序
+        report_case_id_list = await self.report_case_model.filter(
+            report_id=self.report.id).order_by("id").values_list("id", flat=True)
+        report_step_list = []
+        for report_case_id, (report_case, step_list) in zip(report_case_id_list, report_case_plan):
+            report_case.id = report_case_id
+            for report_step in step_list:
+                report_step.report_case_id = report_case_id
+                report_step_list.append(report_step)
+        await self.report_step_model.bulk_create(report_step_list, batch_size=500)
+        return report_case_id_list
+
     async def save_report_and_send_message(self, result):
         """ 写入测试报告到数据库, 并把数据写入到文本中 """
         logger.info(f'开始保存测试报告')
@@ -280,39 +300,55 @@ class RunTestRunner:
                     await self.report_step_model.model_create(new_data)
 
             # 更新report
-            update_summary = await self.report_model.filter(id=self.insert_to).first().values("summary")
-            update_summary["summary"]["stat"]["test_case"]["fail"] -= self.report.summary["stat"]["test_case"]["success"]
-            update_summary["summary"]["stat"]["test_case"]["success"] += self.report.summary["stat"]["test_case"]["success"]
-            if update_summary["summary"]["stat"]["test_case"]["fail"] == 0:
-                update_summary["summary"]["result"] = self.report.summary["result"]  # 更新测试结果
+            insert_to_report = await self.report_model.filter(id=self.insert_to).first()
+            update_summary = insert_to_report.summary
+            update_summary["stat"]["test_case"]["fail"] -= self.report.summary["stat"]["test_case"]["success"]
+            update_summary["stat"]["test_case"]["success"] += self.report.summary["stat"]["test_case"]["success"]
+            if update_summary["stat"]["test_case"]["fail"] == 0:
+                update_summary["result"] = self.report.summary["result"]  # 更新测试结果
+            is_passed = 1 if update_summary["stat"]["test_case"]["fail"] == 0 else 0
             await self.report_model.filter(id=self.insert_to).update(
-                summary=update_summary["summary"],
-                is_passed=1 if update_summary["summary"]["stat"]["test_case"]["fail"] == 0 else 0,
+                summary=update_summary,
+                is_passed=is_passed,
                 retry_count=F("retry_count") + 1,  # 重跑次数+1
                 notified=False,  # 状态更新后未通知
             )
+            if is_passed != insert_to_report.is_passed:  # 重跑后结果有变化，同步更新按天汇总的通过数
+                await ReportDailyStat.add_report(insert_to_report, pass_count=is_passed - insert_to_report.is_passed)
 
     async def run_case(self):
         """ 调 testRunner().run() 执行测试 """
         logger.info(f'\n测试执行数据：\n{self.test_plan}')
-
-        if self.test_plan.get("is_async", 0):
-            # 并行执行, 遍历case，以case为维度多线程执行，测试报告按顺序排列
-            run_case_res_dict = {}
-            await self.report.run_case_start()
-            for index, case in enumerate(self.test_plan["report_case_list"]):
-                run_case_res_dict[index] = False  # 用例运行标识，索引：是否运行完成
-                test_plan = copy.deepcopy(self.test_plan)
-                test_plan["report_case_list"] = [case]
-                # self._async_run_case(temp_case, run_case_dict, index) # TODO 并行执行
+        HttpClientPool.acquire()
+        run_limit_token = ScriptExecutor.set_run_limit()  # 限制当前测试同时执行自定义函数的线程数
+        try:
+            await self._run_case()
+        finally:
+            ScriptExecutor.reset_run_limit(run_limit_token)
+            await HttpClientPool.release()  # 没有正在执行的测试时关闭连接池
+
+    async def _run_case(self):
+        # APP自动化用例共用同一台设备，不能并行执行
+        if self.test_plan.get("is_async", 0) and self.run_type != "app":
+            await self.async_run_case()
         else:  # 串行执行
             await self.sync_run_case()
 
+    async def async_run_case(self):
+        """ 以用例为维度并行执行，每条用例独立的Runner，测试报告按用例顺序汇总 """
+        await self.report.run_case_start()
+        runner = TestRunner()
+        await runner.run_parallel(self.test_plan, await Config.get_run_case_concurrency())
+        await self.run_case_finish(runner)
+
     async def sync_run_case(self):
         """ 单线程运行用例 """
         await self.report.run_case_start()
         runner = TestRunner()
         await runner.run(self.test_plan)
+        await self.run_case_finish(runner)
+
+    async def run_case_finish(self, runner):
         await self.report.run_case_finish()
         logger.info(f'测试执行完成，开始保存测试报告和发送报告')
         summary = runner.summary
@@ -9,7 +9,7 @@ from utils.client.run_test_runner import RunTestRunner
 from utils.client.parse_model import StepModel, FormatModel
 from utils.client.test_runner.utils import build_url
 from utils.util.file_util import FileUtil
-from config import ui_action_mapping_reverse, app_action_mapping_reverse
+from config import ClientMapping
 
 
 class RunCase(RunTestRunner):
@@ -56,7 +56,7 @@ class RunCase(RunTestRunner):
             self.front_report_addr = f'{await Config.get_report_host()}{await Config.get_app_ui_report_addr()}'
 
         self.test_plan["pause_step_time_out"] = await Config.get_pause_step_time_out()
-        await Script.create_script_file(self.env_code)  # 创建所有函数文件
+        await Script.sync_script_module(self.env_code)  # 同步所有脚本内容到模块缓存
         if self.run_type != "ui":
             self.device_dict = {device.id: dict(device) for device in await AppRunPhone.all()}
         self.report = await self.report_model.filter(id=self.report_id).first()
@@ -274,10 +274,8 @@ class RunCase(RunTestRunner):
                     step_element = await self.get_format_element(step.element_id)
                     step = StepModel(**dict(step))
                     step.report_case_id = report_case.id
-                    if self.run_type == 'ui':   # 执行方式的别名，用于展示测试报告
-                        step.execute_name = ui_action_mapping_reverse[step.execute_type]
-                    else:
-                        step.execute_name = app_action_mapping_reverse[step.execute_type]
+                    # 执行方式的别名，用于展示测试报告
+                    step.execute_name = ClientMapping.get(self.run_type)["action_mapping_reverse"][step.execute_type]
                     step.extracts = await self.parse_extracts(step.extracts)  # 解析数据提取
                     step.validates = await self.parse_validates(step.validates)  # 解析断言
                     element_project = await self.get_format_project(step_element.project_id)  # 元素所在的项目
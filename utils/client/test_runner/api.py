@@ -1,14 +1,17 @@
+import asyncio
 import datetime
 import traceback
 
 from utils.logs.log import logger
 from . import exceptions, parser, runner
+from .step_status import StepStatusHub
 
 
 class TestRunner:
 
     def __init__(self):
         self.summary = None
+        self.step_status_channel = None
 
     async def run_test(self, parsed_tests_mapping):
         """ 执行测试 """
@@ -21,64 +24,126 @@ class TestRunner:
         case_runner = runner.Runner(test_case_mapping["config"], functions)
         await case_runner.init_session_context()
 
-        report_case.summary["stat"]["total"] = len(test_case_mapping["step_list"])
-        await report_case.test_is_running()
+        try:
+            report_case.summary["stat"]["total"] = len(test_case_mapping["step_list"])
+            await report_case.test_is_running()
 
-        report_case.summary["time"]["start_at"] = datetime.datetime.now()  # 开始执行用例时间
-        for test_step in test_case_mapping["step_list"]:
-            try:
-                await case_runner.run_step(test_step, report_step_model)  # 执行测试步骤
-                step_error_traceback = None
-            except Exception as error:
-                step_error_traceback = traceback.format_exc()
-
-                # 没有执行结果，代表是执行异常，否则代表是步骤里面捕获了异常过后再抛出来的
-                if case_runner.client_session.meta_data["result"] is None:
-                    logger.error(traceback.format_exc())
-                    case_runner.client_session.meta_data["result"] = "error"
-
-            await case_runner.report_step.save_step_result_and_summary(case_runner, step_error_traceback)
-            if case_runner.run_type == "api":
-                case_runner.report_step.add_run_step_result_count(
-                    report_case.summary,
-                    case_runner.client_session.meta_data,
-                    parsed_tests_mapping["response_time_level"],
-                    test_step["report_step_id"])
-            else:
-                case_runner.report_step.add_run_step_result_count(report_case.summary,
-                                                                  case_runner.client_session.meta_data)
-        report_case.summary["time"]["end_at"] = datetime.datetime.now()  # 用例执行结束时间
+            report_case.summary["time"]["start_at"] = datetime.datetime.now()  # 开始执行用例时间
+            for test_step in test_case_mapping["step_list"]:
+                try:
+                    await case_runner.run_step(test_step, report_step_model, self.step_status_channel)  # 执行测试步骤
+                    step_error_traceback = None
+                except Exception as error:
+                    step_error_traceback = traceback.format_exc()
+
+                    # 没有执行结果，代表是执行异常，否则代表是步骤里面捕获了异常过后再抛出来的
+                    if case_runner.client_session.meta_data["result"] is None:
+                        logger.error(traceback.format_exc())
+                        case_runner.client_session.meta_data["result"] = "error"
+
+                await case_runner.report_step.save_step_result_and_summary(case_runner, step_error_traceback)
+                if case_runner.run_type == "api":
+                    case_runner.report_step.add_run_step_result_count(
+                        report_case.summary,
+                        case_runner.client_session.meta_data,
+                        parsed_tests_mapping["response_time_level"],
+                        test_step["report_step_id"])
+                else:
+                    case_runner.report_step.add_run_step_result_count(report_case.summary,
+                                                                      case_runner.client_session.meta_data)
+            report_case.summary["time"]["end_at"] = datetime.datetime.now()  # 用例执行结束时间
 
+        finally:
+            await self.close_case_client(case_runner)
+        await report_case.save_case_result_and_summary()
+        return report_case.summary
+
+    @classmethod
+    async def close_case_client(cls, case_runner):
+        """ 用例执行结束（包括执行出错）后释放client """
         if case_runner.run_type != "api":
             try:
-                await case_runner.client.close_all() # 每执行完一条用例都强制执行关闭浏览器/APP
+                await case_runner.client.close_all()  # 每执行完一条用例都强制执行关闭浏览器/APP
             except Exception as error:
                 logger.warning(f'关闭浏览器/APP时出错：{error}')
-        await report_case.save_case_result_and_summary()
-        return report_case.summary
+        else:
+            await case_runner.client_session.close()  # 释放当前用例的client，连接归还到连接池
+
+    async def parse_and_run_test(self, test_plan, report_case_id, is_skip=False):
+        """ 解析并执行一条用例，返回用例的summary，跳过执行时返回None
+        先解析再判断是否跳过，解析报错的用例依然记为报错
+        """
+        parsed_test_res = await parser.parse_test_data(test_plan, report_case_id)  # 解析测试计划
+        if parsed_test_res.get("result") == "error":  # 解析测试计划报错了，会返回当前用例的初始summary
+            return parsed_test_res
+        if is_skip:
+            await self.skip_test(test_plan, report_case_id)
+            return None
+        return await self.run_test(parsed_test_res)  # 执行测试用例
+
+    async def skip_test(self, test_plan, report_case_id):
+        await test_plan["report_case_model"].filter(id=report_case_id).update(result="skip")
+
+    def set_run_time(self, start_run_test_time):
+        run_case_finish_time = datetime.datetime.now()
+        self.summary["time"]["start_at"] = start_run_test_time.strftime("%Y-%m-%d %H:%M:%S")
+        self.summary["time"]["end_at"] = run_case_finish_time.strftime("%Y-%m-%d %H:%M:%S")
+        self.summary["time"]["all_duration"] = (run_case_finish_time - start_run_test_time).total_seconds()
 
     async def run(self, test_plan):
         """ 执行测试的流程 """
         report = await test_plan["report_model"].filter(id=test_plan["report_id"]).first()
         self.summary = report.summary  # 防止任务中没有用例导致报错
         start_run_test_time = datetime.datetime.now()
+        self.step_status_channel = await StepStatusHub.open(test_plan["report_step_model"], test_plan["report_id"])
+        try:
+            await self.run_case_list(test_plan, report)
+        finally:
+            StepStatusHub.close(self.step_status_channel)
+        self.set_run_time(start_run_test_time)
+
+    async def run_case_list(self, test_plan, report):
         skip_on_fail = False
         for report_case_id in test_plan["report_case_list"]:  # 解析一条用例就执行一条用例，减少内存开销
-            parsed_test_res = await parser.parse_test_data(test_plan, report_case_id)  # 解析测试计划
-            if parsed_test_res.get("result") == "error":  # 解析测试计划报错了，会返回当前用例的初始summary
-                case_summary = parsed_test_res
-            else:
-                if skip_on_fail:
-                    await parsed_test_res.get("report_case_model").filter(id=report_case_id).update(result="skip")
-                    continue
-                case_summary = await self.run_test(parsed_test_res)  # 执行测试用例
+            case_summary = await self.parse_and_run_test(test_plan, report_case_id, skip_on_fail)
+            if case_summary is None:
+                continue
             self.summary = report.merge_test_result(case_summary)  # 汇总测试结果
 
             # 如果用例结果是失败，并且设置了skip_on_fail，则后面所有直接跳过
-            if test_plan["skip_on_fail"] == 1 and skip_on_fail is False and case_summary["result"] in ["fail", "error"]:
+            if test_plan["skip_on_fail"] == 1 and case_summary["result"] in ["fail", "error"]:
                 skip_on_fail = True
 
-        run_case_finish_time = datetime.datetime.now()
-        self.summary["time"]["start_at"] = start_run_test_time.strftime("%Y-%m-%d %H:%M:%S")
-        self.summary["time"]["end_at"] = run_case_finish_time.strftime("%Y-%m-%d %H:%M:%S")
-        self.summary["time"]["all_duration"] = (run_case_finish_time - start_run_test_time).total_seconds()
+    async def run_parallel(self, test_plan, concurrency):
+        """ 以用例为维度并行执行，最多同时执行 concurrency 条用例，执行完后按用例顺序汇总测试结果 """
+        report = await test_plan["report_model"].filter(id=test_plan["report_id"]).first()
+        self.summary = report.summary  # 防止任务中没有用例导致报错
+        start_run_test_time = datetime.datetime.now()
+        semaphore = asyncio.Semaphore(max(int(concurrency), 1))
+        skip_on_fail = False
+
+        async def run_one(report_case_id):
+            nonlocal skip_on_fail
+            async with semaphore:
+                # 设置了skip_on_fail，有用例失败后，还没开始执行的用例直接跳过
+                case_summary = await self.parse_and_run_test(test_plan, report_case_id, skip_on_fail)
+                if case_summary is None:
+                    return None
+                if test_plan["skip_on_fail"] == 1 and case_summary["result"] in ["fail", "error"]:
+                    skip_on_fail = True
+                return case_summary
+
+        self.step_status_channel = await StepStatusHub.open(test_plan["report_step_model"], test_plan["report_id"])
+        try:
+            case_summary_list = await asyncio.gather(
+                *[run_one(report_case_id) for report_case_id in test_plan["report_case_list"]], return_exceptions=True)
+        finally:
+            StepStatusHub.close(self.step_status_channel)
+
+        for case_summary in case_summary_list:  # 按用例顺序汇总，保证每次汇总结果一致
+            if isinstance(case_summary, BaseException):
+                raise case_summary
+            if case_summary is not None:
+                self.summary = report.merge_test_result(case_summary)
+
+        self.set_run_time(start_run_test_time)
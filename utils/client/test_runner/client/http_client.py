@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import copy
+import importlib.util
 import traceback
 from datetime import datetime
 from urllib import parse
@@ -9,8 +11,73 @@ from httpx import Response, HTTPStatusError
 
 from utils.util.file_util import FileUtil
 from utils.client.test_runner.client.base_client import BaseSession
-from utils.client.test_runner.utils import build_url, lower_dict_keys, omit_long_data
+from utils.client.test_runner.utils import build_url, lower_dict_keys, omit_long_data, get_response_json
 from utils.logs.log import logger
+from config import HttpClientInfo
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """ 代理到进程内共享的连接池，client关闭时不关闭连接池，连接池由 HttpClientPool 统一关闭 """
+
+    async def handle_async_request(self, request):
+        return await HttpClientPool.get_transport().handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+class HttpClientPool:
+    """
+    进程内共享的httpx连接池，执行测试时复用连接，避免每个请求都重新建立TCP/TLS连接
+    每次执行测试开始时 acquire，结束时 release，没有正在执行的测试时关闭连接池
+    """
+    _transport = None
+    _ref_count = 0
+    _host_semaphore = {}
+
+    @classmethod
+    def get_transport(cls):
+        if cls._transport is None:
+            http2 = HttpClientInfo.HTTP2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("已配置启用HTTP/2，但未安装 h2 依赖包，使用HTTP/1.1")
+                http2 = False
+            cls._transport = httpx.AsyncHTTPTransport(
+                verify=False,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=HttpClientInfo.MAX_CONNECTIONS,
+                    max_keepalive_connections=HttpClientInfo.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HttpClientInfo.KEEPALIVE_EXPIRY
+                )
+            )
+        return cls._transport
+
+    @classmethod
+    def get_host_semaphore(cls, url):
+        """ 单个host的并发限制，httpx不支持按host限制连接数，用信号量控制 """
+        if HttpClientInfo.MAX_CONNECTIONS_PER_HOST <= 0:
+            return None
+        url = httpx.URL(url)
+        host = f'{url.scheme}://{url.host}:{url.port}'
+        if host not in cls._host_semaphore:
+            cls._host_semaphore[host] = asyncio.Semaphore(HttpClientInfo.MAX_CONNECTIONS_PER_HOST)
+        return cls._host_semaphore[host]
+
+    @classmethod
+    def acquire(cls):
+        cls._ref_count += 1
+
+    @classmethod
+    async def release(cls):
+        cls._ref_count = max(cls._ref_count - 1, 0)
+        if cls._ref_count == 0 and cls._transport is not None:
+            transport, cls._transport, cls._host_semaphore = cls._transport, None, {}
+            try:
+                await transport.aclose()
+            except Exception as error:
+                logger.warning(f'关闭httpx连接池时出错：{error}')
+
 
 class ApiResponse(Response):
 
@@ -34,8 +101,19 @@ class HttpSession(BaseSession):
         # super(HttpSession, self).__init__(*args, **kwargs)
         self.base_url = base_url if base_url else ""
         self.request_at = self.response_at = datetime.now()
+        self.client = None  # 每条用例一个client，cookie互不影响，连接复用进程内的连接池
         self.init_step_meta_data()
 
+    def get_client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(transport=_SharedTransport())
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
     def get_req_resp_record(self, resp_obj):
         """ 从response对象中获取请求和响应信息。 """
         def log_print(req_resp_dict, r_type):
@@ -81,7 +159,7 @@ class HttpSession(BaseSession):
         else:
             try:
                 # 响应体转json
-                req_resp_dict["response"]["json"] = resp_obj.json()
+                req_resp_dict["response"]["json"] = get_response_json(resp_obj)
             except ValueError:
                 # 若不能转为json，则转为文本，默认最多512个字符
                 resp_text = resp_obj.text
@@ -150,7 +228,13 @@ class HttpSession(BaseSession):
             self.request_at = datetime.now()
             logger.info(f"method: {method}, url: {url}, kwargs: {kwargs}")
             # requests库出现过卡死发不出请求的情况，换为httpx后没有出现问题
-            async with httpx.AsyncClient(verify=False) as client:
+            client = self.get_client()
+            client.cookies.clear()  # 不自动携带上一个步骤响应的cookie，保持每个请求相互独立
+            semaphore = HttpClientPool.get_host_semaphore(url)
+            if semaphore:
+                async with semaphore:
+                    response = await client.request(method, url, **kwargs)
+            else:
                 response = await client.request(method, url, **kwargs)
             self.response_at = datetime.now()
             return response
@@ -6,8 +6,14 @@ try:
 except ImportError:
     import json
 
+import re
 import sys
 
+try:
+    import orjson  # 可选依赖，解析大的json响应体更快
+except ImportError:
+    orjson = None
+
 try:
     JSONDecodeError = json.JSONDecodeError
 except AttributeError:
@@ -17,3 +23,19 @@ builtin_str = str
 basestring = (str, bytes)
 numeric_types = (int, float)
 integer_types = (int,)
+
+
+# 19位及以上的数字可能超过64位整数，orjson 会转为float丢失精度，这种数据用 json 解析
+long_number_regexp_compile = re.compile(rb"[0-9]{19}")
+
+
+def json_loads(content):
+    """ 解析json，装了 orjson 时优先用 orjson，orjson 解析不了的（如NaN）、可能丢失精度的（超长数字）再用 json 解析 """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if orjson is not None and not long_number_regexp_compile.search(content):
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(content)
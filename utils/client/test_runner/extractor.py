@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+""" 编译后的数据提取表达式、断言的检查项
+同样的表达式只解析一次：正则表达式预编译，"content.data.0.id" 这种路径预先拆分好，多次执行、数据驱动时直接复用
+"""
+import re
+from collections import OrderedDict
+
+from . import parser
+from utils.variables.regexp import text_extractor_regexp_compile
+
+EXTRACTOR_CACHE_SIZE = 4096
+
+_extractor_cache = OrderedDict()
+_check_item_cache = OrderedDict()
+
+
+class FieldExtractor:
+    """
+    从响应对象中提取数据的表达式，有两种方式
+    正则提取: regexp 为编译好的正则，"LB[\d]*(.*)RB[\d]*"
+    路径提取: top_query 为响应属性，path 为拆分好的路径，"headers.content-type" => ("headers", ("content-type",))
+    """
+    __slots__ = ("field", "regexp", "top_query", "sub_query", "path")
+
+    def __init__(self, field: str):
+        self.field = field
+        self.regexp, self.top_query, self.sub_query, self.path = None, None, None, None
+        if text_extractor_regexp_compile.match(field):
+            self.regexp = re.compile(field)
+        else:
+            self.top_query, _, self.sub_query = field.partition('.')
+            self.sub_query = self.sub_query or None  # "content." 与原来的 split 行为一致，视为没有子路径
+            if self.sub_query:
+                self.path = tuple(self.sub_query.split('.'))
+
+    def is_regexp(self):
+        return self.regexp is not None
+
+
+class CheckItem:
+    """
+    断言的检查项，编译时就判断好取值方式
+    eval: 含有变量、函数，需要解析
+    extract: 正则表达式或提取表达式，从响应中提取
+    const: 常量，原样使用
+    """
+    __slots__ = ("check_type", "extractor")
+
+    def __init__(self, check_item: str):
+        self.extractor = None
+        if parser.extract_variables(check_item) or parser.extract_functions(check_item):
+            self.check_type = "eval"
+        elif text_extractor_regexp_compile.match(check_item) or check_item.startswith(("content", "headers", "cookies")):
+            self.check_type = "extract"
+            self.extractor = compile_extractor(check_item)
+        else:
+            self.check_type = "const"
+
+
+def _get_cached(cache: OrderedDict, key, build):
+    """ 按表达式缓存，超过 EXTRACTOR_CACHE_SIZE 时淘汰最久没用到的 """
+    item = cache.get(key)
+    if item is not None:
+        cache.move_to_end(key)
+        return item
+    item = cache[key] = build(key)
+    if len(cache) > EXTRACTOR_CACHE_SIZE:
+        cache.popitem(last=False)
+    return item
+
+
+def compile_extractor(field: str) -> FieldExtractor:
+    return _get_cached(_extractor_cache, field, FieldExtractor)
+
+
+def compile_check_item(check_item: str) -> CheckItem:
+    return _get_cached(_check_item_cache, check_item, CheckItem)
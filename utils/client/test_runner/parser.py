@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 import ast
+import builtins
 import json
 import re
 import traceback
+from types import MappingProxyType
 
 from app.models.assist.model_factory import Script
 from . import exceptions, utils
@@ -10,6 +12,12 @@ from .compat import basestring, builtin_str, numeric_types
 from .validate_func import load_builtin_functions
 from utils.variables.regexp import variable_regexp, function_regexp, function_regexp_compile
 
+# 内置函数：断言方法 > python内置函数，导入时构建一次，只读
+BUILTIN_FUNCTIONS = MappingProxyType({
+    **{name: item for name, item in vars(builtins).items() if callable(item)},
+    **load_builtin_functions()
+})
+
 
 def parse_string_value(str_value):
     """ 把能转成数字的字符串转成数字
@@ -299,41 +307,32 @@ def get_mapping_variable(variable_name, variables_mapping):
 
 
 def get_mapping_function(function_name, functions_mapping):
-    """ get function from functions_mapping,
-        if not found, then try to check if builtin function.
+    """ 从函数映射中获取函数，没有则从内置函数中取（断言方法、python内置函数）
+    functions_mapping 一般是 build_functions_mapping 合并过内置函数的映射，直接一次查找就能取到
 
     Args:
-        variable_name (str): variable name
-        variables_mapping (dict): variables mapping
+        function_name (str): 函数名
+        functions_mapping (dict): 函数映射
 
     Returns:
-        mapping function object.
+        映射的函数
 
     Raises:
-        exceptions.FunctionNotFound: function is neither defined in debugtalk.py nor builtin.
+        exceptions.FunctionNotFound: 自定义函数和内置函数中都没有
 
     """
     if function_name in functions_mapping:
         return functions_mapping[function_name]
 
-    try:
-        # check if TestRunner builtin functions
-        # from . import loader
-        # built_in_functions = loader.load_builtin_functions()
-        built_in_functions = load_builtin_functions()
-        return built_in_functions[function_name]
-    except KeyError:
-        pass
+    if function_name in BUILTIN_FUNCTIONS:
+        return BUILTIN_FUNCTIONS[function_name]
 
-    try:
-        # check if Python builtin functions
-        item_func = eval(function_name)
-        if callable(item_func):
-            # is builtin function
-            return item_func
-    except (NameError, TypeError):
-        # is not builtin function
-        raise exceptions.FunctionNotFound(f"自定义函数 【{function_name}】 没有找到")
+    raise exceptions.FunctionNotFound(f"自定义函数 【{function_name}】 没有找到")
+
+
+def build_functions_mapping(functions_mapping=None):
+    """ 把自定义函数与内置函数合并为一个映射，同名时以自定义函数为准，每个 Runner 合并一次 """
+    return {**BUILTIN_FUNCTIONS, **(functions_mapping or {})}
 
 
 async def parse_string_functions(content, variables_mapping, functions_mapping):
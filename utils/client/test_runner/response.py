@@ -1,12 +1,10 @@
 # -*- coding: utf-8 -*-
-import re
-
 from . import exceptions, utils
+from .extractor import compile_extractor
 from .compat import OrderedDict, basestring
 from .parser import extract_functions, parse_function, get_mapping_variable
 from utils.client.test_runner.parser import extract_variables
 from .validator import is_extract_expression, is_const
-from ...variables.regexp import text_extractor_regexp_compile
 
 
 class ResponseObject(object):
@@ -21,7 +19,7 @@ class ResponseObject(object):
     def __getattr__(self, key):
         try:
             if key == "json":
-                value = self.resp_obj.json()
+                value = utils.get_response_json(self.resp_obj)  # 与记录报告时共用解析结果
             elif key == "cookies":
                 value = dict(self.resp_obj.cookies.items())
             elif key == "headers":
@@ -35,10 +33,10 @@ class ResponseObject(object):
             err_msg = "响应对象中没有属性: {}".format(key)
             raise exceptions.ParamsError(err_msg)
 
-    def _extract_field_with_regex(self, field):
+    def _extract_field_with_regex(self, extractor):
         """ 从响应对象中提取数据，支持json和字符串
         Args:
-            field (str): 正则字符串 r".*\(.*\).*"
+            extractor (FieldExtractor): 编译好的正则提取表达式 r".*\(.*\).*"
         Returns:
             str: 匹配的内容
         Raises:
@@ -49,18 +47,18 @@ class ResponseObject(object):
             >>> _extract_field_with_regex(field)
             abc
         """
-        matched = re.search(field, self.resp_obj.text)
+        matched = extractor.regexp.search(self.resp_obj.text)
         if not matched:
-            err_msg = u"正则表达式提取数据失败! => {}\n".format(field)
+            err_msg = u"正则表达式提取数据失败! => {}\n".format(extractor.field)
             err_msg += u"response body: {}\n".format(self.resp_obj.text)
             raise exceptions.ExtractFailure(err_msg)
 
         return matched.group(1)
 
-    def _extract_field_with_delimiter(self, field, variable_data=None):
+    def _extract_field_with_delimiter(self, extractor, variable_data=None):
         """ 响应内容可以是json或html文本
         Args:
-            field (str): 由分隔符连接的字符串。
+            extractor (FieldExtractor): 编译好的路径提取表达式，原表达式为由分隔符连接的字符串。
             e.g.
                 "status_code"
                 "headers"
@@ -69,13 +67,8 @@ class ResponseObject(object):
                 "headers.content-type"
                 "content.person.name.first_name"
         """
-        # string.split(sep=None, maxsplit=-1) -> list of strings
-        # e.g. "content.person.name" => ["content", "person.name"]
-        try:
-            top_query, sub_query = field.split('.', 1)
-        except ValueError:
-            top_query = field
-            sub_query = None
+        # e.g. "content.person.name" => top_query: "content", sub_query: "person.name", path: ("person", "name")
+        field, top_query, sub_query, path = extractor.field, extractor.top_query, extractor.sub_query, extractor.path
 
         # status_code
         if top_query in ["status_code", "encoding", "ok", "reason", "url"]:
@@ -143,10 +136,10 @@ class ResponseObject(object):
 
             if isinstance(body, (dict, list)):
                 # content = {"xxx": 123}, content.xxx
-                return utils.query_json(body, sub_query)
+                return utils.query_json(body, path)
             elif sub_query.isdigit():
                 # content = "abcdefg", content.3 => d
-                return utils.query_json(body, sub_query)
+                return utils.query_json(body, path)
             else:
                 # content = "<html>abcdefg</html>", content.xxx
                 err_msg = f"从响应体提取数据失败 => {field}\n响应体: {body}\n"
@@ -154,7 +147,7 @@ class ResponseObject(object):
 
         # 自定义变量
         elif top_query == "variable":
-            return utils.query_json(variable_data, sub_query)
+            return utils.query_json(variable_data, path)
 
         # new set response attributes in teardown_hooks
         elif top_query in self.__dict__:
@@ -166,10 +159,10 @@ class ResponseObject(object):
 
             if isinstance(attributes, (dict, list)):
                 # attributes = {"xxx": 123}, content.xxx
-                return utils.query_json(attributes, sub_query)
+                return utils.query_json(attributes, path)
             elif sub_query.isdigit():
                 # attributes = "abcdefg", attributes.3 => d
-                return utils.query_json(attributes, sub_query)
+                return utils.query_json(attributes, path)
             else:
                 # content = "attributes.new_attribute_not_exist"
                 err_msg = u"Failed to extract cumstom set attribute from teardown hooks! => {}\n".format(field)
@@ -192,11 +185,12 @@ class ResponseObject(object):
             err_msg = f"无效的提取器 => {field}\n"
             raise exceptions.ParamsError(err_msg)
 
-        # 判断是否能被正则编译，如果能被正则编译，则用正则提取方式
-        if text_extractor_regexp_compile.match(field):
-            value = self._extract_field_with_regex(field)
+        # 同样的表达式只解析一次，能被正则编译的用正则提取方式，否则按路径提取
+        extractor = compile_extractor(field)
+        if extractor.is_regexp():
+            value = self._extract_field_with_regex(extractor)
         else:
-            value = self._extract_field_with_delimiter(field, variable_data)
+            value = self._extract_field_with_delimiter(extractor, variable_data)
 
         return value
 
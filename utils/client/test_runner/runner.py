@@ -1,12 +1,10 @@
-import copy
 import traceback
 from unittest.case import SkipTest
 
-from . import exceptions, response, extract  # , logger
+from . import exceptions, response, extract, template  # , logger
 from .client.http_client import HttpSession
-from .client.ui_client import UIClientSession, get_ui_client
-from .client.app_client import APPClientSession, get_app_client
 from .runner_context import SessionContext
+from app.schemas.enums import ReportStepStatusEnum
 from utils.logs.redirect_print_log import RedirectPrintLogToMemory
 from utils.logs.log import logger
 
@@ -65,6 +63,7 @@ class Runner:
 
         # 记录当前步骤的执行进度
         self.report_step = None
+        self.report_case_id = config.get("report_case_id")
         self.pause_step_time_out = config.get("pause_step_time_out", 10 * 60)  # 暂停测试步骤状态变更的超时时间（暂停 => 放行），默认10分钟
         # self.testcase_teardown_hooks = config.get("teardown_hooks", [])  # 用例级别的后置条件
         self.session_context = SessionContext(self.functions)
@@ -79,10 +78,12 @@ class Runner:
         if self.client_session is None:
             if self.run_type == "api":
                 self.client_session = HttpSession(self.base_url)
-            elif self.run_type == "ui":
+            elif self.run_type == "ui":  # playwright、appium导入很慢，执行ui、app测试时才导入
+                from .client.ui_client import UIClientSession, get_ui_client
                 self.client_session = UIClientSession()
                 self.client = await get_ui_client(browser_name=self.browser_name)
             else:
+                from .client.app_client import APPClientSession, get_app_client
                 self.client_session = APPClientSession()
                 self.client = await get_app_client(**self.appium_config)
 
@@ -216,11 +217,11 @@ class Runner:
             request_data = step_dict.get("request", {})
             # 把上一个步骤提取出来需要更新到头部信息的数据更新到请求上
             request_data["headers"] = self.session_context.update_filed_to_header(request_data["headers"])
+            parsed_step = await self.parse_request(request_data, step_dict.get("step_version"))
         else:
             request_data = step_dict.get("test_action", {})
             request_data["report_step_id"] = step_dict["report_step_id"]
-
-        parsed_step = await self.session_context.eval_content(request_data)
+            parsed_step = await self.session_context.eval_content(request_data)
         self.session_context.update_test_variables("request", parsed_step)
 
         # 如果请求体是字符串（xml），转为utf-8格式
@@ -231,10 +232,8 @@ class Runner:
         await self.report_step.test_is_start_before()
         await self.do_hook_actions(step_dict.get("setup_hooks", []))
 
-        # 深拷贝除 request 的其他数据，请求数据有可能是io，io不能深拷贝，所以先移出再深拷贝，再移入
-        copy_request = self.session_context.test_variables_mapping.pop("request")
-        variables_mapping = copy.deepcopy(self.session_context.test_variables_mapping)
-        self.session_context.test_variables_mapping["request"] = copy_request
+        # 记录除 request 外的变量快照，请求数据有可能是io，不记录
+        variables_mapping = self.session_context.snapshot_variables()
 
         # 开始执行测试
         await self.report_step.test_is_start_running()
@@ -247,7 +246,7 @@ class Runner:
                 url,
                 name=step_name,
                 case_id=case_id,
-                variables_mapping=copy.deepcopy(variables_mapping),
+                variables_mapping=variables_mapping,
                 **parsed_step
             )
             self.resp_obj = response.ResponseObject(resp)
@@ -263,7 +262,7 @@ class Runner:
                 self.client,
                 name=step_name,
                 case_id=case_id,
-                variables_mapping=copy.deepcopy(variables_mapping),
+                variables_mapping=variables_mapping,
                 **parsed_step
             )
 
@@ -305,9 +304,23 @@ class Runner:
 
         await self.report_step.test_is_success(self.get_test_step_data())
 
+    async def parse_request(self, request_data, step_version=None):
+        """ 解析接口请求，头部信息每次执行都可能带上之前步骤提取的数据，地址拼接了服务域名，这两项每次单独解析
+        其余内容只由步骤、接口决定，编译好的模板树按步骤版本缓存，同一步骤再次执行时直接复用
+        """
+        separate_key_list = ("headers", "url")
+        step_template = template.compile_step_template(
+            (self.run_type, step_version) if step_version else None,
+            {key: value for key, value in request_data.items() if key not in separate_key_list})
+        parsed_request = await self.session_context.eval_content(step_template)
+        for key in separate_key_list:
+            if key in request_data:
+                parsed_request[key] = await self.session_context.eval_content(request_data[key])
+        return {key: parsed_request[key] for key in request_data}  # 保持请求数据原来的字段顺序
+
     def get_test_step_data(self):
         """ 获取测试数据 """
-        request = copy.deepcopy(self.client_session.meta_data["data"][0]["request"])
+        request = dict(self.client_session.meta_data["data"][0]["request"])  # 只替换body，不需要深拷贝
         request_body = request.get("body")
         if request_body and isinstance(request_body, bytes):
             request["body"] = str(request_body)
@@ -317,7 +330,7 @@ class Runner:
             "name": self.client_session.meta_data["name"],
             "stat": self.client_session.meta_data["stat"],
             "redirect_print": self.client_session.meta_data["redirect_print"],
-            "variables_mapping": self.client_session.meta_data.get("variables_mapping", {}),
+            "variables_mapping": dict(self.client_session.meta_data.get("variables_mapping") or {}),
             "attachment": "",
             "request": request,
             "response": self.client_session.meta_data["data"][0]["response"],
@@ -332,7 +345,7 @@ class Runner:
         }
         return data
 
-    async def run_step(self, step_dict, report_step_model):
+    async def run_step(self, step_dict, report_step_model, step_status_channel):
         """ 运行用例的单个测试步骤
         Args:
             step_dict (dict):{
@@ -344,7 +357,6 @@ class Runner:
                     }
                 }
         """
-        self.redirect_print = RedirectPrintLogToMemory()  # 重定向自定义函数的打印到内存中
         try:
             await self.init_client_session()  # 执行步骤前判断有没有初始化client_session
         except Exception as error:
@@ -360,9 +372,11 @@ class Runner:
                 self.client_init_error = str(error)
                 logger.error(traceback.format_exc())
 
-        self.report_step = await report_step_model.get_resport_step_with_status(step_dict.get("report_step_id"),
-                                                                                self.pause_step_time_out)
-        if self.report_step.status == "stop":  # 停止测试
+        report_step_id = step_dict.get("report_step_id")
+        status = await step_status_channel.wait_step_status(report_step_id, self.report_case_id, self.pause_step_time_out)
+        self.report_step = report_step_model(
+            id=report_step_id, report_id=step_status_channel.report_id, report_case_id=self.report_case_id, status=status)
+        if status == ReportStepStatusEnum.STOP:  # 停止测试
             self.__clear_step_test_data()
             raise exceptions.StopTest("中断测试执行")
         await self.report_step.test_is_running()
@@ -371,6 +385,8 @@ class Runner:
         if self.client_init_error:
             raise RuntimeError(self.client_init_error)
 
+        # 当前步骤中自定义函数的打印记录到内存中，只影响当前协程，不影响并发执行的其他步骤，在下面的 finally 中恢复
+        self.redirect_print = RedirectPrintLogToMemory()
         try:
             logger.info(
                 f"""开始执行步骤: {self.report_step.report_id}.{self.report_step.report_case_id}.{self.report_step.id}.{step_dict.get("name")}""")
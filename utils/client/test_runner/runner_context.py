@@ -1,8 +1,61 @@
 # -*- coding: utf-8 -*-
 import json
-import re
+from types import MappingProxyType
 
-from . import exceptions, parser, utils
+from . import exceptions, extractor, parser, template, utils
+
+
+class VariableScope(dict):
+    """ 分层的变量作用域，本层没有的变量依次到上层取，写入只写本层，不会修改上层
+    是 dict 的子类，解析、提取数据时按普通字典读写即可
+    变量之间只共享引用，更新变量是替换引用而不是修改原来的值，所以生成快照时不需要深拷贝
+
+    Examples:
+        >>> session = VariableScope({"token": "abc"})
+        >>> step = VariableScope({}, session, VariableScope({"token": "default", "page": 1}))
+        >>> step["token"], step["page"]
+            ("abc", 1)
+    """
+
+    def __init__(self, variables=None, *parents):
+        super().__init__(variables or {})
+        self.parents = parents
+
+    def __missing__(self, key):
+        for parent in self.parents:
+            if key in parent:
+                return parent[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or any(key in parent for parent in self.parents)
+
+    def __bool__(self):
+        """ 本层为空，上层有变量时也视为有变量，避免 variables_mapping or {} 时丢掉上层 """
+        return dict.__len__(self) > 0 or any(self.parents)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def flatten(self):
+        """ 合并所有层的变量，优先级高的覆盖优先级低的 """
+        variables = {}
+        for parent in reversed(self.parents):
+            variables.update(parent.flatten() if isinstance(parent, VariableScope) else parent)
+        variables.update(self)
+        return variables
+
+    def snapshot(self, exclude=()):
+        """ 当前变量的只读快照，只复制引用 """
+        variables = self.flatten()
+        for key in exclude:
+            variables.pop(key, None)
+        return MappingProxyType(variables)
 
 
 class SessionContext(object):
@@ -20,8 +73,8 @@ class SessionContext(object):
     """
     def __init__(self, functions, variables=None):
         # 初始化时把当前测试用例运行结果标识为成功，后续步骤可根据此状态判断是否继续执行
-        self.session_variables_mapping = utils.list_to_dict(variables or {"case_run_result": "success"})
-        self.FUNCTIONS_MAPPING = functions
+        self.session_variables_mapping = VariableScope(utils.list_to_dict(variables or {"case_run_result": "success"}))
+        self.FUNCTIONS_MAPPING = parser.build_functions_mapping(functions)  # 合并内置函数，取函数时只需要查一次
         # await self.init_test_variables()
         self.validation_results = []
         self.update_to_header = {}
@@ -42,10 +95,10 @@ class SessionContext(object):
         variables_mapping = variables_mapping or {}
         variables_mapping = utils.list_to_dict(variables_mapping)
 
-        self.test_variables_mapping = {}
-        # 提取的变量将覆盖预先定义好的变量
-        self.test_variables_mapping.update(variables_mapping)
-        self.test_variables_mapping.update(self.session_variables_mapping)
+        # 变量作用域：当前步骤写入的变量 > 会话中提取的变量 > 步骤（已合并用例配置）中定义的变量
+        # 提取的变量将覆盖预先定义好的变量，只引用上层，不复制
+        self.test_variables_mapping = VariableScope(
+            {}, self.session_variables_mapping, VariableScope(variables_mapping))
 
         for variable_name, variable_value in variables_mapping.items():
             variable_value = await self.eval_content(variable_value)
@@ -59,7 +112,12 @@ class SessionContext(object):
         """ 使用提取的变量映射更新会话。这些变量在整个运行会话中有效。"""
         variables_mapping = utils.list_to_dict(variables_mapping)
         self.session_variables_mapping.update(variables_mapping)
-        self.test_variables_mapping.update(self.session_variables_mapping)
+        for key in self.session_variables_mapping:  # 会话变量覆盖当前步骤中写入的同名变量
+            self.test_variables_mapping.pop(key, None)
+
+    def snapshot_variables(self, exclude=("request",)):
+        """ 记录到报告里面的当前变量，只读快照，不深拷贝变量值 """
+        return self.test_variables_mapping.snapshot(exclude)
 
     def save_update_to_header_filed(self, filed_list: list, extracted_variables_mapping: dict):
         """ 把提取后需要更新到头部信息的数据保存下来
@@ -75,12 +133,12 @@ class SessionContext(object):
         return headers
 
     async def eval_content(self, content):
-        """ 递归解析内容中的每个变量和函数。内容可以是任何数据结构，包括字典、列表、元组、数字、字符串等。"""
-        return await parser.parse_data(
-            content,
-            self.test_variables_mapping,
-            self.FUNCTIONS_MAPPING
-        )
+        """ 递归解析内容中的每个变量和函数。内容可以是任何数据结构，包括字典、列表、元组、数字、字符串等。
+        content 可以是已经编译好的模板，不是模板时先编译，字符串模板按内容缓存
+        """
+        if not isinstance(content, template.TEMPLATE_TYPES):
+            content = template.compile_template(content)
+        return await content.render(self.test_variables_mapping, self.FUNCTIONS_MAPPING)
 
     async def __eval_check_item(self, validator, resp_obj):
         """ evaluate check item in validator.
@@ -109,12 +167,12 @@ class SessionContext(object):
         # 4, string joined by delimiter. e.g. "status_code", "headers.content-type"
         # 5, regex string, e.g. "LB[\d]*(.*)RB[\d]*"
 
-        if isinstance(check_item, (dict, list)) \
-            or parser.extract_variables(check_item) \
-            or parser.extract_functions(check_item):
+        # 字符串的检查项按内容缓存解析结果，同样的检查项只判断一次取值方式
+        compiled_check_item = extractor.compile_check_item(check_item) if isinstance(check_item, str) else None
+        if compiled_check_item is None or compiled_check_item.check_type == "eval":
             # format 1/2/3
             check_value = await self.eval_content(check_item)
-        elif re.compile(r".*\(.*\).*").match(check_item) or check_item.startswith(("content", "headers", "cookies")):  # 正则表达式或提取表达式
+        elif compiled_check_item.check_type == "extract":  # 正则表达式或提取表达式
             check_value = resp_obj.extract_field(check_item)
         else:
             check_value = check_item
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+""" 测试步骤 暂停/放行/中断 的控制通道，执行步骤时直接读内存中的状态，不用每个步骤都查数据库 """
+import asyncio
+import time
+
+from app.schemas.enums import ReportStepStatusEnum
+from utils.logs.log import logger
+
+
+class StepStatusChannel:
+    """ 一次测试执行的步骤状态，只记录非放行状态的步骤 {report_step_id: status} """
+
+    def __init__(self, report_step_model, report_id):
+        self.report_step_model = report_step_model
+        self.report_id = report_id
+        self.status_dict = {}
+        self.changed = asyncio.Event()
+
+    def set_status_dict(self, status_dict: dict):
+        """ 状态有变化时唤醒等待中的步骤 """
+        if status_dict != self.status_dict:
+            self.status_dict = status_dict
+            changed, self.changed = self.changed, asyncio.Event()
+            changed.set()
+
+    async def refresh(self):
+        query_set = await self.report_step_model.filter(
+            report_id=self.report_id, status__not=ReportStepStatusEnum.RESUME).values_list("id", "status")
+        self.set_status_dict(dict(query_set))
+
+    async def wait_step_status(self, report_step_id, report_case_id, time_out=60):
+        """ 如果步骤的状态是暂停，则等放行或者暂停超时后再返回，模拟debug """
+        end_time = time.monotonic() + time_out
+        while self.status_dict.get(report_step_id) == ReportStepStatusEnum.PAUSE:
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                # 步骤暂停超时过后还没有放行，把后面的所有步骤都改为停止执行
+                await self.report_step_model.update_status(
+                    None, report_case_id, report_step_id, ReportStepStatusEnum.STOP)
+                await self.refresh()
+                return ReportStepStatusEnum.STOP
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.status_dict.get(report_step_id, ReportStepStatusEnum.RESUME)
+
+
+class StepStatusHub:
+    """
+    管理当前执行器进程中正在执行的测试的控制通道
+    测试都在执行器中执行，web服务修改的状态由后台任务每 WATCH_INTERVAL 秒批量查一次数据库同步，暂停/放行/中断最多延迟 WATCH_INTERVAL 秒生效
+    """
+    WATCH_INTERVAL = 2
+    channel_dict = {}  # {(report_step_model, report_id): StepStatusChannel}
+    watch_task = None
+
+    @classmethod
+    async def open(cls, report_step_model, report_id):
+        channel = StepStatusChannel(report_step_model, report_id)
+        await channel.refresh()
+        cls.channel_dict[(report_step_model, report_id)] = channel
+        if cls.watch_task is None or cls.watch_task.done():
+            cls.watch_task = asyncio.create_task(cls.watch())
+        return channel
+
+    @classmethod
+    def close(cls, channel: StepStatusChannel):
+        cls.channel_dict.pop((channel.report_step_model, channel.report_id), None)
+
+    @classmethod
+    async def watch(cls):
+        """ 同一类型的报告一次查询，同步其他进程修改的状态 """
+        while cls.channel_dict:
+            await asyncio.sleep(cls.WATCH_INTERVAL)
+            model_dict = {}
+            for (model, report_id), channel in list(cls.channel_dict.items()):
+                model_dict.setdefault(model, {})[report_id] = channel
+            for model, channel_dict in model_dict.items():
+                try:
+                    query_set = await model.filter(
+                        report_id__in=list(channel_dict.keys()), status__not=ReportStepStatusEnum.RESUME
+                    ).values_list("report_id", "id", "status")
+                except Exception as error:
+                    logger.warning(f'同步步骤状态出错：{error}')
+                    continue
+                status_dict = {report_id: {} for report_id in channel_dict}
+                for report_id, report_step_id, status in query_set:
+                    status_dict[report_id][report_step_id] = status
+                for report_id, channel in channel_dict.items():
+                    channel.set_status_dict(status_dict[report_id])
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+""" 编译后的 $var / ${func()} 模板
+把要解析的数据先编译为模板树，字符串中的常量片段、变量名、函数名和参数在编译时就拆好，执行时只需要往占位里填值
+解析结果与 parser.parse_data 一致，字符串模板按内容缓存，同样的字符串只编译一次
+"""
+import re
+from collections import OrderedDict
+
+from app.models.assist.model_factory import Script
+from . import exceptions, parser, utils
+from .compat import builtin_str, numeric_types
+from utils.variables.regexp import variable_regexp, function_regexp
+
+variable_regexp_compile = re.compile(variable_regexp)
+function_regexp_full_compile = re.compile(function_regexp)
+variable_at_end_regexp_compile = re.compile(r"\$[\w_]*$")  # 以变量结尾的常量片段，拼上函数返回值后有可能变成另一个变量
+
+TEMPLATE_CACHE_SIZE = 4096
+STEP_TEMPLATE_CACHE_SIZE = 1024
+
+
+class ConstTemplate:
+    """ 不需要解析的数据，原样返回 """
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content
+
+    async def render(self, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+        return self.content
+
+
+class ListTemplate:
+    __slots__ = ("item_list",)
+
+    def __init__(self, content):
+        self.item_list = [compile_template(item) for item in content]
+
+    async def render(self, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+        return [
+            await item.render(variables_mapping, functions_mapping, raise_if_variable_not_found)
+            for item in self.item_list
+        ]
+
+
+class DictTemplate:
+    __slots__ = ("item_list",)
+
+    def __init__(self, content):
+        self.item_list = [(compile_template(key), compile_template(value)) for key, value in content.items()]
+
+    async def render(self, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+        parsed_content = {}
+        for key, value in self.item_list:
+            parsed_key = await key.render(variables_mapping, functions_mapping, raise_if_variable_not_found)
+            parsed_content[parsed_key] = await value.render(
+                variables_mapping, functions_mapping, raise_if_variable_not_found)
+        return parsed_content
+
+
+class FunctionSlot:
+    """ 字符串中的 ${func(a, $b)}，函数名和参数在编译时解析好 """
+    __slots__ = ("func_name", "args", "kwargs")
+
+    def __init__(self, func_content):
+        function_meta = parser.parse_function(func_content)
+        self.func_name = function_meta["func_name"]
+        self.args = compile_template(function_meta["args"])
+        self.kwargs = compile_template(function_meta["kwargs"])
+
+    async def call(self, variables_mapping, functions_mapping):
+        args = await self.args.render(variables_mapping, functions_mapping)
+        kwargs = await self.kwargs.render(variables_mapping, functions_mapping)
+        func = parser.get_mapping_function(self.func_name, functions_mapping)
+        return await Script.run_func(func, args, kwargs)
+
+
+class StringTemplate:
+    """
+    含有变量或函数的字符串，先执行所有函数，再替换变量，与 parser.parse_data 的顺序一致
+    part_list: 按函数拆分后的片段，常量片段为 [常量, 变量名, 常量, ...]，函数片段为 FunctionSlot
+    函数返回值中带有 $ 时，拼接后的字符串可能出现新的变量，这种情况交给 parser.parse_string_variables 处理
+    """
+    __slots__ = ("content", "part_list", "function_list", "need_rescan")
+
+    def __init__(self, content: str):
+        self.content = content
+        self.part_list, self.function_list, self.need_rescan = [], [], False
+        start = 0
+        for matched in function_regexp_full_compile.finditer(content):
+            literal = content[start:matched.start()]
+            self.part_list.append(variable_regexp_compile.split(literal))
+            if variable_at_end_regexp_compile.search(literal):
+                self.need_rescan = True
+            function_slot = FunctionSlot(matched.group(1))
+            self.function_list.append(function_slot)
+            self.part_list.append(function_slot)
+            start = matched.end()
+        self.part_list.append(variable_regexp_compile.split(content[start:]))
+
+    def is_single_function(self):
+        return len(self.part_list) == 3 and self.part_list[0] == [''] and self.part_list[2] == ['']
+
+    def is_single_variable(self):
+        return len(self.part_list) == 1 and self.part_list[0][0] == '' and self.part_list[0][2:] == ['']
+
+    async def render(self, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+        variables_mapping = utils.list_to_dict(variables_mapping or {})
+        functions_mapping = functions_mapping or {}
+
+        # 与 parse_data 一致，变量没找到且不需要抛异常时，函数阶段出错返回原字符串，变量阶段出错返回只替换了函数的字符串
+        try:
+            value_list = [
+                await function_slot.call(variables_mapping, functions_mapping) for function_slot in self.function_list
+            ]
+        except exceptions.VariableNotFound:
+            if raise_if_variable_not_found:
+                raise
+            return self.content
+
+        try:
+            return await self.render_variables(value_list, variables_mapping, functions_mapping)
+        except exceptions.VariableNotFound:
+            if raise_if_variable_not_found:
+                raise
+            return self.join_functions(value_list)
+
+    async def render_variables(self, value_list, variables_mapping, functions_mapping):
+        if self.function_list and self.is_single_function():
+            # 整个字符串就是一个函数，直接返回函数的返回值
+            value = value_list[0]
+            if isinstance(value, str) and "$" in value:
+                return await parser.parse_string_variables(value, variables_mapping, functions_mapping)
+            return value
+
+        if not self.function_list and self.is_single_variable():
+            # 整个字符串就是一个变量，直接返回变量的值
+            return await get_variable(self.part_list[0][1], variables_mapping, functions_mapping)
+
+        if self.need_rescan or any("$" in str(value) for value in value_list):
+            return await parser.parse_string_variables(
+                self.join_functions(value_list), variables_mapping, functions_mapping)
+
+        result_list, value_index = [], 0
+        for part in self.part_list:
+            if isinstance(part, FunctionSlot):
+                result_list.append(str(value_list[value_index]))
+                value_index += 1
+                continue
+            for index, item in enumerate(part):
+                if index % 2 == 0:
+                    result_list.append(item)
+                    continue
+                variable_value = await get_variable(item, variables_mapping, functions_mapping)
+                if not isinstance(variable_value, str):
+                    variable_value = builtin_str(variable_value)
+                elif "$" in variable_value:  # 变量值里面还有$，按逐个替换的方式处理，保证结果与 parse_data 一致
+                    return await parser.parse_string_variables(
+                        self.join_functions(value_list), variables_mapping, functions_mapping)
+                result_list.append(variable_value)
+        return "".join(result_list)
+
+    def join_functions(self, value_list):
+        """ 只替换函数，变量保持原样 """
+        if self.function_list and self.is_single_function():
+            return value_list[0]
+        result_list, value_index = [], 0
+        for part in self.part_list:
+            if isinstance(part, FunctionSlot):
+                result_list.append(str(value_list[value_index]))
+                value_index += 1
+            else:
+                result_list.append("".join(item if index % 2 == 0 else f'${item}' for index, item in enumerate(part)))
+        return "".join(result_list)
+
+
+async def get_variable(variable_name, variables_mapping, functions_mapping):
+    """ 取变量的值，变量值里面引用了其他变量或函数时，解析后写回变量映射，逻辑与 parser.parse_string_variables 一致 """
+    variable_value = parser.get_mapping_variable(variable_name, variables_mapping)
+
+    if variable_name == "request" and isinstance(variable_value, dict) \
+            and "url" in variable_value and "method" in variable_value:
+        # 前置函数中使用 $request
+        for key, value in variable_value.items():
+            variable_value[key] = await compile_template(value).render(variables_mapping, functions_mapping)
+        return variable_value
+
+    if "${}".format(variable_name) == variable_value:
+        return variable_value
+
+    parsed_variable_value = await compile_template(variable_value).render(
+        variables_mapping, functions_mapping, raise_if_variable_not_found=False)
+    variables_mapping[variable_name] = parsed_variable_value
+    return parsed_variable_value
+
+
+TEMPLATE_TYPES = (ConstTemplate, ListTemplate, DictTemplate, StringTemplate)
+
+_string_template_cache = OrderedDict()
+
+
+def compile_string(content: str):
+    """ 编译字符串，按字符串内容缓存，超过 TEMPLATE_CACHE_SIZE 时淘汰最久没用到的 """
+    template = _string_template_cache.get(content)
+    if template is not None:
+        _string_template_cache.move_to_end(content)
+        return template
+
+    stripped_content = content.strip()
+    if "$" not in stripped_content:
+        template = ConstTemplate(stripped_content)
+    else:
+        template = StringTemplate(stripped_content)
+        if not template.function_list and len(template.part_list[0]) == 1:  # 有$但不是变量，比如价格 "$ 100"
+            template = ConstTemplate(stripped_content)
+
+    _string_template_cache[content] = template
+    if len(_string_template_cache) > TEMPLATE_CACHE_SIZE:
+        _string_template_cache.popitem(last=False)
+    return template
+
+
+def compile_template(content):
+    """ 把要解析的数据编译为模板树，结构与 parser.parse_data 支持的数据一致 """
+    if isinstance(content, str):
+        return compile_string(content)
+    if content is None or isinstance(content, (numeric_types, bool, type)):
+        return ConstTemplate(content)
+    if isinstance(content, (list, set, tuple)):
+        return ListTemplate(content)
+    if isinstance(content, dict):
+        return DictTemplate(content)
+    if isinstance(content, bytes):
+        return ConstTemplate(content.strip())
+    return ConstTemplate(content)
+
+
+_step_template_cache = OrderedDict()
+
+
+def compile_step_template(step_key, content):
+    """ 按步骤缓存编译好的模板树，step_key 为 (测试类型, 步骤版本)，步骤版本由解析步骤时按步骤、接口的修改时间生成
+    同一版本的步骤内容不变，整棵树直接复用，不用再逐层编译，也不用每次对内容算摘要，没有版本的不缓存
+    """
+    if step_key is None:
+        return compile_template(content)
+
+    template = _step_template_cache.get(step_key)
+    if template is not None:
+        _step_template_cache.move_to_end(step_key)
+        return template
+
+    template = _step_template_cache[step_key] = compile_template(content)
+    if len(_step_template_cache) > STEP_TEMPLATE_CACHE_SIZE:
+        _step_template_cache.popitem(last=False)
+    return template
+
+
+async def render_data(content, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+    """ 编译并解析数据，用法与 parser.parse_data 一致 """
+    return await compile_template(content).render(variables_mapping, functions_mapping, raise_if_variable_not_found)
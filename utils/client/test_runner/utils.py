@@ -3,7 +3,7 @@ import copy
 import json
 
 from . import exceptions
-from .compat import basestring
+from .compat import basestring, json_loads
 from .exceptions import ParamsError
 from utils.variables.regexp import absolute_http_url_regexp
 
@@ -27,17 +27,17 @@ def query_json(json_content, query, delimiter='.'):
                 "cities": ["Guangzhou", "Shenzhen"]
             }
         }
-        query (str): 路径表达式字符串
+        query (str/tuple): 路径表达式字符串，或已经按分隔符拆分好的路径
         delimiter (str): 分隔符符号，默认为 "."
     Returns:
         query_json(json_content, "person.name.first_name") >> Leo
         query_json(json_content, "person.name.first_name.0") >> L
-        query_json(json_content, "person.cities.0") >> Guangzhou
+        query_json(json_content, ("person", "cities", "0")) >> Guangzhou
     """
     raise_flag = False
-    response_body = u"response body: {}\n".format(json_content)
+    origin_content = json_content
     try:
-        for key in query.split(delimiter):
+        for key in (query if isinstance(query, tuple) else query.split(delimiter)):
             if isinstance(json_content, (list, basestring)):
                 json_content = json_content[int(key)]
             elif isinstance(json_content, dict):
@@ -48,8 +48,9 @@ def query_json(json_content, query, delimiter='.'):
         raise_flag = True
 
     if raise_flag:
-        err_msg = u"数据提取失败! => {}\n".format(query)
-        err_msg += response_body
+        # 只在提取失败时才把响应体转为字符串
+        err_msg = u"数据提取失败! => {}\n".format(delimiter.join(query) if isinstance(query, tuple) else query)
+        err_msg += u"response body: {}\n".format(origin_content)
         raise exceptions.ExtractFailure(err_msg)
 
     return json_content
@@ -153,3 +154,18 @@ def get_dict_data(content):
         return json.loads(content)
     except Exception as error:
         return content
+
+
+def get_response_json(response):
+    """ 响应体转json，结果缓存在响应对象上，记录报告、数据提取、断言共用，同一个响应只解析一次
+    解析出来的数据是共用的，只读不改
+    """
+    if "_json_result" not in response.__dict__:
+        try:
+            response._json_result = (json_loads(response.content), None)
+        except ValueError as error:
+            response._json_result = (None, error)
+    json_data, error = response._json_result
+    if error is not None:
+        raise error
+    return json_data
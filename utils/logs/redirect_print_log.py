@@ -1,28 +1,94 @@
+""" 按上下文捕获print内容，并发执行的步骤各自记录自己的打印，不再全局替换sys.stdout """
 import sys
+import threading
+from contextvars import ContextVar
 
+from config import ScriptExecutorInfo
 
-class RedirectPrintLogToMemory:
-    """ 重定向print内容到内存中 """
+# 当前上下文的打印缓冲区，为None时输出到原来的stdout
+_print_buffer: ContextVar = ContextVar("print_buffer", default=None)
+
+
+class PrintBuffer:
+    """ 打印内容缓冲区，超过 max_size 个字符后丢弃后续内容，只记录一次截断提示 """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or ScriptExecutorInfo.PRINT_MAX_SIZE
+        self.text_list = []
+        self.size = 0
+        self.is_truncated = False
+        self.is_closed = False  # 已取出内容后，超时还在执行的函数继续打印的内容不再记录
+        self._lock = threading.Lock()  # 自定义函数在线程池中执行，可能同时写入
+
+    def write(self, text):
+        with self._lock:
+            if self.is_closed or self.is_truncated:
+                return
+            remain_size = self.max_size - self.size
+            if len(text) > remain_size:
+                self.text_list.append(text[:remain_size])
+                self.text_list.append(f'\n...（打印内容超过{self.max_size}个字符，已截断）\n')
+                self.size = self.max_size
+                self.is_truncated = True
+                return
+            self.text_list.append(text)
+            self.size += len(text)
 
-    def __init__(self):
-        self.text = ""
-        sys.stdout = self
+    def close(self):
+        with self._lock:
+            self.is_closed = True
+            return "".join(self.text_list)
 
-    def write(self, out_stream):
-        self.text += out_stream
+
+class ContextStdout:
+    """ 替换sys.stdout的代理，当前上下文有缓冲区时写入缓冲区，否则写入原来的stdout """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = _print_buffer.get()
+        if buffer is None:
+            return self.stream.write(text)
+        buffer.write(text)
+        return len(text)
 
     def flush(self):
-        pass
+        if _print_buffer.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, item):
+        return getattr(self.stream, item)
+
+
+def install_context_stdout():
+    """ 进程内只替换一次sys.stdout """
+    if not isinstance(sys.stdout, ContextStdout):
+        sys.stdout = ContextStdout(sys.stdout or sys.__stdout__)
+
+
+class RedirectPrintLogToMemory:
+    """ 把当前上下文（协程及其提交到线程池的函数）的print内容重定向到内存中 """
+
+    def __init__(self, max_size=None):
+        install_context_stdout()
+        self.buffer = PrintBuffer(max_size)
+        self._token = _print_buffer.set(self.buffer)
+
+    @property
+    def text(self):
+        return "".join(self.buffer.text_list)
 
     def get_text_and_redirect_to_default(self):
         self.redirect_to_default()
-        return self.text
-
-    @classmethod
-    def redirect_to_default(cls):
-        """ 恢复输出到console """
-        sys.stdout = sys.__stdout__
+        return self.buffer.close()
 
-    # def __del__(self):
-    #     """ 恢复输出到console """
-    #     sys.stdout = sys.__stdout__
+    def redirect_to_default(self):
+        """ 恢复当前上下文输出到console，可重复调用 """
+        if self._token is None:
+            return
+        try:
+            _print_buffer.reset(self._token)
+        except ValueError:  # 不在设置时的上下文中，只清除当前上下文的缓冲区
+            _print_buffer.set(None)
+        self._token = None
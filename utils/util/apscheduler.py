@@ -1,14 +1,27 @@
-""" apscheduler 默认的调度器存储对于异步支持有问题，这里自己实现存储，启动 """
+""" apscheduler 默认的调度器存储对于异步支持有问题，这里自己实现存储，启动
+定时任务触发时直接在job服务中生成报告、写入执行队列，由执行器服务执行，不再调web服务的接口
+"""
+import asyncio
 import datetime
-import json
+import os
+import socket
+import traceback
 from pathlib import Path
 
-import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler as _AsyncIOScheduler
-from tortoise import Tortoise
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.util import localize
+from tortoise.expressions import Case, When, F
 from loguru import logger as loguru_logger
 
-from config import ServerInfo
+from app.models.config.config import Config
+from app.models.system.model_factory import ApschedulerJobs, JobLease
+from app.models.system.user import User
+from app.schemas.autotest.task import RunTaskForm
+from app.schemas.enums import TriggerTypeEnum
+from app.services.autotest.task import enqueue_task
+from app.services.system.job import JobFuncs
+from config import JobInfo
 from utils.parse.parse_cron import parse_cron
 from utils.util.file_util import LOG_ADDRESS
 
@@ -22,99 +35,294 @@ logger.add(
 )
 
 
+SCHEDULE_MAX_FIRE_COUNT = 10000  # 查看触发计划时，每个任务最多计算的触发次数，每秒执行的任务不会无限计算
+SCHEDULE_MAX_TOTAL_FIRE_COUNT = 100000  # 查看触发计划时，所有任务一共最多计算的触发次数
+SCHEDULE_SHOW_COUNT = 50  # 查看触发计划时，每个任务返回的触发时间数
+
+
+def get_skip_holiday(skip_holiday):
+    """ 是否跳过节假日，没有设置的和 request_run_task_api 一样默认跳过，返回 1/0 """
+    return 0 if skip_holiday is not None and not skip_holiday else 1
+
+
+class HolidayCronTrigger(CronTrigger):
+    """ 跳过节假日、调休日的cron触发器，计算下一次触发时间时直接跳过节假日，节假日当天不会唤醒调度器
+    holiday_getter: 返回节假日集合 {"01-01", ...} 的函数，节假日配置变了由调度器重新计算下一次触发时间
+    """
+
+    def __init__(self, holiday_getter, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holiday_getter = holiday_getter
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        holiday_set = self.holiday_getter()
+        for _ in range(366):  # 节假日最多一年，避免配置了所有日期时死循环
+            next_time = super().get_next_fire_time(previous_fire_time, now)
+            if next_time is None or next_time.strftime("%m-%d") not in holiday_set:
+                return next_time
+            # 从节假日的第二天0点开始重新计算
+            previous_fire_time = None
+            now = localize(datetime.datetime.combine(next_time.date() + datetime.timedelta(days=1), datetime.time.min), self.timezone)
+        return None
+
+
 class AsyncIOScheduler(_AsyncIOScheduler):
+    """
+    可以起多个job进程，通过数据库租约选出主节点，只有主节点触发定时任务，其他节点的调度器处于暂停状态
+    所有节点每次续期租约时都按 apscheduler_jobs 表增量同步内存中的任务，主节点切换时不用重新加载全部任务
+    新的主节点从上一个主节点租约过期的时间点开始接管，租约过期前的触发由上一个主节点负责，同一次触发只执行一次
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.is_leader = False
+        self.lease_expire_time = None  # 当前节点持有的租约过期时间
+        self.lease_task = None
+        self.job_id_dict = {}  # {task_code: 内存中的任务id}
+        self.job_conf_dict = {}  # {task_code: (cron, skip_holiday)}，用于和数据库对比增量同步
+        self.next_run_time_dict = {}  # 等待写入数据库的下一次运行时间 {task_code: next_run_time}
+        self.flush_task = None
+        self.holiday_set = frozenset()  # 解析好的节假日，续期租约时刷新
 
     async def init_scheduler(self, task_list):
-        """ 初始化scheduler，并把状态为要执行的任务添加到任务队列中 """
+        """ 初始化scheduler，并把状态为要执行的任务添加到任务队列中，获取到租约后才开始触发 """
 
         logger.info("开始启动scheduler...")
-        self.start()
-        logger.info("scheduler启动成功...")
+        self.start(paused=True)
+        logger.info(f"scheduler启动成功，节点【{self.worker}】等待获取主节点租约...")
 
         logger.info("开始把【ApschedulerJobs】表中的任务添加到内存中...")
         logger.info(f'task_list: {task_list}')
-        for task in task_list:
-            task_type, task_id = task["task_code"].split("_", 1)
-            logger.info(f'task: {task}')
-            await self.add_new_job(
-                task_code=f'{task_type}_{task_id}',
-                func=request_run_task_api,
-                kwargs={"task_code": task["task_code"], "task_type": task_type},
-                cron=task["cron"]
-            )
-
+        await self.refresh_holiday()
+        self.sync_jobs(task_list)
         logger.info("定时任务添加完成...")
 
-    async def add_new_job(self, task_code, cron, *args, **kwargs):
-        """ 添加任务 """
-        kwargs.setdefault("trigger", "cron")
+        await self.refresh_lease()
+        self.lease_task = asyncio.create_task(self.keep_lease())
+
+    async def stop_scheduler(self):
+        """ 停止调度，主节点主动释放租约，其他节点可以立即接管 """
+        if self.lease_task:
+            self.lease_task.cancel()
+        if self.is_leader:
+            self.is_leader = False
+            await JobLease.release(JobInfo.LEASE_NAME, self.worker)
+        self.shutdown(wait=False)
+
+    def add_memory_job(self, task_code, cron, *args, **kwargs):
+        """ 添加内存中的任务，已存在则替换 """
+        self.remove_memory_job(task_code)
+        skip_holiday = get_skip_holiday(kwargs.setdefault("kwargs", {}).get("skip_holiday"))
+        kwargs["kwargs"]["skip_holiday"] = skip_holiday
+        if skip_holiday:
+            kwargs.setdefault("trigger", HolidayCronTrigger(self.get_holiday_set, timezone=self.timezone, **parse_cron(cron)))
+        else:
+            kwargs.setdefault("trigger", CronTrigger(timezone=self.timezone, **parse_cron(cron)))
         kwargs.setdefault("misfire_grace_time", 60)
         kwargs.setdefault("coalesce", False)
-        memory_job = self.add_job(*args, **kwargs, **parse_cron(cron))
+        memory_job = self.add_job(*args, **kwargs)
+        self.job_id_dict[task_code], self.job_conf_dict[task_code] = memory_job.id, (cron, skip_holiday)
+        return memory_job
 
-        db = Tortoise.get_connection("default")
-        result = await db.execute_query_dict(f"SELECT `id` FROM apscheduler_jobs WHERE task_code='{task_code}'")
-        if result:
-            await db.execute_script(f"update apscheduler_jobs set job_id = '{memory_job.id}', cron = '{cron}'  WHERE task_code='{task_code}'")
-        else:
-            await db.execute_script(
-                f"insert into  apscheduler_jobs (task_code, cron, next_run_time, job_id) values ('{task_code}', '{cron}', '{memory_job.next_run_time}', '{memory_job.id}')"
+    def remove_memory_job(self, task_code):
+        """ 移除内存中的任务 """
+        job_id = self.job_id_dict.pop(task_code, None)
+        self.job_conf_dict.pop(task_code, None)
+        self.next_run_time_dict.pop(task_code, None)
+        if job_id and self.get_job(job_id):
+            self.remove_job(job_id)
+
+    def sync_jobs(self, task_list):
+        """ 按数据库中的任务增量更新内存中的任务：新增的添加、已删除的移除、cron或是否跳过节假日变了的替换 """
+        db_conf_dict = {
+            task["task_code"]: (task["cron"], get_skip_holiday(task.get("skip_holiday"))) for task in task_list}
+        add_list = [code for code, conf in db_conf_dict.items() if self.job_conf_dict.get(code) != conf]
+        remove_list = [code for code in self.job_conf_dict if code not in db_conf_dict]
+        for task_code in remove_list:
+            self.remove_memory_job(task_code)
+        for task_code in add_list:
+            task_type, task_id = task_code.split("_", 1)
+            self.add_memory_job(
+                task_code=task_code,
+                func=request_run_task_api,
+                kwargs={"task_code": task_code, "task_type": task_type, "skip_holiday": db_conf_dict[task_code][1]},
+                cron=db_conf_dict[task_code][0]
             )
+        if add_list or remove_list:
+            logger.info(f'同步定时任务，新增/修改：{add_list}，移除：{remove_list}')
+
+    async def add_new_job(self, task_code, cron, *args, **kwargs):
+        """ 添加任务 """
+        memory_job = self.add_memory_job(task_code, cron, *args, **kwargs)
+        skip_holiday = self.job_conf_dict[task_code][1]
+        if not await ApschedulerJobs.filter(task_code=task_code).update(
+                job_id=memory_job.id, cron=cron, skip_holiday=skip_holiday):
+            await ApschedulerJobs.create(
+                task_code=task_code, cron=cron, skip_holiday=skip_holiday, next_run_time=str(memory_job.next_run_time),
+                job_id=memory_job.id)
 
     async def remove_exist_job(self, job_code, *args, **kwargs):
-        """ 移除任务 """
-        db = Tortoise.get_connection("default")
-        job = await db.execute_query_dict(f"SELECT `job_id` FROM apscheduler_jobs WHERE task_code='{job_code}'")
-        if job:
-            job_id = job[0]["job_id"]
-            self.remove_job(job_id, *args, **kwargs)
-            await db.execute_script(f'delete FROM apscheduler_jobs WHERE job_id="{job_id}"')
+        """ 移除任务，其他节点在下次同步时移除 """
+        self.remove_memory_job(job_code)
+        await ApschedulerJobs.filter(task_code=job_code).delete()
+
+    def get_holiday_set(self):
+        return self.holiday_set
+
+    async def refresh_holiday(self):
+        """ 节假日配置变了，重新计算跳过节假日的任务的下一次触发时间 """
+        holiday_set = await Config.get_holiday_set()
+        if holiday_set == self.holiday_set:
+            return
+        self.holiday_set = holiday_set
+        if self.is_leader:
+            now = datetime.datetime.now(self.timezone)
+            for job in self.get_jobs():
+                if isinstance(job.trigger, HolidayCronTrigger):
+                    job.modify(next_run_time=job.trigger.get_next_fire_time(None, now))
+        logger.info(f'节假日配置已更新：{sorted(holiday_set)}')
+
+    async def get_schedule(self, days: int):
+        """ 未来 days 天每个任务的触发时间，以及按小时统计的触发次数，用于查看触发高峰
+        计算量大，在线程中计算，不阻塞续期租约、触发任务
+        """
+        job_list = []  # 在事件循环中取任务，线程中只读触发器
+        for task_code, job_id in list(self.job_id_dict.items()):
+            job = self.get_job(job_id)
+            if job is not None:
+                job_list.append((task_code, self.job_conf_dict.get(task_code, (None,))[0], job.trigger))
+        return await asyncio.to_thread(self.calculate_schedule, job_list, days)
+
+    def calculate_schedule(self, job_list, days: int):
+        """ 每个任务最多计算 SCHEDULE_MAX_FIRE_COUNT 次，所有任务一共最多计算 SCHEDULE_MAX_TOTAL_FIRE_COUNT 次
+        超过的不再计算，对应任务的 is_truncated 为 True，此时触发高峰只统计了已计算的部分，peak_is_truncated 为 True
+        """
+        now = datetime.datetime.now(self.timezone)
+        end_time = now + datetime.timedelta(days=days)
+        task_list, hour_count, total_count = [], {}, 0
+        for task_code, cron, trigger in job_list:
+            max_count = min(SCHEDULE_MAX_FIRE_COUNT, SCHEDULE_MAX_TOTAL_FIRE_COUNT - total_count)
+            fire_time_list, fire_count, is_truncated = [], 0, False
+            fire_time = trigger.get_next_fire_time(None, now)
+            while fire_time and fire_time <= end_time:
+                if fire_count >= max_count:
+                    is_truncated = True
+                    break
+                fire_count += 1
+                if len(fire_time_list) < SCHEDULE_SHOW_COUNT:
+                    fire_time_list.append(fire_time.strftime("%Y-%m-%d %H:%M:%S"))
+                hour = fire_time.strftime("%Y-%m-%d %H:00")
+                hour_count[hour] = hour_count.get(hour, 0) + 1
+                fire_time = trigger.get_next_fire_time(fire_time, fire_time)
+            total_count += fire_count
+            task_list.append({
+                "task_code": task_code,
+                "cron": cron,
+                "skip_holiday": isinstance(trigger, HolidayCronTrigger),
+                "fire_count": fire_count,
+                "is_truncated": is_truncated,
+                "fire_time_list": fire_time_list
+            })
+        peak_list = sorted(hour_count.items(), key=lambda item: item[1], reverse=True)[:20]
+        return {
+            "days": days,
+            "task_list": task_list,
+            "peak_is_truncated": any(task["is_truncated"] for task in task_list),
+            "peak_list": [{"hour": hour, "count": count} for hour, count in peak_list]
+        }
+
+    def check_is_leader(self):
+        """ 触发时再判断一次，租约已过期（续期失败）的节点不再触发 """
+        return self.is_leader and self.lease_expire_time is not None and datetime.datetime.now() < self.lease_expire_time
+
+    async def keep_lease(self):
+        while True:
+            await asyncio.sleep(JobInfo.LEASE_RENEW_INTERVAL)
+            try:
+                await self.refresh_lease()
+            except Exception:
+                logger.error(f'续期主节点租约出错：\n{traceback.format_exc()}')
+
+    async def refresh_lease(self):
+        """ 获取或续期租约，并同步数据库中的任务 """
+        is_success, last_expire_time, expire_time = await JobLease.acquire(
+            JobInfo.LEASE_NAME, self.worker, JobInfo.LEASE_TIME_OUT)
+        await self.refresh_holiday()
+        self.sync_jobs(await ApschedulerJobs.all().values("task_code", "cron", "skip_holiday"))
+        if is_success:
+            self.lease_expire_time = expire_time
+            if not self.is_leader:
+                self.take_over(last_expire_time)
+        elif self.is_leader:
+            self.is_leader = False
+            self.pause()
+            logger.warning(f'节点【{self.worker}】的主节点租约已被其他节点获取，停止触发定时任务')
+
+    def take_over(self, last_expire_time):
+        """ 成为主节点，从上一个租约过期的时间点开始触发，没有上一个租约则从当前时间开始 """
+        now = datetime.datetime.now()
+        if last_expire_time is None or last_expire_time.replace(tzinfo=None) > now:
+            start_time = now
+        else:
+            start_time = last_expire_time.replace(tzinfo=None)
+        start_time = start_time.astimezone(self.timezone)
+        for job in self.get_jobs():
+            job.modify(next_run_time=job.trigger.get_next_fire_time(None, start_time))
+        self.is_leader = True
+        self.resume()
+        logger.info(f'节点【{self.worker}】成为主节点，从【{start_time}】开始触发定时任务')
+
+    def update_next_run_time(self, task_code):
+        """ 记录任务的下一次运行时间，延迟 JobInfo.NEXT_RUN_TIME_FLUSH_DELAY 秒批量写入数据库 """
+        job = self.get_job(self.job_id_dict.get(task_code)) if task_code in self.job_id_dict else None
+        if job is None:
+            return
+        self.next_run_time_dict[task_code] = str(job.next_run_time)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_next_run_time())
+
+    async def flush_next_run_time(self):
+        """ 同一时间触发的任务只用一条update语句更新下一次运行时间 """
+        await asyncio.sleep(JobInfo.NEXT_RUN_TIME_FLUSH_DELAY)
+        next_run_time_dict, self.next_run_time_dict = self.next_run_time_dict, {}
+        if not next_run_time_dict:
+            return
+        try:
+            await ApschedulerJobs.filter(task_code__in=list(next_run_time_dict.keys())).update(next_run_time=Case(
+                *[When(task_code=task_code, then=next_run_time) for task_code, next_run_time in next_run_time_dict.items()],
+                default=F("next_run_time")
+            ))
+        except Exception:
+            logger.error(f'更新定时任务下一次运行时间出错：\n{traceback.format_exc()}')
 
 
 scheduler = AsyncIOScheduler()
 
 
 async def request_run_task_api(task_code, task_type, skip_holiday=True):
-    """ 调执行任务接口 """
+    """ 触发定时任务，系统定时任务直接执行，自动化测试任务生成报告后写入执行队列 """
     logger.info(f'{"*" * 20} 开始触发执行定时任务【{task_code}】 {"*" * 20}')
+    if not scheduler.check_is_leader():  # 租约已过期，由新的主节点触发
+        logger.info(f'{"*" * 20} 当前节点不是主节点，跳过 {"*" * 20}')
+        return None
 
-    # 判断是否设置了跳过节假日、调休日
+    # 判断是否设置了跳过节假日、调休日，触发时间已经跳过了节假日，这里防止节假日配置刚修改还没重新计算
     if skip_holiday:
-
-        # 查配置的节假日
-        db = Tortoise.get_connection("default")
-        result = await db.execute_query_dict("SELECT `value` FROM config_config WHERE name='holiday_list'")
-        holiday_list = json.loads(result[0]['value'])
-
-        if datetime.datetime.today().strftime("%m-%d") in holiday_list:
+        if datetime.datetime.today().strftime("%m-%d") in scheduler.holiday_set:
             logger.info(f'{"*" * 20} 节假日/调休日，跳过 {"*" * 20}')
             return None
 
-    if isinstance(task_code, str) and task_code.startswith('cron'):  # 系统定时任务
-        api_addr = '/system/job/run'
-    else:  # 自动化测试定时任务
-        api_addr = f'/{task_type}-test/task/run'
-
     task_type, task_id = task_code.split("_", 1)  # api_1  cron_cron_xx_
-
-    async with httpx.AsyncClient(verify=False) as client:
-        response = await client.post(
-            f'{ServerInfo.MAIN_ADDR}/api{api_addr}',
-            json={
-                "id": task_id,  # 系统定时任务
-                "id_list": [task_id],  # 自动化测试任务
-                "func_name": task_id,
-                "trigger_type": "cron"
-            },
-            timeout=30
-        )
-        logger.info(f'{"*" * 20} 定时任务触发完毕 {"*" * 20}')
-        logger.info(f'{"*" * 20} 触发响应为：{response.json()} {"*" * 20}')
-
-    # 更新 next_run_time
-    db = Tortoise.get_connection("default")
-    job_data = await db.execute_query_dict(f"SELECT `job_id` FROM apscheduler_jobs WHERE task_code='{task_code}'")
-    job = scheduler.get_job(job_data[0]["job_id"])
-    await db.execute_script(
-        f"update apscheduler_jobs set next_run_time = '{job.next_run_time}' WHERE task_code='{task_code}'")
-    return response
+    try:
+        if task_type == "cron":  # 系统定时任务
+            result = await getattr(JobFuncs, task_id)()
+        else:  # 自动化测试定时任务
+            form = RunTaskForm(id_list=[task_id], trigger_type=TriggerTypeEnum.CRON)
+            result = await enqueue_task(task_type, form, await User.get_common_user_id())
+        logger.info(f'{"*" * 20} 定时任务触发完毕，结果为：{result} {"*" * 20}')
+        return result
+    except Exception:
+        logger.error(f'{"*" * 20} 定时任务【{task_code}】触发出错：\n{traceback.format_exc()} {"*" * 20}')
+    finally:
+        scheduler.update_next_run_time(task_code)
@@ -24,6 +24,7 @@ SWAGGER_FILE_ADDRESS = os.path.abspath(os.path.join(BASEDIR, ".." + r"/swagger_f
 DB_BACK_UP_ADDRESS = os.path.abspath(os.path.join(BASEDIR, ".." + r"/db_back_up_files/"))  # 数据库备份地址
 REPORT_IMG_UI_ADDRESS = os.path.abspath(os.path.join(BASEDIR, ".." + r"/report_img_ui/"))  # 截图存放路径
 REPORT_IMG_APP_ADDRESS = os.path.abspath(os.path.join(BASEDIR, ".." + r"/report_img_app/"))  # 截图存放路径
+REPORT_BODY_ADDRESS = os.path.abspath(os.path.join(BASEDIR, ".." + r"/report_body/"))  # 测试报告中大的请求体、响应体存放路径
 
 
 def _check_file_path(paths):
@@ -40,7 +41,7 @@ def _check_file_path(paths):
 _check_file_path([
     LOG_ADDRESS, SCRIPT_ADDRESS, CASE_FILE_ADDRESS, UI_CASE_FILE_ADDRESS, APP_CASE_FILE_ADDRESS,
     MOCK_DATA_ADDRESS, CALL_BACK_ADDRESS, TEMP_FILE_ADDRESS, DB_BACK_UP_ADDRESS, SWAGGER_FILE_ADDRESS,
-    REPORT_IMG_UI_ADDRESS, REPORT_IMG_APP_ADDRESS  # , DIFF_RESULT, GIT_FILE_ADDRESS
+    REPORT_IMG_UI_ADDRESS, REPORT_IMG_APP_ADDRESS, REPORT_BODY_ADDRESS  # , DIFF_RESULT, GIT_FILE_ADDRESS
 ])
 
 
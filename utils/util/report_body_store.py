@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+""" 测试报告中大的请求体、响应体存数据库，按内容hash去重，gzip压缩，步骤数据中只记录引用和预览 """
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from app.models.autotest.report_body import ReportBody
+from config import ReportBodyInfo
+from utils.parse.parse import encode_object
+from utils.util.file_util import REPORT_BODY_ADDRESS
+from utils.util.json_util import JsonUtil
+
+REF_KEY = "__report_body__"  # 引用数据的标识，值为内容的sha256
+
+# 步骤数据中可能很大的字段 {一级key: [二级key]}
+BODY_FIELDS = {
+    "request": ("body", "json", "data"),
+    "response": ("json", "text", "content")
+}
+
+
+class ReportBodyStore:
+    """
+    保存: 字段内容转为字节后超过 ReportBodyInfo.MAX_INLINE_SIZE 的，压缩后按sha256存到 ReportBody 表，相同内容只存一份
+    引用: {"__report_body__": sha256, "type": "json/str", "size": 字节数, "preview": 前 PREVIEW_SIZE 个字符}
+    读取: 查看步骤详情时把引用还原为原内容
+    执行器与web服务可能部署在不同机器上，所以存数据库而不是本机文件，之前版本存在 REPORT_BODY_ADDRESS 下的文件依然可以读取
+    每被引用一次就刷新一次被引用时间，超过 ReportBodyInfo.KEEP_DAYS 天没被引用的由定时任务清理
+    """
+
+    @staticmethod
+    def get_file_path(body_hash):
+        """ 之前版本存文件的路径 """
+        return os.path.join(REPORT_BODY_ADDRESS, body_hash[:2], f'{body_hash}.gz')
+
+    @staticmethod
+    def is_ref(value):
+        return isinstance(value, dict) and REF_KEY in value
+
+    @classmethod
+    def dump_body(cls, value):
+        """ 转为要存储的字节数据，和数据直接存数据库时转json的结果保持一致 """
+        if isinstance(value, (dict, list)):
+            return "json", JsonUtil.dumps(value).encode("utf-8")
+        if isinstance(value, bytes):
+            value = encode_object(value)
+        if isinstance(value, str):
+            return "str", value.encode("utf-8")
+        return None, None
+
+    @staticmethod
+    def compress(content: bytes):
+        return hashlib.sha256(content).hexdigest(), gzip.compress(content, compresslevel=ReportBodyInfo.COMPRESS_LEVEL)
+
+    @classmethod
+    async def save(cls, body_type, content: bytes):
+        body_hash, compressed_content = await asyncio.to_thread(cls.compress, content)  # 大的内容压缩耗时，不阻塞事件循环
+        await ReportBody.save_body(body_hash, body_type, len(content), compressed_content)
+        return {
+            REF_KEY: body_hash,
+            "type": body_type,
+            "size": len(content),
+            "preview": content[:ReportBodyInfo.PREVIEW_SIZE * 4].decode("utf-8", "ignore")[:ReportBodyInfo.PREVIEW_SIZE]
+        }
+
+    @classmethod
+    def load_file(cls, body_hash):
+        """ 读取之前版本存的文件，不存在返回None """
+        file_path = cls.get_file_path(body_hash)
+        if not os.path.exists(file_path):
+            return None
+        with gzip.open(file_path, "rb") as file:
+            return file.read()
+
+    @classmethod
+    async def load(cls, ref: dict):
+        """ 把引用还原为原内容，已被清理则返回预览 """
+        body = await ReportBody.filter(body_hash=ref[REF_KEY]).first().values("content")
+        if body:
+            content = await asyncio.to_thread(gzip.decompress, body["content"])
+        else:
+            content = await asyncio.to_thread(cls.load_file, ref[REF_KEY])
+            if content is None:
+                return f'{ref.get("preview", "")} ...（内容已被清理）'
+        content = content.decode("utf-8")
+        return json.loads(content) if ref.get("type") == "json" else content
+
+    @classmethod
+    async def externalize(cls, step_data):
+        """ 把步骤数据中超过大小的请求体、响应体存数据库，返回替换为引用后的数据，不修改传入的数据 """
+        if not isinstance(step_data, dict):
+            return step_data
+        new_step_data = step_data
+        for field, key_list in BODY_FIELDS.items():
+            field_data = step_data.get(field)
+            if not isinstance(field_data, dict):
+                continue
+            new_field_data = field_data
+            for key in key_list:
+                value = field_data.get(key)
+                if not value or cls.is_ref(value):
+                    continue
+                body_type, content = cls.dump_body(value)
+                if content is None or len(content) <= ReportBodyInfo.MAX_INLINE_SIZE:
+                    continue
+                if new_field_data is field_data:
+                    new_field_data = dict(field_data)
+                new_field_data[key] = await cls.save(body_type, content)
+            if new_field_data is not field_data:
+                if new_step_data is step_data:
+                    new_step_data = dict(step_data)
+                new_step_data[field] = new_field_data
+        return new_step_data
+
+    @classmethod
+    async def inline(cls, step_data):
+        """ 把步骤数据中的引用还原为原内容 """
+        for ref in cls.get_ref_list(step_data):
+            field, key, value = ref
+            step_data[field][key] = await cls.load(value)
+        return step_data
+
+    @classmethod
+    def get_ref_list(cls, step_data):
+        """ 步骤数据中的引用 [(一级key, 二级key, 引用)] """
+        ref_list = []
+        if not isinstance(step_data, dict):
+            return ref_list
+        for field, key_list in BODY_FIELDS.items():
+            field_data = step_data.get(field)
+            if isinstance(field_data, dict):
+                ref_list.extend((field, key, field_data[key]) for key in key_list if cls.is_ref(field_data.get(key)))
+        return ref_list
+
+    @classmethod
+    async def touch(cls, step_data_list, batch_size=500):
+        """ 刷新步骤数据引用的内容的被引用时间，用于保留不会被清理的报告引用的内容 """
+        body_hash_list = list({
+            ref[REF_KEY] for step_data in step_data_list for field, key, ref in cls.get_ref_list(step_data)})
+        for index in range(0, len(body_hash_list), batch_size):
+            await ReportBody.touch(body_hash_list[index:index + batch_size])
+
+    @staticmethod
+    def clear_expired_file(expire_time):
+        """ 删除之前版本存的、超过保留时间的文件 """
+        delete_count = 0
+        for root, dirs, files in os.walk(REPORT_BODY_ADDRESS):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                try:
+                    if os.path.getmtime(file_path) < expire_time:
+                        os.remove(file_path)
+                        delete_count += 1
+                except FileNotFoundError:
+                    pass
+        return delete_count
+
+    @classmethod
+    async def clear_expired(cls, keep_days=None):
+        """ 删除超过 keep_days 天没有被引用的内容，返回删除的条数 """
+        keep_days = ReportBodyInfo.KEEP_DAYS if keep_days is None else keep_days
+        expire_time = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+        delete_count = await ReportBody.clear_expired(expire_time)
+        return delete_count + await asyncio.to_thread(cls.clear_expired_file, expire_time.timestamp())
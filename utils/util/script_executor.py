@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+""" 执行自定义脚本函数的线程池，进程内共用，避免每次调用都新建、销毁线程 """
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import partial
+
+from config import ScriptExecutorInfo
+from utils.logs.log import logger
+
+# 当前测试执行的并发限制，由 ScriptExecutor.set_run_limit 设置，同一次测试执行中的协程共用
+_run_limit: ContextVar = ContextVar("script_run_limit", default=None)
+
+
+class ScriptExecutor:
+    """
+    线程池在第一次调用时创建，大小取 ScriptExecutorInfo.MAX_WORKERS
+    每次测试执行最多同时占用 ScriptExecutorInfo.MAX_RUNNING_PER_RUN 个线程，避免一个测试把线程池占满
+    超时的调用如果还在排队则直接取消，已经在执行的无法强制终止，计入 timeout_running
+    """
+    _executor = None
+    _lock = threading.Lock()
+    _thread_set = set()  # 执行过函数的线程，用于观察线程复用
+    _metrics = {
+        "submitted": 0, "started": 0, "success": 0, "fail": 0, "timeout": 0, "cancelled": 0, "running": 0,
+        "timeout_running": 0
+    }
+
+    @classmethod
+    def get_executor(cls):
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=ScriptExecutorInfo.MAX_WORKERS, thread_name_prefix="script")
+        return cls._executor
+
+    @classmethod
+    def set_run_limit(cls, limit=None):
+        """ 开始一次测试执行时设置并发限制，返回的token用于 reset_run_limit """
+        return _run_limit.set(asyncio.Semaphore(limit or ScriptExecutorInfo.MAX_RUNNING_PER_RUN))
+
+    @classmethod
+    def reset_run_limit(cls, token):
+        _run_limit.reset(token)
+
+    @classmethod
+    def _call(cls, func, state):
+        cls._thread_set.add(threading.get_ident())
+        with cls._lock:
+            cls._metrics["started"] += 1
+            cls._metrics["running"] += 1
+        try:
+            return func()
+        finally:
+            with cls._lock:
+                state["done"] = True
+                cls._metrics["running"] -= 1
+                if state["timeout"]:
+                    cls._metrics["timeout_running"] -= 1
+
+    @classmethod
+    async def _submit(cls, func, timeout):
+        state = {"done": False, "timeout": False}
+        # 带上当前上下文，函数中的print能写入当前步骤的打印缓冲区
+        future = cls.get_executor().submit(copy_context().run, cls._call, func, state)
+        cls._metrics["submitted"] += 1
+        aio_future = asyncio.wrap_future(future)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(aio_future), timeout=timeout)
+        except asyncio.TimeoutError:
+            cls._metrics["timeout"] += 1
+            aio_future.add_done_callback(lambda f: f.cancelled() or f.exception())  # 超时后的结果不再关心
+            if future.cancel():  # 还在排队的直接取消
+                cls._metrics["cancelled"] += 1
+            else:
+                with cls._lock:
+                    if not state["done"]:
+                        state["timeout"] = True
+                        cls._metrics["timeout_running"] += 1
+                logger.warning(f'自定义函数执行超过{timeout}秒，线程无法强制终止，等待其自行结束')
+            raise
+        except Exception:
+            cls._metrics["fail"] += 1
+            raise
+        cls._metrics["success"] += 1
+        return result
+
+    @classmethod
+    async def run(cls, func, args: tuple = None, kwargs: dict = None, timeout: int = None):
+        bound_func = partial(func, *(args or ()), **(kwargs or {}))
+        timeout = timeout or ScriptExecutorInfo.TIME_OUT
+        run_limit = _run_limit.get()
+        if run_limit is None:
+            return await cls._submit(bound_func, timeout)
+        async with run_limit:
+            return await cls._submit(bound_func, timeout)
+
+    @classmethod
+    def get_metrics(cls):
+        """ 线程池运行指标，call_per_thread 越大说明线程复用越充分 """
+        finished = cls._metrics["success"] + cls._metrics["fail"] + cls._metrics["timeout"]
+        return {
+            **cls._metrics,
+            "max_workers": ScriptExecutorInfo.MAX_WORKERS,
+            "thread_count": len(cls._thread_set),
+            "call_per_thread": round(finished / len(cls._thread_set), 2) if cls._thread_set else 0,
+            "queued": cls._metrics["submitted"] - cls._metrics["started"] - cls._metrics["cancelled"]
+        }
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+""" 自定义脚本的模块缓存，脚本内容没变时直接复用已编译的模块，不用每次执行都写文件、reload """
+import hashlib
+import importlib.abc
+import importlib.util
+import linecache
+import os
+import sys
+import threading
+import types
+
+from utils.util.file_util import SCRIPT_ADDRESS
+
+PACKAGE_NAME = "script_list"
+
+
+class ScriptModuleCache(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    模块以 (env_code, 脚本名, 脚本内容hash) 为key缓存，模块名与原来写文件的方式一致：script_list.{env_code}_{脚本名}
+    编译后的模块注册到 sys.modules，脚本之间 from script_list.xxx import yyy 的引用方式不受影响
+    同时作为 sys.meta_path 的查找器，已同步过内容、还没编译的脚本被其他脚本导入时从内存编译，不读磁盘
+    """
+    _lock = threading.RLock()
+    source_dict = {}  # {(env_code, name): (hash, 完整脚本内容)}
+    module_dict = {}  # {(env_code, name): (hash, module)}
+
+    @staticmethod
+    def get_module_name(env_code, name):
+        return f'{PACKAGE_NAME}.{env_code}_{name}'
+
+    @staticmethod
+    def get_hash(source: str):
+        return hashlib.md5(source.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def build_source(env_code, script_data):
+        """ 与 FileUtil.save_script_data 写入文件的内容保持一致，在第一行加上运行环境 """
+        return "# coding:utf-8\n\n" + f'env = "{env_code}"\n\n' + (script_data or '')
+
+    @classmethod
+    def sync(cls, env_code, script_list: list):
+        """ 同步脚本内容，script_list: [(脚本名, 脚本内容)]，只记录内容hash，用到时再编译 """
+        with cls._lock:
+            for name, script_data in script_list:
+                source = cls.build_source(env_code, script_data)
+                source_hash = cls.get_hash(source)
+                if cls.source_dict.get((env_code, name), (None,))[0] != source_hash:
+                    cls.source_dict[(env_code, name)] = (source_hash, source)
+
+    @classmethod
+    def get_source(cls, env_code, name):
+        return cls.source_dict.get((env_code, name), (None, None))[1]
+
+    @classmethod
+    def compile_module(cls, module_name, source, register=True):
+        """ 把脚本内容编译为模块，register为False时只编译不注册，用于校验语法 """
+        file_name = os.path.join(SCRIPT_ADDRESS, f'{module_name.split(".", 1)[1]}.py')
+        module = types.ModuleType(module_name)
+        module.__file__ = file_name
+        module.__package__ = PACKAGE_NAME
+        module.__loader__ = cls
+        code = compile(source, file_name, "exec")
+        # 报错时traceback从linecache取源码，文件不存在也能显示出错的代码行
+        linecache.cache[file_name] = (len(source), None, source.splitlines(True), file_name)
+        if not register:
+            exec(code, module.__dict__)
+            return module
+        old_module = sys.modules.get(module_name)
+        sys.modules[module_name] = module  # 先注册再执行，与import的行为一致，支持脚本之间互相引用
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            if old_module is None:
+                sys.modules.pop(module_name, None)
+            else:
+                sys.modules[module_name] = old_module
+            raise
+        return module
+
+    @classmethod
+    def get_module(cls, env_code, name):
+        """ 获取已同步的脚本对应的模块，内容hash没变则直接返回缓存的模块 """
+        with cls._lock:
+            source_hash, source = cls.source_dict[(env_code, name)]
+            cached = cls.module_dict.get((env_code, name))
+            if cached and cached[0] == source_hash:
+                return cached[1]
+            module = cls.compile_module(cls.get_module_name(env_code, name), source)
+            cls.module_dict[(env_code, name)] = (source_hash, module)
+            return module
+
+    @classmethod
+    def get_functions(cls, env_code, name):
+        module = cls.get_module(env_code, name)
+        return {func_name: item for func_name, item in vars(module).items() if isinstance(item, types.FunctionType)}
+
+    @classmethod
+    def invalidate(cls, name=None):
+        """ 脚本修改、删除后清除缓存，不指定脚本名则全部清除 """
+        with cls._lock:
+            for key in [key for key in {*cls.source_dict, *cls.module_dict} if name in (None, key[1])]:
+                cls.source_dict.pop(key, None)
+                cls.module_dict.pop(key, None)
+                sys.modules.pop(cls.get_module_name(*key), None)
+
+    @classmethod
+    def find_spec(cls, fullname, path=None, target=None):
+        """ 只处理已同步内容的脚本模块，其余的交给默认的查找器 """
+        if not fullname.startswith(f'{PACKAGE_NAME}.'):
+            return None
+        for env_code, name in list(cls.source_dict):
+            if cls.get_module_name(env_code, name) == fullname:
+                return importlib.util.spec_from_loader(fullname, cls)
+        return None
+
+    @classmethod
+    def create_module(cls, spec):
+        for env_code, name in list(cls.source_dict):
+            if cls.get_module_name(env_code, name) == spec.name:
+                return cls.get_module(env_code, name)
+
+    @classmethod
+    def exec_module(cls, module):
+        """ 模块在 create_module 中已经执行过 """
+
+
+sys.meta_path.insert(0, ScriptModuleCache)